@@ -0,0 +1,428 @@
+"""Engine microbenchmark and differential check against Decimal
+
+Times every engine operation on its own: the four operators of
+calculate(), percentage, reciprocal, square root, square, sin, cos,
+tan, log, factorial and format_result(). Each runs over a fixed random
+operand set plus edge cases, with the function and format caches
+cleared before every repeat, so the timings are of the computation and
+not of cache hits.
+
+Every result is also compared with a reference computed with decimal
+at 60 digits from the exact values of the float operands:
+
+    - error texts (Infinity, Imaginary Number, ...) must be the same
+    - numbers are compared in units of the last digit the display can
+      show (10 decimals, 10 significant digits in exponent form, or one
+      float ulp where the float itself is coarser); correctly rounded
+      display text is within 0.5 units, more than 1 unit is a mismatch
+
+Results are compared with benchmarks/baseline_engine.json: the run
+fails (exit status 1) when an operation is slower than the baseline by
+more than --tolerance, has more mismatches, or a larger maximum error
+than the baseline allows. Throughput is compared as relative speed:
+every timing sample of an operation is paired with a sample of a fixed
+calibration loop taken right before it, and the median of the
+operation / calibration ratios is kept. A slower or busy machine slows
+both sides of a pair, so it does not count as a regression.
+--no-throughput-check checks accuracy only. Record new baselines with
+--update-baseline.
+
+Usage:
+    python benchmarks/bench_engine.py [--repeat N] [--tolerance 0.3] [--no-throughput-check]
+                                      [--baseline FILE] [--update-baseline]
+                                      [--output FILE]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal, localcontext
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+import calculator_engine as engine
+from calculator_format import DEFAULT_DIGITS, formatter
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_engine.json')
+
+# Digits of the reference computation
+PRECISION = 60
+
+# Random operands per operation
+RANDOM_OPERANDS = 2000
+
+# Minimum duration of one timing sample (seconds)
+SAMPLE_SECONDS = 0.05
+
+# Iterations of one calibration pass
+CALIBRATION_LOOPS = 2000
+
+# Errors above this many display units count as mismatches
+MISMATCH_UNITS = 1.0
+
+# Slack on the baseline's maximum error before it counts as a regression
+ERROR_SLACK = 0.25
+
+MAX_FLOAT = Decimal(sys.float_info.max)
+
+EDGE_NUMBERS = ['0', '-0', '1', '-1', '0.1', '0.2', '0.5', '-2.5', '3', '7', '10', '100', '1e-10',
+                '123456789', '-987654.321', '9007199254740993', '1e16', '1e-300', '1e300',
+                '1.7976931348623157e308', '5e-324']
+
+
+# Operand sets
+def random_numbers(rng, count):
+    """Operand texts of mixed magnitude, sign and form"""
+    numbers = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.3:
+            value = rng.uniform(-1000, 1000)
+        elif kind < 0.6:
+            value = rng.choice([-1, 1]) * 10 ** rng.uniform(-12, 12)
+        elif kind < 0.8:
+            value = rng.randint(-10 ** 6, 10 ** 6)
+        else:
+            value = round(rng.uniform(-100, 100), 2)
+        numbers.append(repr(value))
+    return numbers
+
+
+def binary_operands(rng):
+    pairs = [(a, b) for a in EDGE_NUMBERS for b in EDGE_NUMBERS]
+    numbers = random_numbers(rng, 2 * RANDOM_OPERANDS)
+    pairs.extend(zip(numbers[::2], numbers[1::2]))
+    return pairs
+
+
+def unary_operands(rng, op):
+    if op in ('sine', 'cosine', 'tangent'):
+        edges = [str(angle) for angle in range(-720, 721, 15)]
+        edges += ['89.9999999', '90.0000001', '1e-10', '360.5', '1e15', '1e20', '-1e22', '1e300']
+        numbers = [repr(rng.uniform(-720, 720)) for _ in range(RANDOM_OPERANDS // 2)]
+        numbers += random_numbers(rng, RANDOM_OPERANDS // 2)
+    elif op == 'factorial':
+        edges = [str(n) for n in range(-3, engine.FACTORIAL_LIMIT + 3)] + ['3.7', '-0.5', '170', '1e20']
+        numbers = [str(rng.randint(0, engine.FACTORIAL_LIMIT)) for _ in range(RANDOM_OPERANDS)]
+    elif op in ('square_root', 'logarithm'):
+        edges = EDGE_NUMBERS
+        numbers = [repr(10 ** rng.uniform(-300, 300)) for _ in range(RANDOM_OPERANDS // 2)]
+        numbers += random_numbers(rng, RANDOM_OPERANDS // 2)
+    else:
+        edges = EDGE_NUMBERS
+        numbers = random_numbers(rng, RANDOM_OPERANDS)
+    return [(a, None) for a in edges + numbers]
+
+
+def format_operands(rng):
+    values = [float(text) for text in EDGE_NUMBERS]
+    values += [float(text) for text in random_numbers(rng, RANDOM_OPERANDS)]
+    values += [10 ** rng.uniform(-20, 20) for _ in range(RANDOM_OPERANDS // 2)]
+    return [(value, None) for value in values]
+
+
+# Decimal reference
+def _pi():
+    """Pi to PRECISION digits (recipe from the decimal module docs)"""
+    three = Decimal(3)
+    lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+    while s != lasts:
+        lasts = s
+        n, na = n + na, na + 8
+        d, da = d + da, da + 32
+        t = (t * n) / d
+        s += t
+    return +s
+
+
+def _reduce(degrees):
+    """degrees modulo 360, exact however large the angle"""
+    with localcontext() as ctx:
+        ctx.prec = PRECISION + max(0, degrees.adjusted())
+        angle = degrees % 360
+    return angle + 360 if angle < 0 else angle
+
+
+def _sin_cos(angle):
+    """Sine and cosine of an angle in degrees between 0 and 360"""
+    x = angle * _pi() / 180
+    sine, term, n = x, x, 1
+    while True:
+        term *= -x * x / ((n + 1) * (n + 2))
+        n += 2
+        if sine + term == sine:
+            break
+        sine += term
+    cosine, term, n = Decimal(1), Decimal(1), 0
+    while True:
+        term *= -x * x / ((n + 1) * (n + 2))
+        n += 2
+        if cosine + term == cosine:
+            break
+        cosine += term
+    return sine, cosine
+
+
+def _trig(index, a):
+    angle = _reduce(a)
+    sine, cosine = _sin_cos(angle)
+    if index == 2:
+        # Exactly at a pole, not where the series happens to be tiny
+        if angle in (90, 270):
+            return engine.INFINITY
+        return sine / cosine
+    value = (sine, cosine)[index]
+    # Exact zeros (sin 180, cos 90) come out as series noise
+    return Decimal(0) if abs(value) < Decimal(10) ** (10 - PRECISION) else value
+
+
+def _factorial(a):
+    n = int(a)
+    if n < 0:
+        return engine.NEGATIVE
+    if n > engine.FACTORIAL_LIMIT:
+        return engine.TOO_LARGE
+    return math.factorial(n)
+
+
+REFERENCE = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: engine.INFINITY if b == 0 else a / b,
+    'percentage': lambda a: a / 100,
+    'reciprocal': lambda a: engine.ERROR if a == 0 else 1 / a,
+    'square_root': lambda a: engine.IMAGINARY if a < 0 else a.sqrt(),
+    'square': lambda a: a * a,
+    'sine': lambda a: _trig(0, a),
+    'cosine': lambda a: _trig(1, a),
+    'tangent': lambda a: _trig(2, a),
+    'logarithm': lambda a: engine.NOT_POSITIVE if a <= 0 else a.log10(),
+    'factorial': _factorial,
+    'format': lambda a: a,
+}
+
+
+def reference(op, a, b):
+    """Exact result (Decimal or int) or the error text the engine should give"""
+    with localcontext() as ctx:
+        ctx.prec = PRECISION
+        # The exact values of the float operands, so that only the
+        # engine's own rounding is measured, not that of the input
+        args = [Decimal(float(a))] if b is None else [Decimal(float(a)), Decimal(float(b))]
+        result = REFERENCE[op](*args)
+        if isinstance(result, Decimal) and abs(result) > MAX_FLOAT:
+            return engine.INFINITY
+        return result
+
+
+def display_units(text, expected):
+    """Error of a display text in units of its last possible digit"""
+    if isinstance(expected, int):
+        # Factorials are shown with all digits
+        return float(abs(int(text) - expected))
+    value = Decimal(text)
+    mantissa, _, exponent = text.partition('e')
+    if exponent:
+        unit = Decimal(10) ** (int(exponent) - (DEFAULT_DIGITS - 1))
+    else:
+        unit = Decimal(10) ** -DEFAULT_DIGITS
+    unit = max(unit, Decimal(math.ulp(float(expected))))
+    with localcontext() as ctx:
+        ctx.prec = PRECISION
+        return float(abs(value - expected) / unit)
+
+
+def check(op, operands, results):
+    """Mismatch count, maximum error in display units and the worst cases"""
+    mismatches = 0
+    max_units = 0.0
+    worst = []
+    for (a, b), text in zip(operands, results):
+        expected = reference(op, a, b)
+        if isinstance(expected, str) or text in engine.ERROR_RESULTS:
+            units = 0.0 if text == expected else math.inf
+        else:
+            try:
+                units = display_units(text, expected)
+            except (ArithmeticError, ValueError):
+                units = math.inf
+        if units > MISMATCH_UNITS:
+            mismatches += 1
+            if len(worst) < 5:
+                worst.append({'a': a if op == 'format' else str(a), 'b': b, 'result': text,
+                              'expected': expected if isinstance(expected, str) else str(+expected)})
+        if units != math.inf:
+            max_units = max(max_units, units)
+    return mismatches, max_units, worst
+
+
+# Timing
+def clear_caches():
+    engine._function_cache.clear()
+    formatter.configure()
+
+
+def run_operation(op, operands):
+    """Results of one pass over the operands"""
+    if op == 'format':
+        return [engine.format_result(a) for a, _ in operands]
+    lhs = [a for a, _ in operands]
+    rhs = [b for _, b in operands] if operands[0][1] is not None else None
+    return engine.evaluate_many(op, lhs, rhs)
+
+
+def calibration_pass():
+    """Fixed pure-Python work, parsing and formatting floats like the engine"""
+    total = 0.0
+    for i in range(CALIBRATION_LOOPS):
+        total += float(repr(i * 0.37)) * 1.5
+    return total
+
+
+def calibration_sample(passes):
+    """Calibration loops per second of one timing sample"""
+    started = time.perf_counter()
+    for _ in range(passes):
+        calibration_pass()
+    return passes * CALIBRATION_LOOPS / (time.perf_counter() - started)
+
+
+def calibrate(op, operands):
+    """Results of one pass and the passes needed for a SAMPLE_SECONDS sample"""
+    clear_caches()
+    started = time.perf_counter()
+    results = run_operation(op, operands)
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    return results, max(1, math.ceil(SAMPLE_SECONDS / elapsed))
+
+
+def sample(op, operands, passes):
+    """Operations per second of one timing sample"""
+    started = time.perf_counter()
+    for _ in range(passes):
+        clear_caches()
+        run_operation(op, operands)
+    return passes * len(operands) / (time.perf_counter() - started)
+
+
+OPERATIONS = ['+', '-', '*', '/', 'percentage', 'reciprocal', 'square_root', 'square',
+              'sine', 'cosine', 'tangent', 'logarithm', 'factorial', 'format']
+
+
+def operand_set(op, seed):
+    rng = random.Random(f"{seed}:{op}")
+    if op in engine.BINARY_OPERATIONS:
+        return binary_operands(rng)
+    if op == 'format':
+        return format_operands(rng)
+    return unary_operands(rng, op)
+
+
+def compare(results, baseline, tolerance, throughput=True):
+    """Regressions of results against the baseline, as text"""
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if throughput and 'relative_speed' in base and \
+                result['relative_speed'] < base['relative_speed'] * (1 - tolerance):
+            failures.append(f"{name}: relative speed {result['relative_speed']:.4g} ({result['ops_per_sec']:.0f} ops/s), "
+                            f"baseline {base['relative_speed']:.4g}")
+        if result['mismatches'] > base['mismatches']:
+            failures.append(f"{name}: {result['mismatches']} mismatches, baseline {base['mismatches']}")
+        if result['max_error_units'] > max(base['max_error_units'], MISMATCH_UNITS / 2) * (1 + ERROR_SLACK):
+            failures.append(f"{name}: error {result['max_error_units']:.3g} units, "
+                            f"baseline {base['max_error_units']:.3g}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time engine operations and check them against Decimal.")
+    parser.add_argument('--repeat', type=int, default=7, help="timing samples per operation")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the random operands")
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help="allowed throughput drop against the baseline (0.3 = 30%%)")
+    parser.add_argument('--no-throughput-check', action='store_true',
+                        help="do not fail on throughput regressions, only on accuracy")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument('--update-baseline', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--output', help="write JSON results to this file (default stdout)")
+    args = parser.parse_args(argv)
+
+    operand_sets = {op: operand_set(op, args.seed) for op in OPERATIONS}
+    outputs = {}
+    passes = {}
+    for op, operands in operand_sets.items():
+        outputs[op], passes[op] = calibrate(op, operands)
+    started = time.perf_counter()
+    calibration_pass()
+    calibration_passes = max(1, math.ceil(SAMPLE_SECONDS / max(time.perf_counter() - started, 1e-6)))
+    # Samples of all operations take turns, so a stall of the machine
+    # costs every operation one sample instead of one operation all;
+    # each is paired with a calibration sample just before it
+    best = dict.fromkeys(OPERATIONS, 0.0)
+    ratios = {op: [] for op in OPERATIONS}
+    calibration = 0.0
+    for _ in range(max(1, args.repeat)):
+        for op, operands in operand_sets.items():
+            reference_speed = calibration_sample(calibration_passes)
+            speed = sample(op, operands, passes[op])
+            calibration = max(calibration, reference_speed)
+            best[op] = max(best[op], speed)
+            ratios[op].append(speed / reference_speed)
+
+    results = {}
+    for op, operands in operand_sets.items():
+        mismatches, max_units, worst = check(op, operands, outputs[op])
+        results[op] = {
+            'operands': len(operands),
+            'ops_per_sec': round(best[op]),
+            # Operations per calibration loop, median of the pairs
+            'relative_speed': round(statistics.median(ratios[op]), 5),
+            'mismatches': mismatches,
+            'max_error_units': round(max_units, 4),
+            'worst': worst,
+        }
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'calibration_per_sec': round(calibration),
+        'results': results,
+    }
+    failures = []
+    if args.update_baseline:
+        baseline = dict(report, results={name: {key: value for key, value in result.items() if key != 'worst'}
+                                         for name, result in results.items()})
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(baseline, indent=2) + '\n')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('seed') != args.seed:
+            parser.error(f"baseline was recorded with --seed {baseline.get('seed')}")
+        failures = compare(results, baseline['results'], args.tolerance, not args.no_throughput_check)
+    report['ok'] = not failures
+    report['failures'] = failures
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for failure in failures:
+        print(f"regression: {failure}", file=sys.stderr)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
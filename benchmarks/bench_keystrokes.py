@@ -0,0 +1,246 @@
+"""Keystroke replay benchmark for the Tk event path
+
+Drives AdvancedCalculator through real Tk key events:
+key_pressed -> add_digit/set_operator/calculate -> update_display ->
+display_var.set, then lets Tk run its idle tasks (redraws). Reports
+p50/p99 latency per event, events per second and idle-task time for
+each keystroke stream, as JSON.
+
+Usage:
+    python benchmarks/bench_keystrokes.py [--streams FILE] [--repeat N]
+                                          [--output FILE] [--compare FILE]
+
+Needs a display. Without $DISPLAY, Xvfb is started when available. The
+root window is withdrawn, and history is written to a temporary
+directory.
+
+A streams file is JSON: {"name": ["1", "+", "2", "Return", ...], ...}.
+Tokens are key symbols (or single characters) sent as key events;
+button names such as "sin", "x²" or "1/x" are run as button commands.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CALCULATOR_FILE = os.path.join(ROOT_DIR, 'python calculator.py')
+
+# Characters that need a key symbol name for event_generate
+KEYSYMS = {
+    '+': 'plus', '-': 'minus', '*': 'asterisk', '/': 'slash',
+    '=': 'equal', '.': 'period', '(': 'parenleft', ')': 'parenright',
+}
+
+# Tokens run as button commands instead of key events
+BUTTON_TOKENS = {
+    'sin': 'sine', 'cos': 'cosine', 'tan': 'tangent', 'log': 'logarithm',
+    '√': 'square_root', 'x²': 'square', 'x!': 'factorial', '1/x': 'reciprocal',
+    '%': 'percentage', '±': 'toggle_sign', 'π': 'pi', 'e': 'euler',
+}
+
+
+def load_calculator():
+    """Import the calculator script (its file name has a space)"""
+    sys.path.insert(0, ROOT_DIR)
+    spec = importlib.util.spec_from_file_location('calculator_app', CALCULATOR_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def start_virtual_display():
+    """Start Xvfb when there is no display; returns the process or None"""
+    if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'):
+        return None
+    xvfb = shutil.which('Xvfb')
+    if not xvfb:
+        raise SystemExit("No $DISPLAY and Xvfb not found")
+    display = ':%d' % (90 + os.getpid() % 10)
+    process = subprocess.Popen([xvfb, display, '-screen', '0', '1024x768x24', '-nolisten', 'tcp'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    os.environ['DISPLAY'] = display
+    return process
+
+
+def generate_streams(seed=1):
+    """Synthetic keystroke streams of different length and mix"""
+    rng = random.Random(seed)
+
+    def number():
+        return list(str(rng.randint(0, 99999))) + (['.'] + list(str(rng.randint(0, 999))) if rng.random() < 0.3 else [])
+
+    def arithmetic(count):
+        keys = []
+        while len(keys) < count:
+            keys += number() + [rng.choice('+-*/')] + number() + ['Return']
+        return keys[:count]
+
+    def digits(count):
+        keys = []
+        while len(keys) < count:
+            keys += [str(rng.randint(0, 9)) for _ in range(12)] + ['BackSpace', 'Escape']
+        return keys[:count]
+
+    def scientific(count):
+        keys = []
+        while len(keys) < count:
+            keys += list(str(rng.randint(0, 360))) + [rng.choice(['sin', 'cos', 'tan', 'log', '√', 'x²'])] + ['Escape']
+        return keys[:count]
+
+    def mixed(count):
+        keys = []
+        while len(keys) < count:
+            keys += rng.choice([arithmetic, digits, scientific])(20)
+        return keys[:count]
+
+    return {
+        'digits_200': digits(200),
+        'arithmetic_1000': arithmetic(1000),
+        'scientific_1000': scientific(1000),
+        'mixed_5000': mixed(5000),
+    }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def replay(app, root, keys):
+    """Replay one stream; returns per-event latencies and idle times (s)"""
+    latencies = []
+    idle_times = []
+    perf = time.perf_counter
+    for key in keys:
+        start = perf()
+        if key in BUTTON_TOKENS:
+            getattr(app, BUTTON_TOKENS[key])()
+        else:
+            root.event_generate('<KeyPress>', keysym=KEYSYMS.get(key, key))
+        handled = perf()
+        root.update_idletasks()
+        done = perf()
+        latencies.append(done - start)
+        idle_times.append(done - handled)
+    return latencies, idle_times
+
+
+def run(streams, repeat=3, history_path=None):
+    calculator = load_calculator()
+    import tkinter as tk
+
+    root = tk.Tk()
+    root.withdraw()
+    app = calculator.AdvancedCalculator(root, history_path=history_path)
+    root.update()
+
+    results = {}
+    for name, keys in streams.items():
+        latencies = []
+        idle_times = []
+        wall = 0.0
+        for _ in range(repeat):
+            app.clear_all()
+            root.update()
+            start = time.perf_counter()
+            run_latencies, run_idle = replay(app, root, keys)
+            wall += time.perf_counter() - start
+            latencies += run_latencies
+            idle_times += run_idle
+        results[name] = {
+            'events': len(latencies),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'mean_ms': statistics.fmean(latencies) * 1000,
+            'max_ms': max(latencies) * 1000,
+            'events_per_sec': len(latencies) / wall if wall else 0.0,
+            'idle_total_ms': sum(idle_times) * 1000,
+            'idle_p99_ms': percentile(idle_times, 0.99) * 1000,
+        }
+    app.on_close()
+    return results
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """Print per-stream change against an earlier result file"""
+    for name, stats in current['streams'].items():
+        old = baseline.get('streams', {}).get(name)
+        if not old:
+            continue
+        print(f"{name}: p50 {old['p50_ms']:.3f} -> {stats['p50_ms']:.3f} ms, "
+              f"p99 {old['p99_ms']:.3f} -> {stats['p99_ms']:.3f} ms, "
+              f"{old['events_per_sec']:.0f} -> {stats['events_per_sec']:.0f} events/s",
+              file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay keystrokes through the calculator's Tk event path.")
+    parser.add_argument('--streams', help="JSON file with recorded keystroke streams")
+    parser.add_argument('--repeat', type=int, default=3, help="replays per stream")
+    parser.add_argument('--output', help="write JSON results to this file (default stdout)")
+    parser.add_argument('--compare', help="earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    if args.streams:
+        with open(args.streams, 'r', encoding='utf-8') as f:
+            streams = json.load(f)
+    else:
+        streams = generate_streams()
+
+    xvfb = start_virtual_display()
+    workdir = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                stream_results = run(streams, repeat=args.repeat,
+                                     history_path=os.path.join(tmp, 'calculator_history.db'))
+            finally:
+                os.chdir(workdir)
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+    import tkinter
+    report = {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'tk': tkinter.TkVersion,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'streams': stream_results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
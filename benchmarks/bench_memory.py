@@ -0,0 +1,125 @@
+"""Memory use of history entries and calculator state
+
+Measures with tracemalloc how much memory 100k history entries take as
+the dicts used before (with a 'HH:MM:SS' string built per entry) and as
+HistoryRecord objects, the same for the service's per-session history,
+and for calculator state objects with and without __slots__. Reports
+bytes per 100k objects as JSON.
+
+Usage:
+    python benchmarks/bench_memory.py [--count N] [--output FILE]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from calculator_engine import CalculatorState
+from calculator_history import HistoryRecord
+from calculator_service import CallRecord
+
+
+def sample_rows(count):
+    """(id, timestamp, expression, result) rows as read from the store"""
+    start = time.time() - count
+    return [(index, start + index, f"{index} + {index % 97}", str(index + index % 97))
+            for index in range(count)]
+
+
+def dict_entry(row):
+    """History entry in the dict form used before HistoryRecord"""
+    return {
+        'id': row[0],
+        'timestamp': row[1],
+        'time': datetime.fromtimestamp(row[1]).strftime("%H:%M:%S"),
+        'expression': row[2],
+        'result': row[3],
+    }
+
+
+def record_entry(row):
+    return HistoryRecord(row[2], row[3], row[1], row[0])
+
+
+def call_dict(row):
+    return {'time': row[1], 'method': 'add', 'params': [row[0], row[0] % 97], 'result': row[3]}
+
+
+def call_record(row):
+    return CallRecord(row[1], 'add', [row[0], row[0] % 97], row[3])
+
+
+class DictState:
+    """Calculator state as loose instance attributes (the layout before)"""
+
+    def __init__(self):
+        self.current_input = ""
+        self.result = ""
+        self.operator = ""
+        self.waiting_for_operand = False
+        self.memory = 0
+
+
+def measure(build, rows):
+    """Bytes allocated and kept by build(row) for every row"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(row) for row in rows]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def compare(name, before, after, rows, per):
+    before_bytes = measure(before, rows) * per // len(rows)
+    after_bytes = measure(after, rows) * per // len(rows)
+    return {
+        'name': name,
+        'before_bytes': before_bytes,
+        'after_bytes': after_bytes,
+        'saved_percent': round(100 * (1 - after_bytes / before_bytes), 1) if before_bytes else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure memory per 100k history entries.")
+    parser.add_argument('--count', type=int, default=100000, help="entries per measurement")
+    parser.add_argument('--output', help="write JSON results to this file (default stdout)")
+    args = parser.parse_args(argv)
+
+    # Rows are built outside the measurement: both forms hold the same
+    # strings, only the containers differ
+    rows = sample_rows(max(1, args.count))
+    per = 100000
+    results = [
+        compare('history_entry', dict_entry, record_entry, rows, per),
+        compare('service_history_entry', call_dict, call_record, rows, per),
+        compare('calculator_state', lambda row: DictState(), lambda row: CalculatorState(), rows, per),
+    ]
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'entries': len(rows),
+        'unit': 'bytes per 100k objects',
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
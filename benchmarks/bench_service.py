@@ -0,0 +1,182 @@
+"""Load generator for the calculator JSON-RPC service
+
+Opens many concurrent connections to calculator_service, pipelines
+requests on each of them and reports requests per second and latency
+percentiles as JSON.
+
+Usage:
+    python benchmarks/bench_service.py [--connections N] [--requests N]
+                                       [--pipeline N] [--batch N]
+                                       [--host HOST --port PORT | --unix PATH]
+                                       [--output FILE]
+
+Without an address a service is started in a subprocess on a free port
+and stopped afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_FILE = os.path.join(ROOT_DIR, 'calculator_service.py')
+
+sys.path.insert(0, ROOT_DIR)
+from calculator_service import raise_open_file_limit
+
+
+def request_mix(rng):
+    """One random request: (method, params)"""
+    kind = rng.random()
+    if kind < 0.5:
+        method = rng.choice(['add', 'subtract', 'multiply', 'divide'])
+        return method, [rng.randint(0, 99999), rng.randint(1, 999)]
+    if kind < 0.8:
+        method = rng.choice(['sine', 'cosine', 'tangent', 'logarithm', 'square_root', 'square', 'factorial'])
+        return method, [rng.randint(1, 90)]
+    if kind < 0.9:
+        return rng.choice(['memory_add', 'memory_subtract']), [rng.randint(1, 100)]
+    return 'expression', [f"({rng.randint(1, 99)} + {rng.randint(1, 99)}) × {rng.randint(1, 9)}"]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def client(address, count, pipeline, batch, seed, latencies, errors):
+    """Send count requests on one connection, at most pipeline in flight"""
+    rng = random.Random(seed)
+    if isinstance(address, str):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(*address)
+    in_flight = asyncio.Semaphore(pipeline)
+    sent = {}
+    messages = (count + batch - 1) // batch
+
+    async def send():
+        next_id = 0
+        for _ in range(messages):
+            await in_flight.acquire()
+            items = []
+            for _ in range(min(batch, count - next_id)):
+                method, params = request_mix(rng)
+                items.append({'jsonrpc': '2.0', 'id': next_id, 'method': method, 'params': params})
+                next_id += 1
+            sent[items[0]['id']] = time.perf_counter()
+            message = items if batch > 1 else items[0]
+            writer.write(json.dumps(message).encode() + b'\n')
+            await writer.drain()
+
+    async def receive():
+        for _ in range(messages):
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("Connection closed by the service")
+            response = json.loads(line)
+            items = response if isinstance(response, list) else [response]
+            first = min(item['id'] for item in items if item.get('id') is not None)
+            elapsed = time.perf_counter() - sent.pop(first)
+            for item in items:
+                latencies.append(elapsed)
+                if 'error' in item:
+                    errors.append(item['error'].get('code'))
+            in_flight.release()
+
+    try:
+        await asyncio.gather(send(), receive())
+    finally:
+        writer.close()
+
+
+async def run_load(address, connections, requests, pipeline, batch):
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(client(address, requests, pipeline, batch, seed, latencies, errors) for seed in range(connections)),
+        return_exceptions=True)
+    wall = time.perf_counter() - start
+    failures = [repr(result) for result in results if isinstance(result, Exception)]
+    return {
+        'connections': connections,
+        'requests_per_connection': requests,
+        'pipeline': pipeline,
+        'batch': batch,
+        'requests': len(latencies),
+        'seconds': wall,
+        'requests_per_sec': len(latencies) / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else None,
+        'rpc_errors': len(errors),
+        'failed_connections': len(failures),
+        'first_failure': failures[0] if failures else None,
+    }
+
+
+def start_service():
+    """Start calculator_service on a free port; returns (process, (host, port))"""
+    process = subprocess.Popen([sys.executable, SERVICE_FILE, '--port', '0'],
+                               cwd=ROOT_DIR, stderr=subprocess.PIPE, text=True)
+    line = process.stderr.readline()
+    if 'listening on' not in line:
+        process.kill()
+        raise SystemExit(f"Service did not start: {line.strip()}")
+    host, port = line.rsplit(' ', 1)[1].rsplit(':', 1)
+    return process, (host, int(port))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure requests/sec of the calculator service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help="port of a running service")
+    parser.add_argument('--unix', metavar='PATH', help="Unix socket of a running service")
+    parser.add_argument('--connections', type=int, default=1000, help="concurrent connections")
+    parser.add_argument('--requests', type=int, default=100, help="requests per connection")
+    parser.add_argument('--pipeline', type=int, default=16, help="messages in flight per connection")
+    parser.add_argument('--batch', type=int, default=1, help="requests per message (JSON-RPC batch)")
+    parser.add_argument('--output', help="write JSON results to this file (default stdout)")
+    args = parser.parse_args(argv)
+
+    raise_open_file_limit()
+    process = None
+    if args.unix:
+        address = args.unix
+    elif args.port:
+        address = (args.host, args.port)
+    else:
+        process, address = start_service()
+    try:
+        results = asyncio.run(run_load(address, args.connections, max(1, args.requests),
+                                       max(1, args.pipeline), max(1, args.batch)))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Stress test for the shared history database
+
+Starts many processes that open the same history database at once (the
+first open imports an old journal, which must happen exactly once), add
+entries in small bursts and read pages in between, like calculator
+windows on a shared terminal server. Afterwards every entry of every
+writer must be in the database exactly once and the row ids must be
+dense. Reports the counts and timings as JSON and exits with status 1
+on lost or duplicated entries.
+
+Usage:
+    python benchmarks/stress_history.py [--writers N] [--entries N]
+                                        [--path FILE] [--output FILE]
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from calculator_history import HistoryStore
+
+# Entries in the old journal imported by the first instance
+JOURNAL_ENTRIES = 25
+
+
+def writer(path, journal_path, number, entries, start):
+    """One calculator instance: open, add entries in bursts, read pages"""
+    rng = random.Random(number)
+    start.wait()
+    store = HistoryStore(path, batch_size=rng.choice([1, 8, 64])).open(import_from=(journal_path, None, None))
+    try:
+        for index in range(entries):
+            store.add(f"w{number} #{index}", str(index))
+            if rng.random() < 0.05:
+                store.page(0, 20)
+            if rng.random() < 0.1:
+                time.sleep(rng.random() * 0.01)
+    finally:
+        store.close()
+
+
+def write_journal(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for index in range(JOURNAL_ENTRIES):
+            f.write(json.dumps({'expression': f"old #{index}", 'result': str(index), 'time': '12:00:00'}) + '\n')
+
+
+def check(path, writers, entries):
+    """Counts of lost, duplicated and unexpected entries"""
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute('SELECT expression FROM history').fetchall()
+        low, high = conn.execute('SELECT MIN(id), MAX(id) FROM history').fetchone()
+    finally:
+        conn.close()
+    counts = collections.Counter(row[0] for row in rows)
+    expected = {f"w{number} #{index}" for number in range(writers) for index in range(entries)}
+    expected.update(f"old #{index}" for index in range(JOURNAL_ENTRIES))
+    return {
+        'rows': len(rows),
+        'expected_rows': len(expected),
+        'lost': len(expected - set(counts)),
+        'duplicated': sum(count - 1 for count in counts.values() if count > 1),
+        'unexpected': len(set(counts) - expected),
+        'dense_ids': bool(rows) and high - low + 1 == len(rows),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Many processes writing one history database.")
+    parser.add_argument('--writers', type=int, default=32, help="concurrent writer processes")
+    parser.add_argument('--entries', type=int, default=500, help="entries per writer")
+    parser.add_argument('--path', help="database to use (default a new temporary file)")
+    parser.add_argument('--output', help="write JSON results to this file (default stdout)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.abspath(args.path or os.path.join(tmp, 'calculator_history.db'))
+        if os.path.exists(path):
+            parser.error(f"{path} exists, the test needs a new database")
+        journal_path = os.path.join(tmp, 'calculator_history.jsonl')
+        write_journal(journal_path)
+
+        start = multiprocessing.Event()
+        processes = [multiprocessing.Process(target=writer, args=(path, journal_path, number, args.entries, start))
+                     for number in range(args.writers)]
+        for process in processes:
+            process.start()
+        began = time.perf_counter()
+        start.set()
+        for process in processes:
+            process.join()
+        seconds = time.perf_counter() - began
+
+        results = check(path, args.writers, args.entries)
+        results.update({
+            'writers': args.writers,
+            'entries_per_writer': args.entries,
+            'failed_writers': sum(1 for process in processes if process.exitcode != 0),
+            'seconds': seconds,
+            'entries_per_sec': args.writers * args.entries / seconds if seconds else 0.0,
+        })
+
+    ok = (not results['lost'] and not results['duplicated'] and not results['unexpected']
+          and results['dense_ids'] and not results['failed_writers'])
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'ok': ok,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""Compact binary history archive
+
+Usage:
+    python calculator_archive.py pack [INPUT [OUTPUT]]   history -> archive
+    python calculator_archive.py unpack INPUT [OUTPUT]   archive -> JSON
+    python calculator_archive.py tail INPUT [-n N]       newest entries
+
+pack reads the calculator's history database (the shared one of
+default_store_path() when no INPUT is given, or a .db file) or a JSON /
+JSON-lines history file of earlier versions.
+
+An archive stores history entries as fixed-width records plus a table
+of interned strings, so an expression or result that occurs many times
+is stored once:
+
+    header    64 bytes    magic, version, counts and section offsets
+    records   24 bytes    timestamp (f64), expression id (u32),
+                          result id (u32), numeric value (f64, NaN if none)
+    offsets   8 bytes     start of each string in the blob, plus the end
+    blob                  UTF-8 strings
+
+HistoryArchive memory-maps the file. Entry i is read with one
+struct.unpack_from at a computed offset, so reading the newest N entries
+costs the same for a file of a hundred or a hundred million entries;
+nothing is parsed up front.
+"""
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+from calculator_cache import LRUCache
+from calculator_history import (HistoryRecord, HistoryStore, _legacy_timestamp, _numeric, _parse_time,
+                                default_store_path)
+
+ARCHIVE_FILE = 'calculator_history.bin'
+
+MAGIC = b'CALCHIST'
+VERSION = 1
+
+# magic, version, record size, record count, string count,
+# records offset, string offsets offset, blob offset, blob size
+_HEADER = struct.Struct('<8sIIQQQQQQ')
+HEADER_SIZE = 64
+_RECORD = struct.Struct('<dIId')
+_OFFSET = struct.Struct('<Q')
+
+# First bytes of a SQLite database file
+_SQLITE_MAGIC = b'SQLite format 3\0'
+
+
+class ArchiveError(ValueError):
+    """File is not a valid history archive"""
+
+
+def write_archive(path, entries, reference=None):
+    """Write entries (dicts with expression, result and timestamp or time)
+
+    reference is the date used for entries that only have a 'time' of
+    day. The file is written to a temporary name and then replaced, so a
+    crash never leaves a half-written archive. Returns the entry count.
+    """
+    if reference is None:
+        reference = time.time()
+    strings = {}
+    records = bytearray()
+    pack = _RECORD.pack
+
+    def intern(text):
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    # Legacy entries share few distinct times of day, parse each once
+    times = {}
+    count = 0
+    for entry in entries:
+        expression = str(entry['expression'])
+        result = str(entry['result'])
+        timestamp = entry.get('timestamp')
+        if not timestamp:
+            clock = entry.get('time')
+            timestamp = times.get(clock)
+            if timestamp is None:
+                timestamp = times[clock] = _parse_time(clock, reference)
+        value = _numeric(result)
+        records += pack(float(timestamp), intern(expression), intern(result),
+                        math.nan if value is None else value)
+        count += 1
+
+    blob = bytearray()
+    offsets = bytearray()
+    for text in strings:
+        offsets += _OFFSET.pack(len(blob))
+        blob += text.encode('utf-8')
+    offsets += _OFFSET.pack(len(blob))
+
+    records_offset = HEADER_SIZE
+    offsets_offset = records_offset + len(records)
+    blob_offset = offsets_offset + len(offsets)
+    header = _HEADER.pack(MAGIC, VERSION, _RECORD.size, count, len(strings),
+                          records_offset, offsets_offset, blob_offset, len(blob))
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.write(records)
+        f.write(offsets)
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return count
+
+
+class HistoryArchive:
+    """Read-only, memory-mapped view of a history archive"""
+
+    def __init__(self, path=ARCHIVE_FILE):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < HEADER_SIZE:
+                raise ArchiveError(f"{path}: too short for a history archive")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        (magic, version, record_size, self.count, self.string_count, self._records,
+         self._offsets, self._blob, blob_size) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ArchiveError(f"{path}: not a history archive")
+        if version != VERSION or record_size != _RECORD.size:
+            self.close()
+            raise ArchiveError(f"{path}: unsupported archive version {version}")
+        if self._blob + blob_size > size:
+            self.close()
+            raise ArchiveError(f"{path}: archive is truncated")
+        self._strings = LRUCache(maxsize=4096)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def string(self, index):
+        """Interned string by id"""
+        text = self._strings.get(index)
+        if text is None:
+            if not 0 <= index < self.string_count:
+                raise ArchiveError(f"{self.path}: bad string id {index}")
+            position = self._offsets + index * _OFFSET.size
+            start, end = struct.unpack_from('<QQ', self._map, position)
+            text = self._map[self._blob + start:self._blob + end].decode('utf-8')
+            self._strings.put(index, text)
+        return text
+
+    def _entries(self, start, end):
+        """HistoryRecords start..end, unpacking the records in one pass"""
+        records = self._map[self._records + start * _RECORD.size:self._records + end * _RECORD.size]
+        string = self.string
+        return [HistoryRecord(string(expression), string(result), timestamp, index)
+                for index, (timestamp, expression, result, _) in enumerate(_RECORD.iter_unpack(records), start + 1)]
+
+    def entry(self, index):
+        """HistoryRecord at index (0 = oldest)"""
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("history archive index out of range")
+        return self._entries(index, index + 1)[0]
+
+    def page(self, offset=0, limit=50):
+        """Entries offset..offset+limit, oldest first"""
+        offset = max(0, offset)
+        return self._entries(offset, max(offset, min(self.count, offset + limit)))
+
+    def newest(self, limit=50):
+        """The newest limit entries, oldest first"""
+        return self.page(max(0, self.count - limit), limit)
+
+    def __iter__(self):
+        for offset in range(0, self.count, 65536):
+            yield from self.page(offset, 65536)
+
+
+def read_json_entries(path):
+    """Entries of a legacy JSON list or a JSON-lines journal"""
+    with open(path, 'r', encoding='utf-8') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == '[':
+            entries = json.load(f)
+        else:
+            entries = [json.loads(line) for line in f if line.strip()]
+    return [entry for entry in entries if isinstance(entry, dict) and 'expression' in entry and 'result' in entry]
+
+
+def is_store(path):
+    """True if path is a SQLite database (a history store)"""
+    with open(path, 'rb') as f:
+        return f.read(len(_SQLITE_MAGIC)) == _SQLITE_MAGIC
+
+
+def pack_store(path, output):
+    """Write every entry of a history database to an archive; returns the count"""
+    if not os.path.exists(path):
+        raise OSError(f"{path}: no history database")
+    store = HistoryStore(path).open(import_from=None)
+    try:
+        return write_archive(output, store.entries())
+    finally:
+        store.close()
+
+
+def legacy_entries(entries):
+    """Entries as dicts of the legacy JSON file"""
+    return [{'expression': entry['expression'], 'result': entry['result'],
+             'time': entry['time'], 'timestamp': entry['timestamp']} for entry in entries]
+
+
+def write_json_entries(path, entries):
+    """Write entries as a JSON list in the legacy file layout"""
+    data = legacy_entries(entries)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        # dumps uses the C encoder, dump would encode piece by piece in Python
+        f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    os.replace(temp_path, path)
+    return len(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='calculator_archive',
+        description="Convert calculator history between JSON and the binary archive.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack = commands.add_parser('pack', help="history database, JSON or JSONL history to archive")
+    pack.add_argument('input', nargs='?', default=None,
+                      help="history database or file (default the calculator's history database)")
+    pack.add_argument('output', nargs='?', default=ARCHIVE_FILE)
+    unpack = commands.add_parser('unpack', help="archive to a JSON list")
+    unpack.add_argument('input', nargs='?', default=ARCHIVE_FILE)
+    unpack.add_argument('output', nargs='?', default=None, help="default stdout")
+    tail = commands.add_parser('tail', help="print the newest entries")
+    tail.add_argument('input', nargs='?', default=ARCHIVE_FILE)
+    tail.add_argument('-n', type=int, default=10, help="number of entries")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'pack':
+            source = args.input or default_store_path()
+            if not args.input or is_store(source):
+                count = pack_store(source, args.output)
+            else:
+                count = write_archive(args.output, read_json_entries(source), _legacy_timestamp(source))
+            print(f"{count} entries written to {args.output}", file=sys.stderr)
+        elif args.command == 'unpack':
+            with HistoryArchive(args.input) as archive:
+                if args.output:
+                    count = write_json_entries(args.output, archive)
+                    print(f"{count} entries written to {args.output}", file=sys.stderr)
+                else:
+                    print(json.dumps(legacy_entries(archive), ensure_ascii=False, indent=2))
+        else:
+            with HistoryArchive(args.input) as archive:
+                for entry in archive.newest(args.n):
+                    print(f"[{entry['time']}] {entry['expression']} = {entry['result']}")
+    except (OSError, ValueError) as e:
+        print(f"calculator_archive: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Batch evaluator - evaluate expressions line by line without the GUI
+
+Usage:
+    python calculator_batch.py [FILE ...] [--echo] [--jobs N]
+    python "python calculator.py" batch [FILE ...] [--echo] [--jobs N]
+
+Reads one expression per line from the files (or stdin when no file or
+"-" is given) and writes one result per line to stdout, in input order,
+as soon as it is known. Expressions use the calculator's rules, e.g.
+"12 × 3", "sin(30) + 1", "(1 + 2)²", "10!". Invalid lines give "Error",
+blank lines stay blank.
+
+Input is streamed, so memory use does not depend on input size. With
+--jobs the work is split across a process pool; only a fixed number of
+chunks is in flight at any time and results are still written in order.
+"""
+import argparse
+import collections
+import multiprocessing
+import sys
+
+from calculator_expression import evaluate_expression
+
+
+def evaluate_line(line, echo=False):
+    """Output text for one input line"""
+    expression = line.strip()
+    if not expression:
+        return ''
+    result = evaluate_expression(expression)
+    return f"{expression} = {result}" if echo else result
+
+
+def evaluate_lines(lines, echo=False):
+    """Output texts for a chunk of lines (runs in worker processes)"""
+    return [evaluate_line(line, echo) for line in lines]
+
+
+def read_lines(paths):
+    """Yield input lines from files or stdin without loading them whole"""
+    for path in paths or ['-']:
+        if path == '-':
+            yield from sys.stdin
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                yield from f
+
+
+def chunked(lines, size):
+    """Group lines into lists of at most size lines"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_serial(lines, out, echo=False, flush_each=False):
+    """Evaluate in this process, writing each result immediately"""
+    count = 0
+    for line in lines:
+        out.write(evaluate_line(line, echo) + '\n')
+        count += 1
+        if flush_each:
+            out.flush()
+    return count
+
+
+def run_parallel(lines, out, jobs, chunk_size=2000, echo=False):
+    """Evaluate chunks in a process pool, writing results in input order"""
+    count = 0
+    max_in_flight = jobs * 2
+    with multiprocessing.Pool(jobs) as pool:
+        pending = collections.deque()
+        for chunk in chunked(lines, chunk_size):
+            pending.append(pool.apply_async(evaluate_lines, (chunk, echo)))
+            # Bound memory: wait for the oldest chunk before reading on
+            if len(pending) >= max_in_flight:
+                count += _write_chunk(pending.popleft().get(), out)
+        while pending:
+            count += _write_chunk(pending.popleft().get(), out)
+    return count
+
+
+def _write_chunk(results, out):
+    out.write('\n'.join(results) + '\n')
+    out.flush()
+    return len(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='calculator batch',
+        description="Evaluate calculator expressions line by line.")
+    parser.add_argument('files', nargs='*', help="input files, '-' or none for stdin")
+    parser.add_argument('--echo', action='store_true', help="write 'expression = result' lines")
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="number of worker processes (0 = one per CPU)")
+    parser.add_argument('--chunk-size', type=int, default=2000,
+                        help="lines per work unit with --jobs")
+    args = parser.parse_args(argv)
+
+    jobs = args.jobs if args.jobs > 0 else multiprocessing.cpu_count()
+    lines = read_lines(args.files)
+    out = sys.stdout
+    try:
+        if jobs == 1:
+            interactive = not args.files and sys.stdin.isatty()
+            run_serial(lines, out, echo=args.echo, flush_each=interactive)
+        else:
+            run_parallel(lines, out, jobs, chunk_size=max(1, args.chunk_size), echo=args.echo)
+        out.flush()
+    except BrokenPipeError:
+        # Output closed early, e.g. piped into head
+        return 1
+    except OSError as e:
+        print(f"calculator batch: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
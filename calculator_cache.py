@@ -0,0 +1,63 @@
+"""Small bounded LRU cache with hit/miss counters"""
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Least recently used cache with a fixed maximum size"""
+
+    def __init__(self, maxsize=256):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return cached value and mark it as recently used"""
+        try:
+            value = self._data[key]
+            self._data.move_to_end(key)
+        except KeyError:
+            # Also covers eviction by another thread between the two calls
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store value, evicting the least recently used entry if full"""
+        self._data[key] = value
+        try:
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        except KeyError:
+            pass
+
+    def clear(self):
+        """Remove all entries and reset counters"""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        """Fraction of lookups served from the cache"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def info(self):
+        """Cache statistics as a dict"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hit_rate(),
+        }
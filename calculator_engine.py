@@ -0,0 +1,593 @@
+"""Calculator engine - arithmetic without any GUI
+
+All operations of AdvancedCalculator live here so they can be used
+without a Tk root. Every operation returns the text the calculator
+would show on its display.
+"""
+import math
+from decimal import MAX_EMAX, MIN_EMIN, Decimal, localcontext
+
+from calculator_cache import LRUCache
+from calculator_format import format_exact, format_number
+
+# Display texts for failed operations
+ERROR = "Error"
+INFINITY = "Infinity"
+IMAGINARY = "Imaginary Number"
+NOT_POSITIVE = "Error: Number must be positive"
+TOO_LARGE = "Number too large"
+NEGATIVE = "Error: Negative number"
+
+ERROR_RESULTS = frozenset([ERROR, INFINITY, IMAGINARY, NOT_POSITIVE, TOO_LARGE, NEGATIVE])
+
+# Largest factorial the calculator computes
+FACTORIAL_LIMIT = 100
+FACTORIAL_DIGITS = 158
+
+
+def format_result(result, digits=None):
+    """Display text of a numeric result (see calculator_format)
+
+    Infinite results are shown as INFINITY and NaN (e.g. inf - inf) as ERROR.
+    """
+    try:
+        return format_number(result, digits)
+    except OverflowError:
+        return INFINITY
+    except ValueError:
+        return ERROR
+
+
+# Memoized scientific functions
+#
+# Results of sin/cos/tan/log are kept in a shared LRU cache. Angles that
+# are multiples of 15 degrees come from a table of correctly rounded
+# values, so sin(30) is exactly 0.5 and tan(45) exactly 1.
+
+_function_cache = LRUCache(maxsize=4096)
+_degree_table = None
+
+
+def _build_degree_table():
+    """Correctly rounded sin/cos/tan for multiples of 15 degrees"""
+    table = {}
+    for angle in range(0, 360, 15):
+        sine_exact, cosine_exact = _sin_cos(angle, 40)
+        values = []
+        for value in (sine_exact, cosine_exact):
+            values.append(0.0 if abs(value) < Decimal('1e-30') else float(value))
+        sine_float, cosine_float = values
+        # None marks tan(90) and tan(270)
+        if cosine_float == 0:
+            tangent_float = None
+        elif sine_float == 0:
+            # sine_exact is only series noise here (tan 180)
+            tangent_float = 0.0
+        else:
+            tangent_float = float(sine_exact / cosine_exact)
+        table[angle] = (sine_float, cosine_float, tangent_float)
+    return table
+
+
+def _tangent_degrees(value):
+    """Tangent of an angle in degrees, accurate next to the poles
+
+    The angle is reduced exactly to |x| <= 90 and above 45 degrees
+    tan(x) = 1/tan(90 - x) is used, so an angle close to 90 is not
+    rounded to radians next to pi/2.
+    """
+    x = math.fmod(value, 180.0)
+    if x > 90.0:
+        x -= 180.0
+    elif x < -90.0:
+        x += 180.0
+    if abs(x) <= 45.0:
+        return math.tan(math.radians(x))
+    return math.copysign(1.0 / math.tan(math.radians(90.0 - abs(x))), x)
+
+
+def _trig_value(index, value):
+    """Sine (0), cosine (1) or tangent (2) of an angle in degrees"""
+    global _degree_table
+    angle = value % 360.0
+    if angle.is_integer() and int(angle) % 15 == 0:
+        if _degree_table is None:
+            _degree_table = _build_degree_table()
+        result = _degree_table[int(angle)][index]
+        if result is None:
+            raise ZeroDivisionError("tangent of odd multiple of 90 degrees")
+        return result
+
+    key = (index, value)
+    result = _function_cache.get(key)
+    if result is None:
+        # Reduce in degrees first: fmod is exact, while radians of a huge
+        # angle lose every digit of the result
+        radians = math.radians(math.fmod(value, 360.0))
+        if index == 0:
+            result = math.sin(radians)
+        elif index == 1:
+            result = math.cos(radians)
+        else:
+            result = _tangent_degrees(value)
+        _function_cache.put(key, result)
+    return result
+
+
+def sine_value(value):
+    """Sine of an angle in degrees as float"""
+    return _trig_value(0, value)
+
+
+def cosine_value(value):
+    """Cosine of an angle in degrees as float"""
+    return _trig_value(1, value)
+
+
+def tangent_value(value):
+    """Tangent of an angle in degrees as float
+
+    Raises ZeroDivisionError for odd multiples of 90 degrees.
+    """
+    return _trig_value(2, value)
+
+
+def logarithm_value(value):
+    """Base 10 logarithm of a positive float"""
+    key = (3, value)
+    result = _function_cache.get(key)
+    if result is None:
+        result = math.log10(value)
+        _function_cache.put(key, result)
+    return result
+
+
+def function_cache_info():
+    """Hits, misses, size and hit rate of the scientific function cache"""
+    return _function_cache.info()
+
+
+# Binary operations
+def add(a, b):
+    """Addition"""
+    return format_result(float(a) + float(b))
+
+
+def subtract(a, b):
+    """Subtraction"""
+    return format_result(float(a) - float(b))
+
+
+def multiply(a, b):
+    """Multiplication"""
+    return format_result(float(a) * float(b))
+
+
+def divide(a, b):
+    """Division"""
+    num2 = float(b)
+    if num2 == 0:
+        return INFINITY
+    return format_result(float(a) / num2)
+
+
+# Unary operations
+def percentage(a):
+    """Percentage"""
+    return format_result(float(a) / 100)
+
+
+def reciprocal(a):
+    """Reciprocal (1/x)"""
+    return format_result(1 / float(a))
+
+
+def square_root(a):
+    """Square root"""
+    value = float(a)
+    if value < 0:
+        return IMAGINARY
+    return format_result(math.sqrt(value))
+
+
+def square(a):
+    """Square (x²)"""
+    value = float(a)
+    # Overflows to inf like multiply; float ** 2 would raise instead
+    return format_result(value * value)
+
+
+def sine(a):
+    """Sine function (input in degrees)"""
+    return format_result(sine_value(float(a)))
+
+
+def cosine(a):
+    """Cosine function (input in degrees)"""
+    return format_result(cosine_value(float(a)))
+
+
+def tangent(a):
+    """Tangent function (input in degrees)"""
+    try:
+        return format_result(tangent_value(float(a)))
+    except ZeroDivisionError:
+        return INFINITY
+
+
+def logarithm(a):
+    """Logarithm (base 10)"""
+    value = float(a)
+    if value <= 0:
+        return NOT_POSITIVE
+    return format_result(logarithm_value(value))
+
+
+def factorial(a):
+    """Factorial"""
+    value = int(float(a))
+    if value < 0:
+        return NEGATIVE
+    if value > FACTORIAL_LIMIT:
+        return TOO_LARGE
+    # All digits, so the result can be used as an operand
+    return format_result(math.factorial(value), digits=FACTORIAL_DIGITS)
+
+
+# Constants
+def pi():
+    """Pi (π)"""
+    return format_result(math.pi, digits=15)
+
+
+def euler():
+    """Euler's number (e)"""
+    return format_result(math.e, digits=15)
+
+
+BINARY_OPERATIONS = {
+    '+': add,
+    '-': subtract,
+    '*': multiply,
+    '/': divide,
+    '×': multiply,
+    '÷': divide,
+}
+
+UNARY_OPERATIONS = {
+    'percentage': percentage,
+    '%': percentage,
+    'reciprocal': reciprocal,
+    '1/x': reciprocal,
+    'square_root': square_root,
+    '√': square_root,
+    'square': square,
+    'x²': square,
+    'sine': sine,
+    'sin': sine,
+    'cosine': cosine,
+    'cos': cosine,
+    'tangent': tangent,
+    'tan': tangent,
+    'logarithm': logarithm,
+    'log': logarithm,
+    'factorial': factorial,
+    'x!': factorial,
+}
+
+CONSTANTS = {
+    'pi': pi,
+    'π': pi,
+    'euler': euler,
+    'e': euler,
+}
+
+
+def _lookup(op):
+    """Find operation function and its number of operands"""
+    if op in BINARY_OPERATIONS:
+        return BINARY_OPERATIONS[op], 2
+    if op in UNARY_OPERATIONS:
+        return UNARY_OPERATIONS[op], 1
+    if op in CONSTANTS:
+        return CONSTANTS[op], 0
+    raise ValueError(f"Unknown operation: {op!r}")
+
+
+def _apply(func, arity, a, b):
+    """Call operation, turning failures into 'Error'"""
+    try:
+        if arity == 2:
+            return func(a, b)
+        if arity == 1:
+            return func(a)
+        return func()
+    except Exception:
+        return ERROR
+
+
+def evaluate(op, a=None, b=None):
+    """Evaluate one operation and return the display text
+
+    op is a binary operator ('+', '-', '*', '/', '×', '÷'), a unary
+    function name ('sine', 'sin', 'factorial', ...) or a constant
+    ('pi', 'e'). Unknown operations raise ValueError, any other failure
+    gives "Error" like the calculator display.
+    """
+    func, arity = _lookup(op)
+    return _apply(func, arity, a, b)
+
+
+def evaluate_many(ops, lhs, rhs=None):
+    """Evaluate many operations at once
+
+    ops is a single operation for all rows or a sequence with one
+    operation per row. lhs and rhs are lists (or arrays) of operands;
+    rhs is only needed for binary operations. Returns a list of display
+    texts in input order.
+    """
+    if rhs is None:
+        rhs = [None] * len(lhs)
+    elif len(rhs) != len(lhs):
+        raise ValueError("lhs and rhs must have the same length")
+
+    if isinstance(ops, str):
+        func, arity = _lookup(ops)
+        return [_apply(func, arity, a, b) for a, b in zip(lhs, rhs)]
+
+    if len(ops) != len(lhs):
+        raise ValueError("ops and lhs must have the same length")
+
+    # Resolve each distinct operation only once
+    resolved = {}
+    results = []
+    for op, a, b in zip(ops, lhs, rhs):
+        entry = resolved.get(op)
+        if entry is None:
+            entry = resolved[op] = _lookup(op)
+        results.append(_apply(entry[0], entry[1], a, b))
+    return results
+
+
+class CalculatorState:
+    """Input state of the keypad: pending operand, operator and memory"""
+
+    __slots__ = ('current_input', 'result', 'operator', 'waiting_for_operand', 'memory')
+
+    def __init__(self):
+        self.current_input = ""
+        self.result = ""
+        self.operator = ""
+        self.waiting_for_operand = False
+        self.memory = 0
+
+    def clear(self):
+        """Forget the pending calculation (memory is kept)"""
+        self.current_input = ""
+        self.result = ""
+        self.operator = ""
+        self.waiting_for_operand = False
+
+
+# Exact (arbitrary precision) mode
+#
+# Operations work on int and Decimal values with a chosen number of
+# significant digits. Integer results stay exact ints, so factorials have
+# no float limit.
+
+DEFAULT_PRECISION = 50
+
+# Largest factorial computed in exact mode (100000! takes ~0.2 s)
+EXACT_FACTORIAL_LIMIT = 200000
+
+
+def exact_value(a):
+    """Convert operand to int or Decimal without losing digits"""
+    if isinstance(a, (int, Decimal)):
+        return a
+    if isinstance(a, float):
+        return Decimal(repr(a))
+    text = str(a).strip()
+    if text.lstrip('+-').isdigit():
+        return int(text)
+    value = Decimal(text)
+    if not value.is_finite():
+        raise ValueError(f"Not a finite number: {a!r}")
+    return value
+
+
+def _exact_number(value):
+    """Int for integral values, otherwise the Decimal"""
+    if isinstance(value, Decimal) and value == value.to_integral_value() and value.adjusted() < 1000:
+        return int(value)
+    return value
+
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(value)
+
+
+def _pi(precision):
+    """Pi to precision digits (recipe from the decimal module docs)"""
+    with localcontext() as ctx:
+        ctx.prec = precision + 2
+        three = Decimal(3)
+        lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+    with localcontext() as ctx:
+        ctx.prec = precision
+        return +s
+
+
+def _sin_cos(degrees, precision):
+    """Sine and cosine of an angle in degrees (Taylor series)"""
+    with localcontext() as ctx:
+        ctx.prec = precision + 5
+        angle = _decimal(degrees) % 360
+        x = angle * _pi(precision + 5) / 180
+        # sine
+        i, lasts, s, fact, num, sign = 1, 0, x, 1, x, 1
+        while s != lasts:
+            lasts = s
+            i += 2
+            fact *= i * (i - 1)
+            num *= x * x
+            sign *= -1
+            s += num / fact * sign
+        sine_value = s
+        # cosine
+        i, lasts, s, fact, num, sign = 0, 0, Decimal(1), 1, Decimal(1), 1
+        while s != lasts:
+            lasts = s
+            i += 2
+            fact *= i * (i - 1)
+            num *= x * x
+            sign *= -1
+            s += num / fact * sign
+        return sine_value, s
+
+
+def _exact_divide(a, b):
+    if b == 0:
+        return INFINITY
+    if isinstance(a, int) and isinstance(b, int) and a % b == 0:
+        return a // b
+    return _exact_number(_decimal(a) / _decimal(b))
+
+
+def _exact_sqrt(a):
+    if a < 0:
+        return IMAGINARY
+    if isinstance(a, int):
+        root = math.isqrt(a)
+        if root * root == a:
+            return root
+    return _exact_number(_decimal(a).sqrt())
+
+
+def _exact_log(a):
+    if a <= 0:
+        return NOT_POSITIVE
+    return _exact_number(_decimal(a).log10())
+
+
+def _exact_factorial(a):
+    value = int(a)
+    if value < 0:
+        return NEGATIVE
+    if value > EXACT_FACTORIAL_LIMIT:
+        return TOO_LARGE
+    # math.factorial multiplies with binary splitting over odd parts
+    return math.factorial(value)
+
+
+def _exact_trig(function):
+    def compute(a, precision):
+        sine_value, cosine_value = _sin_cos(a, precision)
+        if function == 'sine':
+            result = sine_value
+        elif function == 'cosine':
+            result = cosine_value
+        else:
+            result = sine_value / cosine_value
+        # Drop noise in the last digits, e.g. sin(180) = 0
+        with localcontext() as ctx:
+            ctx.prec = precision
+            result = +result
+        if abs(result) < Decimal(10) ** -(precision - 2):
+            return 0
+        return _exact_number(result)
+    return compute
+
+
+_EXACT_BINARY = {
+    '+': lambda a, b: _exact_number(a + b),
+    '-': lambda a, b: _exact_number(a - b),
+    '*': lambda a, b: _exact_number(a * b),
+    '/': _exact_divide,
+}
+_EXACT_BINARY['×'] = _EXACT_BINARY['*']
+_EXACT_BINARY['÷'] = _EXACT_BINARY['/']
+
+_EXACT_UNARY = {
+    'percentage': lambda a: _exact_divide(a, 100),
+    'reciprocal': lambda a: _exact_divide(1, a),
+    'square_root': _exact_sqrt,
+    'square': lambda a: a * a,
+    'logarithm': _exact_log,
+    'factorial': _exact_factorial,
+}
+
+_EXACT_TRIG = {
+    'sine': _exact_trig('sine'),
+    'cosine': _exact_trig('cosine'),
+    'tangent': _exact_trig('tangent'),
+}
+
+
+def exact_compute(op, a=None, b=None, precision=DEFAULT_PRECISION):
+    """Evaluate operation exactly
+
+    Returns an int or Decimal rounded to precision significant digits, or
+    one of the ERROR_RESULTS texts.
+    """
+    func, arity = _lookup(op)
+    name = func.__name__
+    try:
+        with localcontext() as ctx:
+            ctx.prec = precision
+            ctx.Emax = MAX_EMAX
+            ctx.Emin = MIN_EMIN
+            if arity == 0:
+                return _pi(precision) if name == 'pi' else _exact_number(Decimal(1).exp())
+            a = exact_value(a)
+            if arity == 2:
+                return _EXACT_BINARY[op](a, exact_value(b))
+            if name in _EXACT_TRIG:
+                return _EXACT_TRIG[name](a, precision)
+            return _EXACT_UNARY[name](a)
+    except Exception:
+        return ERROR
+
+
+# Above these sizes exact_compute takes more than ~50 ms, see exact_is_slow
+SLOW_FACTORIAL = 30000
+SLOW_BITS = 500000
+SLOW_PRECISION = 1000
+
+
+def _bits(a):
+    """Approximate size of an operand in bits, without converting it"""
+    if isinstance(a, int):
+        return a.bit_length()
+    if isinstance(a, Decimal):
+        return len(a.as_tuple().digits) * 10 // 3
+    if isinstance(a, float) or a is None:
+        return 64
+    return len(str(a)) * 10 // 3
+
+
+def exact_is_slow(op, a=None, b=None, precision=DEFAULT_PRECISION):
+    """Rough check if exact_compute would block for a noticeable time"""
+    func, arity = _lookup(op)
+    name = func.__name__
+    if name == 'factorial':
+        try:
+            return SLOW_FACTORIAL < int(exact_value(a)) <= EXACT_FACTORIAL_LIMIT
+        except Exception:
+            return False
+    if name in _EXACT_TRIG or name in ('logarithm', 'square_root', 'pi', 'euler'):
+        return precision > SLOW_PRECISION or _bits(a) > SLOW_BITS
+    if arity == 2:
+        return _bits(a) + _bits(b) > 2 * SLOW_BITS
+    return _bits(a) > SLOW_BITS
+
+
+def exact_evaluate(op, a=None, b=None, precision=DEFAULT_PRECISION):
+    """Evaluate operation exactly and return the display text"""
+    return format_exact(exact_compute(op, a, b, precision))
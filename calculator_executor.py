@@ -0,0 +1,146 @@
+"""Background evaluation for the calculator GUI
+
+Expensive evaluations (huge factorials, products of huge integers,
+high precision functions, very long expressions) run in a worker
+process so the Tk mainloop keeps running. A process is used instead of
+a thread because big integer arithmetic holds the GIL for the whole
+operation, and because a process can be stopped: cancel() terminates
+the worker, and the next job starts a fresh one.
+
+The worker is started with the 'spawn' method: a forked copy of the
+GUI process would inherit Tk's state and the threads of the history
+store and the watchdog, which is not safe. Spawning takes longer, but
+the worker is kept for the next job.
+
+Results are collected by polling with root.after, so callbacks always
+run in the Tk thread.
+"""
+import itertools
+
+import calculator_engine as engine
+
+# Poll interval for the worker's result (ms)
+POLL_INTERVAL = 20
+
+# multiprocessing start method of the worker
+START_METHOD = 'spawn'
+
+
+def _worker(connection):
+    """Worker process loop: run (job id, function, args) jobs until None"""
+    while True:
+        try:
+            job = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+        job_id, func, args = job
+        try:
+            result = func(*args)
+        except Exception:
+            result = engine.ERROR
+        connection.send((job_id, result))
+
+
+class BackgroundEvaluator:
+    """Runs one evaluation at a time in a cancellable worker process"""
+
+    def __init__(self, root, poll_interval=POLL_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.process = None
+        self.connection = None
+        self.job_id = None
+        self.on_done = None
+        self.job_ids = itertools.count(1)
+
+    @property
+    def busy(self):
+        return self.job_id is not None
+
+    def start_worker(self):
+        """Start the worker process if it is not running"""
+        if self.process is not None and self.process.is_alive():
+            return
+        import multiprocessing
+
+        context = multiprocessing.get_context(START_METHOD)
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def submit(self, func, args, on_done):
+        """Run func(*args) in the worker, then on_done(result) in the Tk thread
+
+        func must be a module level function (it is pickled by name).
+        Runs func inline when no worker process can be started.
+        """
+        if self.busy:
+            raise RuntimeError("An evaluation is already running")
+        try:
+            self.start_worker()
+            job_id = next(self.job_ids)
+            self.connection.send((job_id, func, args))
+        except (OSError, ValueError):
+            self.stop_worker()
+            on_done(func(*args))
+            return
+        self.job_id = job_id
+        self.on_done = on_done
+        self.root.after(self.poll_interval, self.poll)
+
+    def poll(self):
+        """Deliver the result when the worker has sent it"""
+        if not self.busy:
+            return
+        try:
+            ready = self.connection.poll()
+            message = self.connection.recv() if ready else None
+        except (EOFError, OSError):
+            # Worker died (e.g. out of memory)
+            self.stop_worker()
+            message = (self.job_id, engine.ERROR)
+        if message is None:
+            self.root.after(self.poll_interval, self.poll)
+            return
+        job_id, result = message
+        if job_id != self.job_id:
+            self.root.after(self.poll_interval, self.poll)
+            return
+        on_done = self.on_done
+        self.job_id = None
+        self.on_done = None
+        on_done(result)
+
+    def cancel(self):
+        """Stop the running evaluation; its callback is never called"""
+        if not self.busy:
+            return False
+        self.job_id = None
+        self.on_done = None
+        self.stop_worker()
+        return True
+
+    def stop_worker(self):
+        """Terminate the worker process"""
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process.join(timeout=1)
+        if self.connection is not None:
+            self.connection.close()
+        self.process = None
+        self.connection = None
+
+    def close(self):
+        """Cancel any evaluation and shut the worker down"""
+        self.cancel()
+        if self.process is not None:
+            try:
+                self.connection.send(None)
+            except (OSError, ValueError):
+                pass
+            self.process.join(timeout=1)
+        self.stop_worker()
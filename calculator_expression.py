@@ -0,0 +1,361 @@
+"""Expression compiler for the calculator
+
+Turns an expression string such as "(2 + 3) × sin(30)²" into a reusable
+compiled form. Compiled expressions are kept in a bounded LRU cache so
+repeated expressions are only parsed once.
+
+Supported syntax:
+    numbers          12, 3.5, .5, 1e-3
+    operators        + - * / × ÷ ^ (power), unary - and +
+    postfix          x² (square), x% (percentage), x! (factorial)
+    prefix           √x
+    functions        sin cos tan (degrees), log (base 10), sqrt
+    constants        π, pi, e
+    variables        any other name, given when evaluating
+    parentheses      missing closing parentheses are added at the end
+    implicit ×       2π, 3(4 + 1), (1 + 1)(2 + 2)
+"""
+import math
+import re
+
+import calculator_engine as engine
+from calculator_cache import LRUCache
+
+# Token types
+NUMBER = 'number'
+NAME = 'name'
+OPERATOR = 'operator'
+POSTFIX = 'postfix'
+PREFIX = 'prefix'
+LPAREN = '('
+RPAREN = ')'
+
+# Instruction types of compiled code
+PUSH = 'push'
+LOAD = 'load'
+UNARY = 'unary'
+BINARY = 'binary'
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<name>[A-Za-z_][A-Za-z_0-9]*|π)
+      | (?P<operator>[-+*/×÷^])
+      | (?P<postfix>[²%!])
+      | (?P<prefix>√)
+      | (?P<lparen>\()
+      | (?P<rparen>\))
+    )""", re.VERBOSE)
+
+# Binary operators: precedence and right associativity
+BINARY_PRECEDENCE = {
+    '+': (1, False),
+    '-': (1, False),
+    '*': (2, False),
+    '/': (2, False),
+    '^': (4, True),
+}
+OPERATOR_ALIASES = {'×': '*', '÷': '/'}
+POSTFIX_NAMES = {'²': 'square', '%': 'percentage', '!': 'factorial'}
+UNARY_PRECEDENCE = 3
+
+FUNCTION_NAMES = {
+    'sin': 'sine',
+    'cos': 'cosine',
+    'tan': 'tangent',
+    'log': 'logarithm',
+    'sqrt': 'square_root',
+    '√': 'square_root',
+}
+CONSTANT_VALUES = {
+    'pi': math.pi,
+    'π': math.pi,
+    'e': math.e,
+}
+
+
+class _Outcome(Exception):
+    """Evaluation stopped with a calculator display text"""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.text = text
+
+
+# Numeric kernels, same rules as calculator_engine
+def _divide(a, b):
+    if b == 0:
+        raise _Outcome(engine.INFINITY)
+    return a / b
+
+
+def _square_root(a):
+    if a < 0:
+        raise _Outcome(engine.IMAGINARY)
+    return math.sqrt(a)
+
+
+def _logarithm(a):
+    if a <= 0:
+        raise _Outcome(engine.NOT_POSITIVE)
+    return engine.logarithm_value(a)
+
+
+def _factorial(a):
+    value = int(a)
+    if value < 0:
+        raise _Outcome(engine.NEGATIVE)
+    if value > engine.FACTORIAL_LIMIT:
+        raise _Outcome(engine.TOO_LARGE)
+    # Exact, like the factorial button; see format_value
+    return math.factorial(value)
+
+
+def _power(a, b):
+    try:
+        return math.pow(a, b)
+    except OverflowError:
+        raise _Outcome(engine.INFINITY)
+
+
+SCALAR_BINARY = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': _divide,
+    '^': _power,
+}
+
+SCALAR_UNARY = {
+    'neg': lambda a: -a,
+    # a ** 2 would raise OverflowError where a * a gives inf
+    'square': lambda a: a * a,
+    'percentage': lambda a: a / 100,
+    'factorial': _factorial,
+    'square_root': _square_root,
+    'sine': engine.sine_value,
+    'cosine': engine.cosine_value,
+    'tangent': engine.tangent_value,
+    'logarithm': _logarithm,
+}
+
+
+def scan(text):
+    """Yield (type, value, end) for each token of expression text
+
+    end is the offset just after the token. Raises ValueError at the
+    first character that does not start a token.
+    """
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Unexpected character {text[position]!r} at {position}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'lparen':
+            kind = LPAREN
+        elif kind == 'rparen':
+            kind = RPAREN
+        elif kind == OPERATOR:
+            value = OPERATOR_ALIASES.get(value, value)
+        position = match.end()
+        yield kind, value, position
+
+
+def tokenize(text):
+    """Split expression text into (type, value) tokens"""
+    return [(kind, value) for kind, value, _ in scan(text)]
+
+
+def parse(tokens):
+    """Convert tokens to postfix code with the shunting-yard algorithm
+
+    Returns a tuple of (instruction, argument) pairs.
+    """
+    output = []
+    # Stack items: ('(', function name or None) or (name, precedence, is_binary)
+    stack = []
+    expect_operand = True
+
+    def pop_operators(precedence, right_assoc):
+        while stack and stack[-1][0] != LPAREN:
+            top_precedence = stack[-1][1]
+            if top_precedence > precedence or (top_precedence == precedence and not right_assoc):
+                name, _, is_binary = stack.pop()
+                output.append((BINARY if is_binary else UNARY, name))
+            else:
+                break
+
+    for index, (kind, value) in enumerate(tokens):
+        starts_operand = kind in (NUMBER, NAME, PREFIX, LPAREN)
+        if not expect_operand and starts_operand:
+            # Implicit multiplication, e.g. 2π or 3(4 + 1)
+            pop_operators(*BINARY_PRECEDENCE['*'])
+            stack.append(('*', BINARY_PRECEDENCE['*'][0], True))
+            expect_operand = True
+
+        if expect_operand:
+            if kind == NUMBER:
+                output.append((PUSH, float(value)))
+                expect_operand = False
+            elif kind == NAME and value in CONSTANT_VALUES:
+                output.append((PUSH, CONSTANT_VALUES[value]))
+                expect_operand = False
+            elif kind in (NAME, PREFIX) and value in FUNCTION_NAMES:
+                function = FUNCTION_NAMES[value]
+                next_kind = tokens[index + 1][0] if index + 1 < len(tokens) else None
+                if next_kind == LPAREN:
+                    # Function applies to the following parenthesised group
+                    stack.append(('call', function))
+                else:
+                    stack.append((function, UNARY_PRECEDENCE, False))
+            elif kind == NAME:
+                output.append((LOAD, value))
+                expect_operand = False
+            elif kind == OPERATOR and value in '+-':
+                if value == '-':
+                    stack.append(('neg', UNARY_PRECEDENCE, False))
+            elif kind == LPAREN:
+                if stack and stack[-1][0] == 'call':
+                    stack[-1] = (LPAREN, stack[-1][1])
+                else:
+                    stack.append((LPAREN, None))
+            else:
+                raise ValueError(f"Unexpected {value!r}, expected a number")
+        elif kind == OPERATOR:
+            precedence, right_assoc = BINARY_PRECEDENCE[value]
+            pop_operators(precedence, right_assoc)
+            stack.append((value, precedence, True))
+            expect_operand = True
+        elif kind == POSTFIX:
+            output.append((UNARY, POSTFIX_NAMES[value]))
+        elif kind == RPAREN:
+            pop_operators(-1, False)
+            if not stack:
+                raise ValueError("Unbalanced parenthesis")
+            _, function = stack.pop()
+            if function:
+                output.append((UNARY, function))
+        else:
+            raise ValueError(f"Unexpected {value!r}")
+
+    if expect_operand:
+        raise ValueError("Incomplete expression" if tokens else "Empty expression")
+
+    # Close remaining parentheses
+    while stack:
+        item = stack.pop()
+        if item[0] == LPAREN:
+            if item[1]:
+                output.append((UNARY, item[1]))
+        else:
+            output.append((BINARY if item[2] else UNARY, item[0]))
+    return tuple(output)
+
+
+def format_value(value):
+    """Display text of an evaluated value; ints (factorials) with all digits"""
+    if isinstance(value, int):
+        return engine.format_result(value, digits=engine.FACTORIAL_DIGITS)
+    return engine.format_result(value)
+
+
+class CompiledExpression:
+    """Parsed expression that can be evaluated many times"""
+
+    def __init__(self, source, code):
+        self.source = source
+        self.code = code
+        self.variables = tuple(sorted({arg for op, arg in code if op == LOAD}))
+        self._program = tuple(self._resolve(op, arg) for op, arg in code)
+        self._constant = None
+
+    @staticmethod
+    def _resolve(op, arg):
+        if op == UNARY:
+            return op, SCALAR_UNARY[arg]
+        if op == BINARY:
+            return op, SCALAR_BINARY[arg]
+        return op, arg
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+    def value(self, **variables):
+        """Evaluate to a float (an exact int for a factorial)
+
+        Raises ValueError or OverflowError on bad input, and an internal
+        outcome error for results such as division by zero.
+        """
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        for op, arg in self._program:
+            if op == PUSH:
+                push(arg)
+            elif op == UNARY:
+                stack[-1] = arg(stack[-1])
+            elif op == BINARY:
+                b = pop()
+                stack[-1] = arg(stack[-1], b)
+            else:
+                push(float(variables[arg]))
+        return stack[0]
+
+    def evaluate(self, **variables):
+        """Evaluate and return the calculator display text"""
+        # A constant expression keeps its value, not the text: the
+        # notation may change between calls
+        if not self.variables and self._constant is not None:
+            value, error = self._constant
+            return error or format_value(value)
+        value = error = None
+        try:
+            value = self.value(**variables)
+        except _Outcome as outcome:
+            error = outcome.text
+        except (ZeroDivisionError, OverflowError):
+            error = engine.INFINITY
+        except Exception:
+            error = engine.ERROR
+        if not self.variables:
+            self._constant = (value, error)
+        # format_value maps inf and NaN (e.g. inf * 0) to their texts
+        return error or format_value(value)
+
+
+_cache = LRUCache(maxsize=512)
+
+
+def compile_expression(text):
+    """Compile expression text, using the LRU cache of compiled expressions
+
+    Raises ValueError when the expression is not valid.
+    """
+    key = text.strip()
+    compiled = _cache.get(key)
+    if compiled is None:
+        compiled = CompiledExpression(key, parse(tokenize(key)))
+        _cache.put(key, compiled)
+    return compiled
+
+
+def evaluate_expression(text, **variables):
+    """Compile (or reuse) and evaluate expression, returning display text"""
+    try:
+        compiled = compile_expression(text)
+    except ValueError:
+        return engine.ERROR
+    return compiled.evaluate(**variables)
+
+
+def cache_info():
+    """Hit/miss counters of the compiled expression cache"""
+    return _cache.info()
+
+
+def clear_cache():
+    """Empty the compiled expression cache"""
+    _cache.clear()
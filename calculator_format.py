@@ -0,0 +1,230 @@
+"""Number formatting for the calculator display
+
+Every result shown by the calculator goes through NumberFormatter, so
+ints, floats and Decimals are formatted by the same rules in every
+operation. Three notations are supported:
+
+    fixed          1234.5, 0.3333333333
+    scientific     1.2345e3
+    engineering    1.2345e3, 12.345e3, 123.45e3 (exponent a multiple of 3)
+
+Digit grouping (1,234,567) is applied to display text only, see
+group_digits(), because grouped text can not be read back as a number.
+
+Small ints and integral floats take a fast path. Other values are
+cached. Huge ints are never converted to str as a whole: only their
+leading and trailing digits are computed, so the cost of formatting
+grows linearly with the size of the number.
+"""
+import re
+from decimal import MAX_EMAX, MIN_EMIN, Context, Decimal, localcontext
+
+from calculator_cache import LRUCache
+
+# Notations
+FIXED = 'fixed'
+SCIENTIFIC = 'scientific'
+ENGINEERING = 'engineering'
+NOTATIONS = (FIXED, SCIENTIFIC, ENGINEERING)
+
+# Decimal places of floats in fixed notation (significant digits otherwise)
+DEFAULT_DIGITS = 10
+
+# Integers with more digits are shown as head…tail
+DISPLAY_DIGITS = 40
+
+# Ints below this bit length have at most DISPLAY_DIGITS digits
+_SMALL_INT_BITS = 130
+
+_GROUP_RE = re.compile(r'([-+]?)(\d+)(.*)', re.DOTALL)
+
+
+def _leading(n, count):
+    """Number of digits and leading digits of a non-negative int
+
+    Works on the top 200 bits only; when the bounds of that estimate
+    disagree (next to a power of ten) the exact value is used.
+    """
+    shift = max(0, n.bit_length() - 200)
+    with localcontext() as ctx:
+        ctx.prec = 80
+        ctx.Emax = MAX_EMAX
+        estimate = Decimal(n >> shift) * Decimal(2) ** shift
+        low = estimate * (1 - Decimal('1e-55'))
+        high = (estimate + Decimal(2) ** shift) * (1 + Decimal('1e-55'))
+    low_digits = low.as_tuple().digits[:count]
+    if low.adjusted() == high.adjusted() and low_digits == high.as_tuple().digits[:count]:
+        return low.adjusted() + 1, ''.join(map(str, low_digits))
+    digits = low.adjusted() + 1 if n < 10 ** (high.adjusted()) else high.adjusted() + 1
+    return digits, str(n // 10 ** max(0, digits - count))
+
+
+def count_digits(n):
+    """Number of decimal digits of an int, without converting it to str"""
+    n = abs(n)
+    if n < 10 ** DISPLAY_DIGITS:
+        return len(str(n))
+    return _leading(n, 1)[0]
+
+
+def format_big_int(n, head=15, tail=15, limit=DISPLAY_DIGITS):
+    """Show an int with more than limit digits as 'head…tail (N digits)'
+
+    Only the leading and trailing digits are computed, so this is fast
+    for numbers with millions of digits and not affected by the int to
+    str conversion limit.
+    """
+    sign = '-' if n < 0 else ''
+    n = abs(n)
+    if n < 10 ** limit:
+        return sign + str(n)
+    digits, head_text = _leading(n, head)
+    tail_text = str(n % 10 ** tail).zfill(tail)
+    return f"{sign}{head_text}…{tail_text} ({digits} digits)"
+
+
+def _exponent_text(sign, digits, exponent, engineering=False):
+    """'1.2345e3' style text from significant digits and decimal exponent"""
+    digits = digits.rstrip('0') or '0'
+    if digits == '0':
+        return '0'
+    point = 1
+    if engineering:
+        point += exponent % 3
+        exponent -= exponent % 3
+        digits = digits.ljust(point, '0')
+    mantissa = digits[:point]
+    if len(digits) > point:
+        mantissa += '.' + digits[point:]
+    if exponent == 0:
+        return sign + mantissa
+    return f"{sign}{mantissa}e{exponent}"
+
+
+def _decimal_parts(value):
+    """Sign, significant digits and adjusted exponent of a finite Decimal"""
+    sign, digits, _ = value.as_tuple()
+    return ('-' if sign else ''), ''.join(map(str, digits)), value.adjusted()
+
+
+def group_digits(text, separator=','):
+    """Insert separator between thousands of the leading integer part"""
+    match = _GROUP_RE.match(text)
+    if not match or len(match.group(2)) <= 3:
+        return text
+    sign, digits, rest = match.groups()
+    first = len(digits) % 3 or 3
+    groups = [digits[:first]]
+    groups.extend(digits[i:i + 3] for i in range(first, len(digits), 3))
+    return sign + separator.join(groups) + rest
+
+
+class NumberFormatter:
+    """Formats ints, floats and Decimals for the display"""
+
+    def __init__(self, notation=FIXED, digits=DEFAULT_DIGITS, cache_size=1024):
+        self._cache = LRUCache(cache_size)
+        self.notation = FIXED
+        self.digits = DEFAULT_DIGITS
+        self.configure(notation, digits)
+
+    def configure(self, notation=None, digits=None):
+        """Change notation and/or digits; cached texts are dropped"""
+        if notation is not None:
+            if notation not in NOTATIONS:
+                raise ValueError(f"Unknown notation: {notation!r}")
+            self.notation = notation
+        if digits is not None:
+            if digits < 1:
+                raise ValueError("digits must be at least 1")
+            self.digits = digits
+        self._cache.clear()
+
+    def cache_info(self):
+        """Hit/miss counters of the formatted text cache"""
+        return self._cache.info()
+
+    def format(self, value, digits=None):
+        """Display text of an int, float or Decimal
+
+        digits overrides the decimal places (fixed) or significant digits
+        of floats; for ints in fixed notation it raises the number of
+        digits shown in full. Raises OverflowError for infinite and
+        ValueError for NaN values.
+        """
+        if isinstance(value, int):
+            # Not cached: hashing a huge int costs as much as formatting it
+            if self.notation == FIXED:
+                if value.bit_length() < _SMALL_INT_BITS:
+                    return str(value)
+                return format_big_int(value, limit=max(digits or 0, DISPLAY_DIGITS))
+            return self._format_int(value)
+        # Fast path: integral floats in fixed notation
+        if self.notation == FIXED and isinstance(value, float) and value.is_integer():
+            return str(int(value))
+
+        key = (value.__class__, value, digits)
+        text = self._cache.get(key)
+        if text is None:
+            if isinstance(value, Decimal):
+                text = self._format_decimal(value)
+            else:
+                text = self._format_float(float(value), digits or self.digits)
+            self._cache.put(key, text)
+        return text
+
+    def _format_int(self, n):
+        sign = '-' if n < 0 else ''
+        n = abs(n)
+        if n.bit_length() < _SMALL_INT_BITS:
+            value = Decimal(n)
+        else:
+            count, head = _leading(n, self.digits + 1)
+            value = Decimal(head).scaleb(count - len(head))
+        value = Context(prec=self.digits, Emax=MAX_EMAX).plus(value)
+        _, digits, exponent = _decimal_parts(value)
+        return _exponent_text(sign, digits, exponent, self.notation == ENGINEERING)
+
+    def _format_decimal(self, value):
+        if not value.is_finite():
+            if value.is_nan():
+                raise ValueError("NaN")
+            raise OverflowError("Infinite result")
+        # Strip trailing zeros without rounding to the default precision
+        value = value.normalize(Context(prec=max(1, len(value.as_tuple().digits)), Emax=MAX_EMAX, Emin=MIN_EMIN))
+        if self.notation == FIXED:
+            if -DISPLAY_DIGITS < value.adjusted() < DISPLAY_DIGITS:
+                return format(value, 'f')
+            return str(value)
+        return _exponent_text(*_decimal_parts(value), self.notation == ENGINEERING)
+
+    def _format_float(self, value, digits):
+        if value != value:
+            raise ValueError("NaN")
+        if value in (float('inf'), float('-inf')):
+            raise OverflowError("Infinite result")
+        if self.notation == FIXED:
+            text = format(value, f'.{digits}f').rstrip('0').rstrip('.')
+            if text not in ('0', '-0'):
+                return text
+            if value == 0:
+                return '0'
+            # Too small for fixed notation: keep the significant digits
+        rounded = Decimal(format(value, f'.{digits - 1}e'))
+        return _exponent_text(*_decimal_parts(rounded), self.notation == ENGINEERING)
+
+
+# Shared formatter used by the calculator engine
+formatter = NumberFormatter()
+
+
+def format_number(value, digits=None):
+    """Format value with the shared formatter"""
+    return formatter.format(value, digits)
+
+
+def format_exact(value):
+    """Display text of an exact result (int, Decimal or error text)"""
+    if isinstance(value, str):
+        return value
+    return formatter.format(value)
@@ -0,0 +1,463 @@
+"""Calculation history storage
+
+HistoryStore keeps every calculation in a SQLite database with indexes
+for search, value ranges and paged reads. By default all instances share
+one database in the per-user data directory (see default_store_path);
+SQLite's file locks serialize their writes, and each instance reads the
+entries the others have committed.
+
+History files of earlier versions (the JSON-lines journal and the JSON
+list before it) are only read, by read_journal, to import them into a
+new database; they are never written.
+
+Entries read back are HistoryRecord objects: slotted, with a numeric
+timestamp, and the 'HH:MM:SS' text only built when it is read.
+"""
+import atexit
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from calculator_cache import LRUCache
+
+JOURNAL_FILE = 'calculator_history.jsonl'
+LEGACY_FILE = 'calculator_history.json'
+STORE_FILE = 'calculator_history.db'
+
+# Environment variable with the path of the shared history database
+STORE_ENV = 'CALCULATOR_HISTORY'
+
+# Seconds a write waits for another instance's lock before retrying
+BUSY_TIMEOUT = 30.0
+
+# Cached 'HH:MM:SS' texts, keyed by whole second
+_clock_texts = LRUCache(maxsize=1024)
+
+# Writer thread commands of HistoryStore
+_APPEND = 'append'
+_CLEAR = 'clear'
+_FLUSH = 'flush'
+_STOP = 'stop'
+
+
+def clock_text(timestamp):
+    """'HH:MM:SS' local time of a timestamp"""
+    second = int(timestamp)
+    text = _clock_texts.get(second)
+    if text is None:
+        text = datetime.fromtimestamp(timestamp).strftime("%H:%M:%S")
+        _clock_texts.put(second, text)
+    return text
+
+
+class HistoryRecord:
+    """One history entry
+
+    Indexing with the old dict keys ('id', 'timestamp', 'time',
+    'expression', 'result') still works, so code written for dict
+    entries can read records unchanged.
+    """
+
+    __slots__ = ('id', 'timestamp', 'expression', 'result')
+
+    KEYS = ('id', 'timestamp', 'time', 'expression', 'result')
+
+    def __init__(self, expression, result, timestamp, id=None):
+        self.id = id
+        self.timestamp = timestamp
+        self.expression = expression
+        self.result = result
+
+    @property
+    def time(self):
+        return clock_text(self.timestamp)
+
+    @property
+    def value(self):
+        """Numeric value of the result, None for texts like 'Error'"""
+        return _numeric(self.result)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+
+    def __repr__(self):
+        return f"HistoryRecord({self.expression!r}, {self.result!r}, {self.timestamp!r}, id={self.id!r})"
+
+    def as_dict(self):
+        """Entry as a dict, e.g. for JSON"""
+        return {key: getattr(self, key) for key in self.KEYS}
+
+
+def read_journal(journal_path=JOURNAL_FILE, legacy_path=LEGACY_FILE):
+    """Entries of the history files of earlier versions, never writing them
+
+    The JSON-lines journal if it exists, read up to a truncated or
+    damaged line (e.g. after a crash); otherwise the old pretty-printed
+    JSON list. Missing or unreadable files give no entries.
+    """
+    if journal_path and os.path.exists(journal_path):
+        entries = []
+        try:
+            with open(journal_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break
+        except OSError:
+            pass
+        return entries
+    if not legacy_path or not os.path.exists(legacy_path):
+        return []
+    try:
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        return entries if isinstance(entries, list) else []
+    except (OSError, ValueError):
+        return []
+
+
+def data_dir():
+    """Absolute path of the calculator's per-user data directory"""
+    if os.name == 'nt':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(os.path.abspath(base), 'calculator')
+
+
+def default_store_path():
+    """Absolute path of the shared history database
+
+    $CALCULATOR_HISTORY if set, otherwise calculator_history.db in the
+    per-user data directory, so every window and working directory uses
+    the same history.
+    """
+    path = os.environ.get(STORE_ENV)
+    if path:
+        return os.path.abspath(os.path.expanduser(path))
+    return os.path.join(data_dir(), STORE_FILE)
+
+
+class HistoryStore:
+    """Unbounded history in a local SQLite database
+
+    Entries are inserted by a background writer in batched transactions.
+    Rows are only ever appended or cleared all at once, so row ids are
+    dense and a page at any offset is a primary key range lookup. This
+    holds with several instances writing, since SQLite assigns the ids
+    while holding the database write lock.
+    """
+
+    def __init__(self, path=None, batch_size=64, commit_interval=0.5):
+        self.path = path or default_store_path()
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closed = False
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def open(self, import_from=(JOURNAL_FILE, LEGACY_FILE, STORE_FILE)):
+        """Open database, importing older history files on first use
+
+        import_from is (journal, legacy JSON, old database) paths; the
+        defaults are the files earlier versions kept in the working
+        directory.
+        """
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = self._connect()
+        self._create(import_from)
+        return self
+
+    def _connect(self):
+        if self.path == ':memory:':
+            # Writer and reader connections must share one in-memory database
+            conn = sqlite3.connect(f'file:history{id(self)}?mode=memory&cache=shared',
+                                   uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _create(self, import_from):
+        """Create the schema, importing older history files into a new database
+
+        Instances started at the same time may all find no database file;
+        the check and the import run in one write transaction, so only the
+        first one imports.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history'").fetchone()
+                for statement in _SCHEMA.split(';'):
+                    if statement.strip():
+                        self._conn.execute(statement)
+                if not exists and import_from:
+                    self._conn.executemany(_INSERT, self._old_rows(*import_from))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _old_rows(self, journal_path, legacy_path, store_path=None):
+        """Rows from the history files of earlier versions"""
+        if store_path and os.path.exists(store_path) and not _same_file(store_path, self.path):
+            old = sqlite3.connect(f'file:{os.path.abspath(store_path)}?mode=ro', uri=True)
+            try:
+                return old.execute('SELECT timestamp, expression, result, value FROM history ORDER BY id').fetchall()
+            except sqlite3.DatabaseError:
+                pass
+            finally:
+                old.close()
+        entries = read_journal(journal_path, legacy_path)
+        return _rows(entries, _legacy_timestamp(journal_path, legacy_path))
+
+    def import_entries(self, entries, timestamp=None):
+        """Insert existing entries (dicts with expression and result)"""
+        rows = _rows(entries, time.time() if timestamp is None else timestamp)
+        with self._lock, self._conn:
+            self._conn.executemany(_INSERT, rows)
+
+    # Writing
+    def add(self, expression, result, timestamp=None):
+        """Queue a new entry and return immediately"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            self._pending += 1
+        self._send(_APPEND, (timestamp, expression, result, _numeric(result)))
+
+    def clear(self):
+        """Delete all entries"""
+        self._send(_CLEAR)
+        self.flush()
+
+    def flush(self):
+        """Wait until all queued entries are committed"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._send(_FLUSH, done)
+        done.wait()
+
+    def close(self):
+        """Commit pending entries and close the database"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put((_STOP, None))
+            self._thread.join()
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _send(self, command, payload=None):
+        if self._closed:
+            raise ValueError("History store is closed")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name='history-store-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        self._queue.put((command, payload))
+
+    def _writer(self):
+        """Background thread: insert entries in batched transactions"""
+        conn = self._connect()
+        batch = []
+        try:
+            while True:
+                try:
+                    command, payload = self._queue.get(timeout=self.commit_interval)
+                except queue.Empty:
+                    command, payload = None, None
+
+                if command == _APPEND:
+                    batch.append(payload)
+                    if not self._queue.empty() and len(batch) < self.batch_size:
+                        continue
+                if batch:
+                    self._insert(conn, batch)
+                    with self._lock:
+                        self._pending -= len(batch)
+                    batch = []
+                if command == _CLEAR:
+                    with conn:
+                        conn.execute('DELETE FROM history')
+                elif command == _FLUSH:
+                    payload.set()
+                elif command == _STOP:
+                    break
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert(conn, batch):
+        """Insert a batch, waiting as long as other instances hold the lock"""
+        delay = 0.05
+        while True:
+            try:
+                with conn:
+                    conn.executemany(_INSERT, batch)
+                return
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+            time.sleep(delay)
+            delay = min(1.0, delay * 2)
+
+    # Reading
+    def _query(self, sql, params=()):
+        if self._pending:
+            self.flush()
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_entry(row) for row in rows]
+
+    def _scalar(self, sql, params=()):
+        if self._pending:
+            self.flush()
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def count(self):
+        """Number of stored entries"""
+        # Ids are dense, so this avoids a full COUNT(*) scan
+        return self._scalar('SELECT IFNULL(MAX(id) - MIN(id) + 1, 0) FROM history')
+
+    def page(self, offset=0, limit=50):
+        """Entries newest first, starting offset entries from the newest"""
+        return self._query(
+            _SELECT + ' WHERE id <= (SELECT MAX(id) FROM history) - ? ORDER BY id DESC LIMIT ?',
+            (offset, limit))
+
+    def entries(self, batch=65536):
+        """Every entry, oldest first, read batch rows at a time"""
+        last_id = 0
+        while True:
+            rows = self._query(_SELECT + ' WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch))
+            yield from rows
+            if len(rows) < batch:
+                return
+            last_id = rows[-1].id
+
+    def offset_at_time(self, timestamp):
+        """Page offset of the newest entry at or before timestamp"""
+        entry_id = self._scalar(
+            'SELECT IFNULL((SELECT id FROM history WHERE timestamp <= ? ORDER BY timestamp DESC LIMIT 1),'
+            ' (SELECT MIN(id) FROM history))', (timestamp,))
+        if entry_id is None:
+            return 0
+        return self._scalar('SELECT MAX(id) FROM history') - entry_id
+
+    @staticmethod
+    def _search_filter(text, prefix):
+        if prefix:
+            # Range comparison so the expression and result indexes are used
+            high = text + '\U0010ffff'
+            return ' WHERE (expression >= ? AND expression < ?) OR (result >= ? AND result < ?)', (text, high, text, high)
+        return ' WHERE instr(expression, ?) > 0 OR instr(result, ?) > 0', (text, text)
+
+    def search(self, text, prefix=False, offset=0, limit=50):
+        """Entries whose expression or result contains (or starts with) text"""
+        where, params = self._search_filter(text, prefix)
+        return self._query(_SELECT + where + ' ORDER BY id DESC LIMIT ? OFFSET ?', params + (limit, offset))
+
+    def search_count(self, text, prefix=False):
+        """Number of entries matching search"""
+        where, params = self._search_filter(text, prefix)
+        return self._scalar('SELECT COUNT(*) FROM history' + where, params)
+
+    def results_between(self, low, high, offset=0, limit=50):
+        """Entries with a numeric result in [low, high]"""
+        return self._query(
+            _SELECT + ' WHERE value BETWEEN ? AND ? ORDER BY value, id LIMIT ? OFFSET ?',
+            (low, high, limit, offset))
+
+    def between_times(self, start, end, offset=0, limit=50):
+        """Entries with start <= timestamp < end, newest first"""
+        return self._query(
+            _SELECT + ' WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp DESC LIMIT ? OFFSET ?',
+            (start, end, limit, offset))
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    expression TEXT NOT NULL,
+    result TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+CREATE INDEX IF NOT EXISTS history_expression ON history (expression);
+CREATE INDEX IF NOT EXISTS history_result ON history (result);
+CREATE INDEX IF NOT EXISTS history_value ON history (value);
+'''
+_INSERT = 'INSERT INTO history (timestamp, expression, result, value) VALUES (?, ?, ?, ?)'
+_SELECT = 'SELECT id, timestamp, expression, result FROM history'
+
+
+def _entry(row):
+    """Database row to history record"""
+    return HistoryRecord(row[2], row[3], row[1], row[0])
+
+
+def _rows(entries, timestamp):
+    """Insert rows of entry dicts; entries with only a time get the date of timestamp"""
+    rows = []
+    for entry in entries:
+        ts = entry.get('timestamp') or _parse_time(entry.get('time'), timestamp)
+        rows.append((ts, entry['expression'], entry['result'], _numeric(entry['result'])))
+    return rows
+
+
+def _same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+def _numeric(result):
+    """Numeric value of a result, None for texts like 'Error'"""
+    try:
+        value = float(result)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _legacy_timestamp(*paths):
+    """Modification time of the newest existing file"""
+    times = [os.path.getmtime(p) for p in paths if p and os.path.exists(p)]
+    return max(times) if times else time.time()
+
+
+def _parse_time(text, reference):
+    """Combine a stored 'HH:MM:SS' string with the date of reference"""
+    try:
+        clock = datetime.strptime(text, "%H:%M:%S").time()
+    except (TypeError, ValueError):
+        return reference
+    return datetime.combine(datetime.fromtimestamp(reference).date(), clock).timestamp()
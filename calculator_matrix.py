@@ -0,0 +1,206 @@
+"""Matrix and vector operations on NumPy arrays
+
+    a = parse_matrix("1 2; 3 4")
+    b = parse_matrix("5 6\n7 8")
+    apply('·', a, b)        # matrix product
+    apply('sin', a)         # element-wise, degrees as everywhere else
+    apply('det', a)         # -2.0
+
+Element-wise operations use the vectorized kernels of calculator_table,
+so they follow the calculator's rules: angles in degrees (exact at
+multiples of 15), and a failing element, such as log(0), fails the whole
+operation with the calculator's error text and the element's position.
+Every operation is a few NumPy calls, with no Python loop over elements.
+
+Matrices are entered as text: one row per line (or separated by ';'),
+numbers separated by spaces or commas. A single number is a 1×1 matrix
+and combines with any matrix element by element.
+"""
+import math
+import re
+
+import calculator_engine as engine
+from calculator_table import STATUS_TEXTS, VECTOR_BINARY, VECTOR_UNARY
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Largest matrix accepted (elements)
+MAX_ELEMENTS = 4000 * 4000
+
+# Matrices up to this many elements are written back as editable text
+EDIT_LIMIT = 10000
+
+_ROW_SPLIT_RE = re.compile(r'[;\n]|\]\s*,?\s*\[')
+_NUMBER_SPLIT_RE = re.compile(r'[\s,\[\]]+')
+
+
+class MatrixError(ValueError):
+    """Invalid matrix input or an operation that can not be done"""
+
+
+def available():
+    return np is not None
+
+
+def _require_numpy():
+    if np is None:
+        raise MatrixError("Matrix mode needs NumPy (pip install numpy)")
+
+
+def parse_matrix(text):
+    """2-D float array from rows of numbers; lines starting with # are ignored"""
+    _require_numpy()
+    rows = [row for row in _ROW_SPLIT_RE.split(text)
+            if row.strip() and not row.lstrip().startswith('#')]
+    if not rows:
+        raise MatrixError("Empty matrix")
+    columns = len([token for token in _NUMBER_SPLIT_RE.split(rows[0]) if token])
+    tokens = _NUMBER_SPLIT_RE.split(' '.join(rows))
+    if tokens and not tokens[0]:
+        del tokens[0]
+    if tokens and not tokens[-1]:
+        del tokens[-1]
+    if len(tokens) > MAX_ELEMENTS:
+        raise MatrixError(f"Too many elements ({len(tokens)}), at most {MAX_ELEMENTS}")
+    if len(tokens) != len(rows) * columns:
+        raise MatrixError("All rows must have the same number of values")
+    try:
+        values = np.array(tokens, dtype=float)
+    except ValueError as e:
+        token = str(e).rsplit(':', 1)[-1].strip().strip("'")
+        raise MatrixError(f"Not a number: {token}")
+    if not np.isfinite(values).all():
+        raise MatrixError("Matrix values must be finite")
+    return values.reshape(len(rows), columns)
+
+
+def shape_text(matrix):
+    """'rows×columns'"""
+    return '×'.join(map(str, np.shape(matrix)))
+
+
+def _check(result, status=None):
+    """Raise the first failed or non-finite element of a result"""
+    failed = np.flatnonzero(status) if status is not None else ()
+    if len(failed):
+        index = failed[0]
+        row, column = np.unravel_index(index, result.shape)
+        raise MatrixError(f"{STATUS_TEXTS[status.flat[index]]} at row {row + 1}, column {column + 1}")
+    bad = np.flatnonzero(~np.isfinite(result))
+    if len(bad):
+        row, column = np.unravel_index(bad[0], result.shape)
+        text = engine.INFINITY if np.isinf(result.flat[bad[0]]) else engine.ERROR
+        raise MatrixError(f"{text} at row {row + 1}, column {column + 1}")
+    return result
+
+
+def elementwise(op, a, b=None):
+    """Binary operator ('+', '-', '*', '/', '^') or unary engine operation per element"""
+    _require_numpy()
+    with np.errstate(all='ignore'):
+        if b is None:
+            a = np.asarray(a, dtype=float)
+            status = np.zeros(a.size, dtype=np.int8)
+            result = VECTOR_UNARY[op](a.ravel(), status).reshape(a.shape)
+        else:
+            try:
+                a, b = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+            except ValueError:
+                raise MatrixError(f"Shapes {shape_text(a)} and {shape_text(b)} do not match")
+            status = np.zeros(a.size, dtype=np.int8)
+            result = VECTOR_BINARY[op](a.ravel(), b.ravel(), status).reshape(a.shape)
+    return _check(result, status.reshape(result.shape))
+
+
+def matmul(a, b):
+    if a.shape[1] != b.shape[0]:
+        raise MatrixError(f"Can not multiply {shape_text(a)} by {shape_text(b)}: "
+                          f"columns of the first must equal rows of the second")
+    with np.errstate(all='ignore'):
+        return _check(a @ b)
+
+
+def transpose(a):
+    return a.T.copy()
+
+
+def _require_square(a, name):
+    if a.shape[0] != a.shape[1]:
+        raise MatrixError(f"{name} needs a square matrix, not {shape_text(a)}")
+
+
+def determinant(a):
+    _require_square(a, "Determinant")
+    with np.errstate(all='ignore'):
+        value = float(np.linalg.det(a))
+    # Finite entries can still overflow (inf) or meet inf * 0 (NaN)
+    if not math.isfinite(value):
+        raise MatrixError(f"Determinant: {engine.INFINITY if math.isinf(value) else engine.ERROR}")
+    return value
+
+
+def inverse(a):
+    _require_square(a, "Inverse")
+    try:
+        return _check(np.linalg.inv(a))
+    except np.linalg.LinAlgError:
+        raise MatrixError("Matrix is singular, it has no inverse")
+
+
+def solve(a, b):
+    """x with a·x = b"""
+    _require_square(a, "Solve")
+    if b.shape[0] != a.shape[0]:
+        raise MatrixError(f"Right-hand side needs {a.shape[0]} rows, not {b.shape[0]}")
+    try:
+        return _check(np.linalg.solve(a, b))
+    except np.linalg.LinAlgError:
+        raise MatrixError("Matrix is singular, no unique solution")
+
+
+# name: (function, number of operands)
+OPERATIONS = {
+    '+': (lambda a, b: elementwise('+', a, b), 2),
+    '-': (lambda a, b: elementwise('-', a, b), 2),
+    '×': (lambda a, b: elementwise('*', a, b), 2),
+    '÷': (lambda a, b: elementwise('/', a, b), 2),
+    '^': (lambda a, b: elementwise('^', a, b), 2),
+    '·': (matmul, 2),
+    'solve': (solve, 2),
+    'x²': (lambda a: elementwise('square', a), 1),
+    '√': (lambda a: elementwise('square_root', a), 1),
+    'sin': (lambda a: elementwise('sine', a), 1),
+    'cos': (lambda a: elementwise('cosine', a), 1),
+    'tan': (lambda a: elementwise('tangent', a), 1),
+    'log': (lambda a: elementwise('logarithm', a), 1),
+    'ᵀ': (transpose, 1),
+    'det': (determinant, 1),
+    'inv': (inverse, 1),
+}
+
+
+def apply(name, a, b=None):
+    """Run an operation of OPERATIONS; the result is an array or a float"""
+    _require_numpy()
+    function, arity = OPERATIONS[name]
+    if arity == 2:
+        if b is None:
+            raise MatrixError(f"{name} needs two operands")
+        return function(a, b)
+    return function(a)
+
+
+def row_texts(matrix, row, start=0, count=None):
+    """Display texts of the cells of one row (only the cells asked for)"""
+    values = matrix[row, start:None if count is None else start + count].tolist()
+    return [engine.format_result(value) for value in values]
+
+
+def to_text(matrix):
+    """Editable text of a matrix, columns aligned"""
+    rows = [row_texts(matrix, index) for index in range(matrix.shape[0])]
+    width = max((len(text) for row in rows for text in row), default=1)
+    return '\n'.join(' '.join(text.rjust(width) for text in row) for row in rows)
@@ -0,0 +1,116 @@
+"""Lightweight per-operation instrumentation
+
+Counts calls, cumulative and maximum wall time and error outcomes for
+named operations. Recording a call costs two perf_counter() calls and a
+dict lookup, so it can stay enabled all the time.
+"""
+import os
+import time
+from functools import wraps
+
+
+class OperationStats:
+    """Counters for one operation"""
+
+    __slots__ = ('calls', 'total_time', 'max_time', 'errors')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.errors = {}
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'total_ms': self.total_time * 1000,
+            'mean_ms': self.total_time * 1000 / self.calls if self.calls else 0.0,
+            'max_ms': self.max_time * 1000,
+            'errors': dict(self.errors),
+        }
+
+
+class Metrics:
+    """Registry of OperationStats by operation name"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.started = time.time()
+        self.stats = {}
+
+    def record(self, name, elapsed, error=None):
+        """Add one call of operation name"""
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = OperationStats()
+        stats.calls += 1
+        stats.total_time += elapsed
+        if elapsed > stats.max_time:
+            stats.max_time = elapsed
+        if error:
+            stats.errors[error] = stats.errors.get(error, 0) + 1
+
+    def wrap(self, name, func, error_state=None):
+        """Return func instrumented under name
+
+        error_state() returns (error count, last error text) of the
+        instrumented object; when the count changes during a call the
+        call is counted as that error (e.g. "Infinity"). Exceptions are
+        counted by type and re-raised.
+        """
+        perf_counter = time.perf_counter
+
+        @wraps(func)
+        def instrumented(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            before = error_state() if error_state else None
+            start = perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self.record(name, perf_counter() - start, type(e).__name__)
+                raise
+            elapsed = perf_counter() - start
+            after = error_state() if error_state else None
+            self.record(name, elapsed, after[1] if after != before else None)
+            return result
+        return instrumented
+
+    def instrument(self, obj, names, error_state=None):
+        """Replace methods of obj by instrumented versions"""
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name), error_state))
+
+    def snapshot(self):
+        """All counters as plain dicts"""
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def report_rows(self):
+        """(name, calls, total ms, mean ms, max ms, errors) sorted by total time"""
+        rows = []
+        for name, stats in sorted(self.stats.items(), key=lambda item: -item[1].total_time):
+            data = stats.as_dict()
+            rows.append((name, data['calls'], data['total_ms'], data['mean_ms'],
+                         data['max_ms'], sum(data['errors'].values())))
+        return rows
+
+    def dump(self, path):
+        """Write counters as JSON"""
+        import json
+
+        data = {
+            'started': self.started,
+            'ended': time.time(),
+            'pid': os.getpid(),
+            'operations': self.snapshot(),
+        }
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, path)
+
+    def reset(self):
+        """Forget all counters"""
+        self.stats = {}
+        self.started = time.time()
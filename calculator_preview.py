@@ -0,0 +1,222 @@
+"""Incremental evaluation for the live result preview
+
+    preview = IncrementalExpression()
+    preview.update("2 + 3 × (4")     # parses the text once
+    preview.result()                  # '14'
+    preview.update("2 + 3 × (45")    # parses only the new character
+    preview.update("2 + 3 × (")      # backspace: back to a kept snapshot
+
+The text is parsed with the shunting-yard rules of calculator_expression,
+but operators are applied as soon as precedence allows instead of
+emitting code, so the parse state is just the values and operators still
+waiting. One snapshot of that state is kept per character; the stacks
+are shared linked lists and the unparsed text is an offset, so a
+snapshot costs a few tuples.
+
+The last few tokens stay unparsed until more text follows, since a
+number such as 1.5e+3 is three tokens until its last digit is typed.
+Typing a character therefore scans only those tokens, and a digit that
+extends a number is not scanned at all, so a pasted 100k-digit number
+is parsed in linear time. Backspace drops a snapshot. Apart from reading
+a long trailing number, the cost per keystroke does not depend on the
+length of the expression, only on how deeply parentheses are nested
+when the result is read.
+
+Results are the same as evaluate_expression() of the whole text.
+"""
+import os
+
+import calculator_engine as engine
+from calculator_expression import (BINARY_PRECEDENCE, CONSTANT_VALUES, FUNCTION_NAMES, LPAREN, NAME,
+                                   NUMBER, OPERATOR, POSTFIX, POSTFIX_NAMES, PREFIX, RPAREN,
+                                   SCALAR_BINARY, SCALAR_UNARY, UNARY_PRECEDENCE, _Outcome, format_value, scan)
+
+# Trailing tokens that may still merge with text typed after them
+OPEN_TOKENS = 3
+
+_DIGITS = frozenset('0123456789')
+
+# Parse state: (values, operators, expect_operand, error). Values and
+# operators are linked lists of (item, rest) pairs, None when empty;
+# operator items are those of calculator_expression.parse(). A state of
+# None means the text can not become a valid expression.
+_START = (None, None, True, None)
+
+
+def _apply(values, error, name, is_binary):
+    """Apply an operator to the value stack; returns (values, error)
+
+    After the first failure only the shape of the stack is kept, like
+    evaluation stopping at the first failing instruction.
+    """
+    if is_binary:
+        b, (a, rest) = values[0], values[1]
+    else:
+        a, rest = values
+    value = None
+    if error is None:
+        try:
+            value = SCALAR_BINARY[name](a, b) if is_binary else SCALAR_UNARY[name](a)
+        except _Outcome as outcome:
+            error = outcome.text
+        except (ZeroDivisionError, OverflowError):
+            error = engine.INFINITY
+        except Exception:
+            error = engine.ERROR
+    return (value, rest), error
+
+
+def _pop_operators(values, operators, error, precedence, right_assoc):
+    while operators is not None and operators[0][0] != LPAREN:
+        name, top_precedence, is_binary = operators[0]
+        if top_precedence > precedence or (top_precedence == precedence and not right_assoc):
+            values, error = _apply(values, error, name, is_binary)
+            operators = operators[1]
+        else:
+            break
+    return values, operators, error
+
+
+def _commit(state, kind, value, next_kind):
+    """State after one more token; next_kind is the type of the token after it"""
+    values, operators, expect_operand, error = state
+    if not expect_operand and kind in (NUMBER, NAME, PREFIX, LPAREN):
+        # Implicit multiplication, e.g. 2π or 3(4 + 1)
+        values, operators, error = _pop_operators(values, operators, error, *BINARY_PRECEDENCE['*'])
+        operators = (('*', BINARY_PRECEDENCE['*'][0], True), operators)
+        expect_operand = True
+
+    if expect_operand:
+        if kind == NUMBER:
+            return (float(value), values), operators, False, error
+        if kind == NAME and value in CONSTANT_VALUES:
+            return (CONSTANT_VALUES[value], values), operators, False, error
+        if kind in (NAME, PREFIX) and value in FUNCTION_NAMES:
+            function = FUNCTION_NAMES[value]
+            if next_kind == LPAREN:
+                return values, (('call', function), operators), True, error
+            return values, ((function, UNARY_PRECEDENCE, False), operators), True, error
+        if kind == OPERATOR and value in '+-':
+            if value == '-':
+                operators = (('neg', UNARY_PRECEDENCE, False), operators)
+            return values, operators, True, error
+        if kind == LPAREN:
+            if operators is not None and operators[0][0] == 'call':
+                return values, ((LPAREN, operators[0][1]), operators[1]), True, error
+            return values, ((LPAREN, None), operators), True, error
+        # Variables are not known to the preview
+        return None
+    if kind == OPERATOR:
+        precedence, right_assoc = BINARY_PRECEDENCE[value]
+        values, operators, error = _pop_operators(values, operators, error, precedence, right_assoc)
+        return values, ((value, precedence, True), operators), True, error
+    if kind == POSTFIX:
+        values, error = _apply(values, error, POSTFIX_NAMES[value], False)
+        return values, operators, False, error
+    if kind == RPAREN:
+        values, operators, error = _pop_operators(values, operators, error, -1, False)
+        if operators is None:
+            return None
+        function = operators[0][1]
+        if function:
+            values, error = _apply(values, error, function, False)
+        return values, operators[1], False, error
+    return None
+
+
+def _advance(state, pending):
+    """Parse the tokens of pending text that can no longer change
+
+    Returns the new state, the number of characters of pending parsed,
+    and whether pending ends in a number that another digit extends.
+    """
+    try:
+        tokens = list(scan(pending))
+    except ValueError:
+        # A lone '.' becomes a number with the next digit, anything else
+        # that does not scan never will
+        if pending.rstrip().endswith('.'):
+            return state, 0, False
+        return None, 0, False
+    extends = bool(tokens) and tokens[-1][0] == NUMBER and tokens[-1][2] == len(pending)
+    if len(tokens) <= OPEN_TOKENS:
+        return state, 0, extends
+    done = len(tokens) - OPEN_TOKENS
+    for index in range(done):
+        kind, value, _ = tokens[index]
+        state = _commit(state, kind, value, tokens[index + 1][0])
+        if state is None:
+            return None, 0, False
+    return state, tokens[done - 1][2], extends
+
+
+def _finish(state):
+    """Display text of a complete state, None if incomplete"""
+    values, operators, expect_operand, error = state
+    if expect_operand:
+        return None
+    # Close remaining parentheses
+    while operators is not None:
+        item = operators[0]
+        if item[0] == LPAREN:
+            if item[1]:
+                values, error = _apply(values, error, item[1], False)
+        else:
+            values, error = _apply(values, error, item[0], item[2])
+        operators = operators[1]
+    if error is not None:
+        return error
+    try:
+        return format_value(values[0])
+    except Exception:
+        return engine.ERROR
+
+
+class IncrementalExpression:
+    """Expression text that is re-parsed only where it changes"""
+
+    def __init__(self, text=''):
+        self.text = ''
+        # (state, start of the pending text, pending ends in a number)
+        # after each prefix of text
+        self._snapshots = [(_START, 0, False)]
+        self.update(text)
+
+    def update(self, text):
+        """Set the text, parsing only what differs from the previous text"""
+        old = self.text
+        if text == old:
+            return self
+        if text.startswith(old):
+            common = len(old)
+        elif old.startswith(text):
+            common = len(text)
+        else:
+            common = len(os.path.commonprefix([old, text]))
+        del self._snapshots[common + 1:]
+        state, start, extends = self._snapshots[-1]
+        for index in range(common, len(text)):
+            # A digit after a number only makes that number longer: no
+            # need to scan it again, which would cost its whole length
+            if state is not None and not (extends and text[index] in _DIGITS):
+                state, parsed, extends = _advance(state, text[start:index + 1])
+                start += parsed
+            self._snapshots.append((state, start, extends))
+        self.text = text
+        return self
+
+    def result(self):
+        """Display text of the whole text, None while it is incomplete or invalid"""
+        state, start, _ = self._snapshots[-1]
+        if state is None:
+            return None
+        try:
+            tokens = list(scan(self.text[start:]))
+        except ValueError:
+            return None
+        for index, (kind, value, _) in enumerate(tokens):
+            next_kind = tokens[index + 1][0] if index + 1 < len(tokens) else None
+            state = _commit(state, kind, value, next_kind)
+            if state is None:
+                return None
+        return _finish(state)
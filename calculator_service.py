@@ -0,0 +1,414 @@
+"""Calculator service - the calculator engine as a local JSON-RPC server
+
+Usage:
+    python calculator_service.py [--host HOST] [--port PORT] [--unix PATH]
+                                 [--workers N]
+    python "python calculator.py" serve [...]
+
+Speaks JSON-RPC 2.0 with one JSON message per line, over localhost TCP
+or a Unix socket. Clients may pipeline any number of requests without
+waiting for responses, and may send batches (JSON arrays). Responses
+carry the request id; cheap operations are answered in request order,
+operations run in the worker pool are answered when they finish.
+
+Methods (params as a list or as {"a": ..., "b": ...}):
+    add subtract multiply divide     [a, b]
+    percentage reciprocal square_root square sine cosine tangent
+    logarithm factorial              [a]
+    pi euler                         []
+    expression                       [text], e.g. ["(1 + 2) × sin(30)"]
+    exact                            [op, a, b, precision]
+    memory_clear memory_recall memory_store memory_add memory_subtract
+    history                          [limit]
+    stats                            []
+
+Results are calculator display texts ("0.5", "Infinity", ...). Memory
+registers and history belong to the connection (session).
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import inspect
+import json
+import os
+import sys
+import time
+
+import calculator_engine as engine
+import calculator_expression
+from calculator_expression import evaluate_expression
+from calculator_format import formatter
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Longest accepted request line (bytes)
+MAX_LINE = 1 << 20
+
+# Expressions longer than this are evaluated in the worker pool
+SLOW_EXPRESSION_LENGTH = 5000
+
+# Entries kept in each session's history
+HISTORY_SIZE = 1000
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+OPERATIONS = {
+    'add': '+',
+    'subtract': '-',
+    'multiply': '*',
+    'divide': '/',
+    'percentage': 'percentage',
+    'reciprocal': 'reciprocal',
+    'square_root': 'square_root',
+    'square': 'square',
+    'sine': 'sine',
+    'cosine': 'cosine',
+    'tangent': 'tangent',
+    'logarithm': 'logarithm',
+    'factorial': 'factorial',
+    'pi': 'pi',
+    'euler': 'e',
+}
+
+MEMORY_METHODS = ('memory_clear', 'memory_recall', 'memory_store', 'memory_add', 'memory_subtract')
+
+# Methods recorded in the session history
+HISTORY_METHODS = frozenset(OPERATIONS) | {'expression', 'exact'}
+
+
+class RPCError(Exception):
+    """JSON-RPC error response"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def exact_text(op, a, b, precision):
+    """Exact evaluation as display text (runs in worker processes)"""
+    return engine.exact_evaluate(op, a, b, precision)
+
+
+class CallRecord:
+    """One entry of a session history"""
+
+    __slots__ = ('time', 'method', 'params', 'result')
+
+    def __init__(self, time, method, params, result):
+        self.time = time
+        self.method = method
+        self.params = params
+        self.result = result
+
+    def as_dict(self):
+        return {'time': self.time, 'method': self.method, 'params': self.params, 'result': self.result}
+
+
+class Session:
+    """Memory register and history of one connection"""
+
+    __slots__ = ('memory', 'history')
+
+    def __init__(self):
+        self.memory = 0.0
+        self.history = collections.deque(maxlen=HISTORY_SIZE)
+
+    def remember(self, method, params, result):
+        self.history.append(CallRecord(time.time(), method, params, result))
+
+    def memory_op(self, method, params):
+        """Memory operations, same rules as the calculator's memory buttons"""
+        if method == 'memory_clear':
+            self.memory = 0.0
+        elif method != 'memory_recall':
+            value = _param(params, 0, 'a')
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise RPCError(INVALID_PARAMS, "Memory value must be a number")
+            if method == 'memory_store':
+                self.memory = value
+            elif method == 'memory_add':
+                self.memory += value
+            else:
+                self.memory -= value
+        return engine.format_result(self.memory)
+
+
+def _param(params, index, name, default=None):
+    if isinstance(params, dict):
+        return params.get(name, default)
+    if isinstance(params, list):
+        return params[index] if index < len(params) else default
+    return default
+
+
+class CalculatorService:
+    """Dispatches JSON-RPC messages; one instance serves all connections"""
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.pool = None
+        self.connections = 0
+        self.total_connections = 0
+        self.requests = 0
+        self.offloaded = 0
+        self.started = time.time()
+
+    def executor(self):
+        """Process pool for CPU heavy requests, started on first use"""
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def stats(self):
+        return {
+            'connections': self.connections,
+            'total_connections': self.total_connections,
+            'requests': self.requests,
+            'offloaded': self.offloaded,
+            'uptime': time.time() - self.started,
+            # Of this process; requests run in the worker pool are not counted
+            'caches': {
+                'functions': engine.function_cache_info(),
+                'expressions': calculator_expression.cache_info(),
+                'formatting': formatter.cache_info(),
+            },
+        }
+
+    def prepare(self, session, method, params):
+        """Result of a request, or (func, args) to run in the worker pool"""
+        if method in OPERATIONS:
+            op = OPERATIONS[method]
+            arity = 2 if op in engine.BINARY_OPERATIONS else 0 if op in engine.CONSTANTS else 1
+            if arity and _param(params, 0, 'a') is None:
+                raise RPCError(INVALID_PARAMS, f"{method} needs {arity} operand(s)")
+            if arity == 2 and _param(params, 1, 'b') is None:
+                raise RPCError(INVALID_PARAMS, f"{method} needs 2 operands")
+            return engine.evaluate(op, _param(params, 0, 'a'), _param(params, 1, 'b'))
+        if method == 'expression':
+            text = _param(params, 0, 'text')
+            if not isinstance(text, str):
+                raise RPCError(INVALID_PARAMS, "expression needs a text")
+            if len(text) > SLOW_EXPRESSION_LENGTH:
+                return evaluate_expression, (text,)
+            return evaluate_expression(text)
+        if method == 'exact':
+            op = _param(params, 0, 'op')
+            a = _param(params, 1, 'a')
+            b = _param(params, 2, 'b')
+            precision = _param(params, 3, 'precision', engine.DEFAULT_PRECISION)
+            if not isinstance(precision, int) or not 1 <= precision <= 100000:
+                raise RPCError(INVALID_PARAMS, "precision must be an int from 1 to 100000")
+            try:
+                slow = engine.exact_is_slow(op, a, b, precision)
+            except ValueError:
+                raise RPCError(INVALID_PARAMS, f"Unknown operation: {op!r}")
+            if slow:
+                return exact_text, (op, a, b, precision)
+            return exact_text(op, a, b, precision)
+        if method in MEMORY_METHODS:
+            return session.memory_op(method, params)
+        if method == 'history':
+            limit = _param(params, 0, 'limit', HISTORY_SIZE)
+            if not isinstance(limit, int) or limit < 0:
+                raise RPCError(INVALID_PARAMS, "limit must be a non-negative int")
+            entries = list(session.history)
+            return [entry.as_dict() for entry in entries[-limit:]] if limit else []
+        if method == 'stats':
+            return self.stats()
+        raise RPCError(METHOD_NOT_FOUND, f"Method not found: {method}")
+
+    def response(self, message, result=None, error=None):
+        """Response dict for a request message (None for notifications)"""
+        request_id = message.get('id') if isinstance(message, dict) else None
+        if error is not None:
+            return {'jsonrpc': '2.0', 'id': request_id, 'error': error}
+        if 'id' not in message:
+            return None
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+    def call(self, session, message):
+        """Response for one request message
+
+        Returns the response dict (None for notifications), or an
+        awaitable of it when the request runs in the worker pool.
+        """
+        try:
+            if not isinstance(message, dict) or not isinstance(message.get('method'), str):
+                raise RPCError(INVALID_REQUEST, "Invalid request")
+            method = message['method']
+            params = message.get('params', [])
+            self.requests += 1
+            result = self.prepare(session, method, params)
+        except RPCError as e:
+            return self.response(message, error={'code': e.code, 'message': e.message})
+        except Exception as e:
+            return self.response(message, error={'code': INTERNAL_ERROR, 'message': f"{type(e).__name__}: {e}"})
+        if isinstance(result, tuple):
+            self.offloaded += 1
+            return self.call_in_pool(session, message, *result)
+        if method in HISTORY_METHODS:
+            session.remember(method, params, result)
+        return self.response(message, result)
+
+    async def call_in_pool(self, session, message, func, args):
+        """Run a CPU heavy request in the worker pool"""
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor(), func, *args)
+        except Exception as e:
+            return self.response(message, error={'code': INTERNAL_ERROR, 'message': f"{type(e).__name__}: {e}"})
+        session.remember(message['method'], message.get('params', []), result)
+        return self.response(message, result)
+
+    def handle_line(self, session, line):
+        """Response for one received line: a response, a list of them, None
+        or an awaitable of those"""
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': PARSE_ERROR, 'message': "Parse error"}}
+        if not isinstance(message, list):
+            return self.call(session, message)
+        if not message:
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': INVALID_REQUEST, 'message': "Empty batch"}}
+        responses = [self.call(session, item) for item in message]
+        if any(inspect.isawaitable(response) for response in responses):
+            return self.gather_batch(responses)
+        return [response for response in responses if response is not None] or None
+
+    async def gather_batch(self, responses):
+        """Wait for the pooled parts of a batch"""
+        done = []
+        for response in responses:
+            if inspect.isawaitable(response):
+                response = await response
+            if response is not None:
+                done.append(response)
+        return done or None
+
+    async def serve_connection(self, reader, writer):
+        """Read pipelined requests of one connection and write responses"""
+        session = Session()
+        self.connections += 1
+        self.total_connections += 1
+        pending = set()
+
+        def send(response):
+            if response is not None and not writer.is_closing():
+                writer.write(json.dumps(response, separators=(',', ':')).encode() + b'\n')
+
+        async def finish(awaitable):
+            send(await awaitable)
+
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as e:
+                    line = e.partial
+                    if not line.strip():
+                        break
+                except asyncio.LimitOverrunError:
+                    send({'jsonrpc': '2.0', 'id': None,
+                          'error': {'code': INVALID_REQUEST, 'message': "Request too long"}})
+                    break
+                if not line.strip():
+                    continue
+                response = self.handle_line(session, line)
+                if inspect.isawaitable(response):
+                    # Answered when the worker pool is done; later requests go on
+                    task = asyncio.ensure_future(finish(response))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                else:
+                    send(response)
+                # Flow control: only waits while the client is not reading
+                await writer.drain()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            self.connections -= 1
+            writer.close()
+
+
+def raise_open_file_limit():
+    """Allow as many sockets as the hard limit permits"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, workers=None, ready=None):
+    """Run the service until cancelled"""
+    service = CalculatorService(workers)
+    if unix_path:
+        server = await asyncio.start_unix_server(service.serve_connection, unix_path,
+                                                 limit=MAX_LINE, backlog=4096)
+        address = unix_path
+    else:
+        server = await asyncio.start_server(service.serve_connection, host, port,
+                                            limit=MAX_LINE, backlog=4096)
+        address = '%s:%d' % server.sockets[0].getsockname()[:2]
+    print(f"calculator service listening on {address}", file=sys.stderr)
+    if ready is not None:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+        if unix_path and os.path.exists(unix_path):
+            os.unlink(unix_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='calculator serve',
+        description="Serve the calculator engine as JSON-RPC over TCP or a Unix socket.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="TCP address to listen on")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="TCP port (0 = any free port)")
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes for CPU heavy requests (default one per CPU)")
+    args = parser.parse_args(argv)
+
+    raise_open_file_limit()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"calculator serve: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
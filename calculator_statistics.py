@@ -0,0 +1,311 @@
+"""Streaming statistics - one pass over the data, constant memory
+
+Usage:
+    python calculator_statistics.py [FILE ...] [--quantiles 0.5,0.9,0.99]
+    python "python calculator.py" stats [FILE ...]
+
+    stats = StreamingStats()
+    stats.add(3.5)
+    stats.feed(open('column.txt'))      # every number in the text
+    stats.mean, stats.stddev(), stats.quantile(0.99)
+
+Numbers are read from the files (or stdin) line by line; whitespace,
+commas and semicolons separate them and anything that is not a finite
+number is skipped and counted. Nothing is stored per number:
+
+    sum              compensated (Kahan-Babuska / Neumaier), scaled down
+                     by 2**-64 once it would overflow
+    mean             compensated sum / count
+    variance         Welford's update
+    min, max
+    quantiles        DDSketch: logarithmic buckets with a relative error
+                     of at most 1%, at most 2048 buckets per sign
+"""
+import argparse
+import math
+import re
+import sys
+
+import calculator_engine as engine
+
+_SEPARATOR_RE = re.compile(r'[\s,;]+')
+
+# Factor of the running sum once it would overflow
+SUM_SCALE = 2.0 ** -64
+
+# Quantiles shown in summaries
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+class QuantileSketch:
+    """DDSketch: approximate quantiles with bounded relative error
+
+    A value v > 0 is counted in bucket ceil(log(v) / log(gamma)); every
+    value in a bucket is within relative_accuracy of the bucket's
+    representative. Negative values use a second set of buckets. When a
+    set grows past max_buckets its smallest magnitudes are merged, which
+    only affects quantiles close to zero.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self.gamma)
+        self.count = 0
+        self.zero_count = 0
+        # Bucket counts of positive and negative values
+        self._positive = {}
+        self._negative = {}
+        # Lowest bucket key of each set once buckets were merged
+        self._positive_floor = None
+        self._negative_floor = None
+
+    def add(self, value):
+        self.count += 1
+        if value > 0:
+            key = math.ceil(math.log(value) * self._multiplier)
+            if self._positive_floor is not None and key < self._positive_floor:
+                key = self._positive_floor
+            buckets = self._positive
+        elif value < 0:
+            key = math.ceil(math.log(-value) * self._multiplier)
+            if self._negative_floor is not None and key < self._negative_floor:
+                key = self._negative_floor
+            buckets = self._negative
+        else:
+            self.zero_count += 1
+            return
+        buckets[key] = buckets.get(key, 0) + 1
+        if len(buckets) > self.max_buckets:
+            floor = self._collapse(buckets)
+            if buckets is self._positive:
+                self._positive_floor = floor
+            else:
+                self._negative_floor = floor
+
+    def _collapse(self, buckets):
+        """Merge the smallest buckets, leaving 7/8 of max_buckets; returns the lowest key"""
+        keys = sorted(buckets)
+        floor = keys[len(keys) - (self.max_buckets - self.max_buckets // 8)]
+        merged = sum(buckets.pop(key) for key in keys if key < floor)
+        buckets[floor] += merged
+        return floor
+
+    def _value(self, key):
+        """Representative value of a bucket"""
+        try:
+            return 2 * self.gamma ** key / (self.gamma + 1)
+        except OverflowError:
+            # Top bucket next to the float maximum
+            return math.inf
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1), None when empty"""
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # Most negative first: negative buckets by decreasing magnitude
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._value(key)
+
+    def bucket_count(self):
+        return len(self._positive) + len(self._negative)
+
+
+class StreamingStats:
+    """Count, sum, mean, variance, min, max and quantiles of a stream"""
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.clear()
+
+    def clear(self):
+        """Forget all numbers"""
+        self.count = 0
+        self.rejected = 0
+        self._sum = 0.0
+        self._compensation = 0.0
+        # 1.0, or SUM_SCALE after the sum overflowed
+        self._scale = 1.0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch(self.relative_accuracy, self.max_buckets)
+
+    def add(self, value):
+        """Add one number; raises ValueError if it is not finite"""
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError(f"Not a finite number: {value}")
+        self.count += 1
+        # Neumaier: keep the low-order bits lost by each addition
+        total = self._sum + value * self._scale
+        if not math.isfinite(total):
+            # Continue with everything scaled by a power of two, which is
+            # exact; the sum may come back into range later
+            self._scale = SUM_SCALE
+            self._sum *= SUM_SCALE
+            self._compensation *= SUM_SCALE
+            total = self._sum + value * SUM_SCALE
+        value_scaled = value * self._scale
+        if abs(self._sum) >= abs(value_scaled):
+            self._compensation += (self._sum - total) + value_scaled
+        else:
+            self._compensation += (value_scaled - total) + self._sum
+        self._sum = total
+        # Welford, until the squared deviations overflow
+        if self._m2 != math.inf:
+            delta = value - self._mean
+            mean = self._mean + delta / self.count
+            m2 = self._m2 + delta * (value - mean)
+            if math.isfinite(m2):
+                self._mean, self._m2 = mean, m2
+            else:
+                self._m2 = math.inf
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sketch.add(value)
+
+    def extend(self, values):
+        """Add finite numbers from an iterable"""
+        add = self.add
+        for value in values:
+            add(value)
+
+    def feed(self, lines):
+        """Add every number in lines of text; returns how many were added
+
+        Tokens that are not finite numbers are skipped and counted in
+        rejected.
+        """
+        added = 0
+        add = self.add
+        split = _SEPARATOR_RE.split
+        isfinite = math.isfinite
+        for line in lines:
+            for token in split(line):
+                if not token:
+                    continue
+                try:
+                    value = float(token)
+                except ValueError:
+                    self.rejected += 1
+                    continue
+                if isfinite(value):
+                    add(value)
+                    added += 1
+                else:
+                    self.rejected += 1
+        return added
+
+    @property
+    def sum(self):
+        """Compensated sum, inf when it is out of the float range"""
+        return (self._sum + self._compensation) / self._scale
+
+    @property
+    def mean(self):
+        """Compensated sum / count, more accurate than the running mean"""
+        if not self.count:
+            return None
+        return (self._sum + self._compensation) / self.count / self._scale
+
+    def variance(self, sample=True):
+        """Sample (n - 1) or population (n) variance, None if undefined
+
+        inf when the squared deviations overflow.
+        """
+        n = self.count - 1 if sample else self.count
+        if n <= 0:
+            return None
+        return self._m2 / n
+
+    def stddev(self, sample=True):
+        variance = self.variance(sample)
+        return None if variance is None else math.sqrt(variance)
+
+    def quantile(self, q):
+        """Approximate q-quantile, exact at 0 and 1 (min and max)"""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        # Bucket representatives can lie just outside the data
+        return min(self.max, max(self.min, self.sketch.quantile(q)))
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        """(name, display text) pairs of every statistic"""
+        def text(value):
+            return '' if value is None else engine.format_result(value)
+        rows = [
+            ('count', str(self.count)),
+            ('sum', text(self.sum) if self.count else ''),
+            ('mean', text(self.mean)),
+            ('stddev', text(self.stddev())),
+            ('variance', text(self.variance())),
+            ('min', text(self.quantile(0))),
+            ('max', text(self.quantile(1))),
+        ]
+        rows.extend((f"p{q * 100:g}", text(self.quantile(q))) for q in quantiles)
+        if self.rejected:
+            rows.append(('skipped', str(self.rejected)))
+        return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='calculator stats',
+        description="Count, sum, mean, spread and quantiles of the numbers in files.")
+    parser.add_argument('files', nargs='*', help="input files, '-' or none for stdin")
+    parser.add_argument('--quantiles', default=','.join(f"{q:g}" for q in DEFAULT_QUANTILES),
+                        help="comma separated quantiles between 0 and 1")
+    parser.add_argument('--accuracy', type=float, default=0.01,
+                        help="relative accuracy of the quantiles")
+    args = parser.parse_args(argv)
+
+    try:
+        quantiles = [float(q) for q in args.quantiles.split(',') if q.strip()]
+        if not all(0 <= q <= 1 for q in quantiles):
+            raise ValueError
+        stats = StreamingStats(args.accuracy)
+    except ValueError:
+        parser.error("quantiles and accuracy must be between 0 and 1")
+
+    try:
+        for path in args.files or ['-']:
+            if path == '-':
+                stats.feed(sys.stdin)
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    stats.feed(f)
+    except OSError as e:
+        print(f"calculator stats: {e}", file=sys.stderr)
+        return 2
+    for name, value in stats.summary(quantiles):
+        print(f"{name:<10}{value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
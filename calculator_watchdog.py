@@ -0,0 +1,280 @@
+"""Stall watchdog for the Tk mainloop
+
+    watchdog = Watchdog(root, log_path='calculator_stalls.log').start()
+    ...
+    watchdog.summary_rows()      # stalls per handler, worst first
+    watchdog.stop()
+
+A heartbeat callback reschedules itself with root.after every
+HEARTBEAT_INTERVAL ms. A monitor thread checks the time of the last
+beat; when the mainloop misses the next beat by more than
+STALL_THRESHOLD it takes the Python stack of the Tk thread from
+sys._current_frames(), so the record shows what the blocking callback
+was doing at that moment. When the beats come back the stall's duration
+is known.
+
+Every stall is written to a rotating log as two JSON lines: 'stall'
+with the handler and stack as soon as it is detected (so a window that
+never recovers still leaves a record), and 'resumed' with the duration.
+The handler is the outermost function below Tk's callback dispatch,
+e.g. AdvancedCalculator.show_history.
+
+A single C call that holds the GIL (a huge integer multiplication) keeps
+the monitor from running too; that stall is seen when the call returns.
+"""
+import json
+import linecache
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+
+# Milliseconds between heartbeats
+HEARTBEAT_INTERVAL = 100
+
+# Seconds a heartbeat may be late before it counts as a stall
+STALL_THRESHOLD = 0.25
+
+# Stall log, rotated at LOG_MAX_BYTES with LOG_BACKUPS old files
+LOG_FILE = 'calculator_stalls.log'
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+
+# Stack frames kept per stall (innermost)
+STACK_LIMIT = 30
+
+# tkinter functions that call the handler of a Tk event
+_DISPATCH_FUNCTIONS = ('__call__', 'callit')
+
+# Frames of these files are instrumentation around handlers
+_WRAPPER_FILES = ('calculator_metrics.py',)
+
+
+class StallEvent:
+    """One missed heartbeat deadline"""
+
+    __slots__ = ('started', 'duration', 'handler', 'stack')
+
+    def __init__(self, started, handler, stack, duration=None):
+        self.started = started
+        self.handler = handler
+        self.stack = stack
+        # None while the stall lasts
+        self.duration = duration
+
+    def as_dict(self):
+        return {
+            'started': self.started,
+            'duration_ms': None if self.duration is None else self.duration * 1000,
+            'handler': self.handler,
+            'stack': self.stack,
+        }
+
+
+class HandlerStalls:
+    """Stall counters of one handler"""
+
+    __slots__ = ('count', 'total_time', 'max_time', 'worst')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # Longest StallEvent
+        self.worst = None
+
+
+def _is_tkinter(filename):
+    return os.sep + 'tkinter' + os.sep in filename
+
+
+def stack_frames(frame):
+    """(filename, line, qualified name) of frame and its callers, outermost first"""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append((code.co_filename, frame.f_lineno, getattr(code, 'co_qualname', code.co_name)))
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def handler_name(frames):
+    """Name of the callback Tk was running, from stack_frames()
+
+    The handler is the first frame after Tk's innermost callback
+    dispatch (a command, binding or after callback) that is not an
+    instrumentation wrapper; without a dispatch frame it is the
+    innermost frame.
+    """
+    start = None
+    for index, (filename, _, name) in enumerate(frames):
+        if _is_tkinter(filename) and name.rsplit('.', 1)[-1] in _DISPATCH_FUNCTIONS:
+            start = index + 1
+    if start is not None:
+        for filename, _, name in frames[start:]:
+            if os.path.basename(filename) not in _WRAPPER_FILES:
+                return name
+    return frames[-1][2] if frames else '?'
+
+
+def stack_lines(frames, limit=STACK_LIMIT):
+    """'file:line function: source' of the innermost frames"""
+    return [f"{os.path.basename(filename)}:{line} {name}: {linecache.getline(filename, line).strip()}".rstrip()
+            for filename, line, name in frames[-limit:]]
+
+
+def _open_log(path):
+    """Logger writing to a rotating file, not registered with logging"""
+    logger = logging.Logger('calculator.watchdog')
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                   encoding='utf-8', delay=True)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    return logger, handler
+
+
+class Watchdog:
+    """Heartbeat on the Tk mainloop and a thread that reports stalls"""
+
+    def __init__(self, root, interval=HEARTBEAT_INTERVAL, threshold=STALL_THRESHOLD,
+                 log_path=LOG_FILE):
+        self.root = root
+        self.interval = interval
+        self.threshold = threshold
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.handlers = {}
+        self.beats = 0
+        self.max_lateness = 0.0
+        self.total_stalled = 0.0
+        self._last_beat = None
+        self._after_id = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._tk_thread = None
+        self._logger = None
+        self._log_handler = None
+
+    def start(self):
+        """Start heartbeat and monitor; call from the Tk thread"""
+        if self._thread is not None:
+            return self
+        self._tk_thread = threading.get_ident()
+        if self.log_path:
+            self._logger, self._log_handler = _open_log(self.log_path)
+        self._stop.clear()
+        self._last_beat = time.perf_counter()
+        self._after_id = self.root.after(self.interval, self._beat)
+        self._thread = threading.Thread(target=self._monitor, name='stall-watchdog', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop heartbeat and monitor and close the log"""
+        self._stop.set()
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if self._log_handler is not None:
+            self._logger.removeHandler(self._log_handler)
+            self._log_handler.close()
+            self._log_handler = None
+
+    def _beat(self):
+        now = time.perf_counter()
+        lateness = now - self._last_beat - self.interval / 1000
+        with self.lock:
+            self.beats += 1
+            if lateness > self.max_lateness:
+                self.max_lateness = lateness
+        self._last_beat = now
+        if not self._stop.is_set():
+            self._after_id = self.root.after(self.interval, self._beat)
+
+    def _monitor(self):
+        """Monitor thread: wait for missed deadlines and their end"""
+        period = self.interval / 2000
+        while not self._stop.wait(period):
+            last = self._last_beat
+            if time.perf_counter() - last - self.interval / 1000 <= self.threshold:
+                continue
+            event = self._capture(last)
+            if event is None:
+                continue
+            # Wait for the next beat; the stall ends there
+            while self._last_beat == last and not self._stop.wait(period):
+                pass
+            if self._last_beat != last:
+                self._finish(event, self._last_beat - last - self.interval / 1000)
+
+    def _capture(self, last_beat):
+        """StallEvent with the Tk thread's stack, None if it is gone"""
+        frame = sys._current_frames().get(self._tk_thread)
+        if frame is None:
+            return None
+        frames = stack_frames(frame)
+        del frame
+        handler = handler_name(frames)
+        stack = stack_lines(frames)
+        started = time.time() - (time.perf_counter() - last_beat) + self.interval / 1000
+        event = StallEvent(started, handler, stack)
+        self._log(dict(event.as_dict(), event='stall'))
+        return event
+
+    def _finish(self, event, duration):
+        event.duration = duration
+        with self.lock:
+            stats = self.handlers.get(event.handler)
+            if stats is None:
+                stats = self.handlers[event.handler] = HandlerStalls()
+            stats.count += 1
+            stats.total_time += duration
+            if duration >= stats.max_time:
+                stats.max_time = duration
+                stats.worst = event
+            self.total_stalled += duration
+        self._log({'event': 'resumed', 'started': event.started, 'handler': event.handler,
+                   'duration_ms': duration * 1000})
+
+    def _log(self, record):
+        if self._logger is None:
+            return
+        try:
+            self._logger.info(json.dumps(record, ensure_ascii=False))
+        except Exception:
+            pass
+
+    @property
+    def stall_count(self):
+        with self.lock:
+            return sum(stats.count for stats in self.handlers.values())
+
+    def summary_rows(self):
+        """(handler, stalls, total ms, max ms) sorted by longest stall"""
+        with self.lock:
+            items = sorted(self.handlers.items(), key=lambda item: -item[1].max_time)
+            return [(name, stats.count, stats.total_time * 1000, stats.max_time * 1000)
+                    for name, stats in items]
+
+    def worst_stack(self, handler):
+        """Stack lines of the longest stall of a handler"""
+        with self.lock:
+            stats = self.handlers.get(handler)
+            return list(stats.worst.stack) if stats and stats.worst else []
+
+    def reset(self):
+        """Forget counted stalls (the log is kept)"""
+        with self.lock:
+            self.handlers = {}
+            self.beats = 0
+            self.max_lateness = 0.0
+            self.total_stalled = 0.0
@@ -0,0 +1,122 @@
+"""Reusable Tk widgets for the calculator"""
+import tkinter as tk
+from tkinter import font
+
+from calculator_cache import LRUCache
+
+
+class VirtualList(tk.Frame):
+    """Scrollable list that only builds the rows visible in the viewport
+
+    Rows are not stored in the widget. count() returns the number of rows
+    and fetch(offset, limit) returns rows offset..offset+limit; rows are
+    requested in chunks as the user scrolls and a few chunks are cached.
+    Opening and scrolling cost the same for ten rows or ten million.
+    """
+
+    def __init__(self, master, count, fetch, format_row=str, chunk_size=100,
+                 row_font=('Arial', 10), bg='#1a1a1a', fg='#ffffff', empty_text='', **kwargs):
+        super().__init__(master, bg=bg, **kwargs)
+        self.count = count
+        self.fetch = fetch
+        self.format_row = format_row
+        self.empty_text = empty_text
+        self.chunk_size = chunk_size
+        self.row_font = font.Font(font=row_font)
+        self.row_bg = bg
+        self.row_fg = fg
+        self.row_height = self.row_font.metrics('linespace') + 4
+        self.first = 0
+        self.total = 0
+        self._chunks = LRUCache(maxsize=16)
+        self._labels = []
+
+        self.body = tk.Frame(self, bg=bg)
+        self.body.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.body.bind('<Configure>', self._on_resize)
+        self._bind_scrolling(self.body)
+        for key, step in (('<Up>', -1), ('<Down>', 1)):
+            self.bind(key, lambda e, s=step: self.scroll_rows(s))
+        self.bind('<Prior>', lambda e: self.scroll_rows(-self.visible_rows()))
+        self.bind('<Next>', lambda e: self.scroll_rows(self.visible_rows()))
+        self.bind('<Home>', lambda e: self.scroll_to(0))
+        self.bind('<End>', lambda e: self.scroll_to(self.total))
+
+        self.refresh()
+
+    def _bind_scrolling(self, widget):
+        widget.bind('<MouseWheel>', self._on_wheel)
+        widget.bind('<Button-4>', lambda e: self.scroll_rows(-3))
+        widget.bind('<Button-5>', lambda e: self.scroll_rows(3))
+        widget.bind('<Button-1>', lambda e: self.focus_set())
+
+    def visible_rows(self):
+        """Number of rows that fit in the viewport"""
+        return len(self._labels)
+
+    def refresh(self):
+        """Reload row count and drop cached rows"""
+        self.total = self.count()
+        self._chunks.clear()
+        self.scroll_to(self.first)
+
+    def scroll_rows(self, step):
+        """Scroll by a number of rows"""
+        self.scroll_to(self.first + step)
+
+    def scroll_to(self, index):
+        """Make row index the first visible row"""
+        last_first = max(0, self.total - self.visible_rows())
+        self.first = max(0, min(int(index), last_first))
+        self._render()
+
+    def yview(self, *args):
+        """Scrollbar command"""
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * self.total)
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= max(1, self.visible_rows() - 1)
+            self.scroll_rows(amount)
+
+    def _on_wheel(self, event):
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+
+    def _on_resize(self, event):
+        wanted = max(1, event.height // self.row_height)
+        while len(self._labels) < wanted:
+            label = tk.Label(self.body, anchor='w', justify=tk.LEFT, font=self.row_font,
+                             bg=self.row_bg, fg=self.row_fg)
+            label.place(x=0, y=len(self._labels) * self.row_height, relwidth=1, height=self.row_height)
+            self._bind_scrolling(label)
+            self._labels.append(label)
+        while len(self._labels) > wanted:
+            self._labels.pop().destroy()
+        self.scroll_to(self.first)
+
+    def _row(self, index):
+        """Row at index, fetching its chunk if needed"""
+        chunk_index = index // self.chunk_size
+        chunk = self._chunks.get(chunk_index)
+        if chunk is None:
+            chunk = self.fetch(chunk_index * self.chunk_size, self.chunk_size)
+            self._chunks.put(chunk_index, chunk)
+        position = index - chunk_index * self.chunk_size
+        return chunk[position] if position < len(chunk) else None
+
+    def _render(self):
+        for offset, label in enumerate(self._labels):
+            index = self.first + offset
+            row = self._row(index) if index < self.total else None
+            label.config(text=self.format_row(row) if row is not None else '')
+        if not self.total and self._labels:
+            self._labels[0].config(text=self.empty_text)
+        if self.total:
+            self.scrollbar.set(self.first / self.total,
+                               min(1.0, (self.first + self.visible_rows()) / self.total))
+        else:
+            self.scrollbar.set(0, 1)
@@ -1,15 +1,141 @@
+import time
+
+# Start time for --startup-profile
+STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import font, messagebox
-import math
-import json
+from tkinter import font
 import os
-from datetime import datetime
+import re
+import sys
+import threading
+
+import calculator_engine as engine
+import calculator_format
+from calculator_expression import compile_expression, evaluate_expression
+from calculator_metrics import Metrics
+from calculator_preview import IncrementalExpression
+
+# Methods timed by the instrumentation
+INSTRUMENTED_METHODS = [
+    'button_click', 'key_pressed', 'calculate', 'paste',
+    'percentage', 'reciprocal', 'square_root', 'square',
+    'sine', 'cosine', 'tangent', 'logarithm', 'factorial',
+    'save_history', 'load_history', 'open_history_store',
+]
+
+# Operation counters, written on exit; in the per-user data directory
+# like the history database (see data_file)
+STATS_FILE = 'calculator_stats.json'
+
+# Mainloop stalls found by the watchdog (rotated), also in the data directory
+STALL_LOG_FILE = 'calculator_stalls.log'
+
+# Expressions longer than this are evaluated in the background
+SLOW_EXPRESSION_LENGTH = 5000
+
+# Keys and buttons kept while a background evaluation runs
+MAX_QUEUED_INPUT = 200
+
+# Milliseconds between checks whether the history store is open yet
+HISTORY_WAIT_INTERVAL = 50
+
+# Milliseconds between checks of the history window for entries from
+# other calculator instances
+HISTORY_REFRESH_INTERVAL = 2000
+
+# Columns of a matrix result shown at once
+MATRIX_VIEW_COLUMNS = 6
+
+# Notation button labels
+NOTATION_LABELS = {
+    calculator_format.FIXED: "Fix",
+    calculator_format.SCIENTIFIC: "Sci",
+    calculator_format.ENGINEERING: "Eng",
+}
+
+WINDOW_WIDTH = 500
+WINDOW_HEIGHT = 700
+
+def data_file(name):
+    """Path of a file in the per-user data directory, creating the directory"""
+    from calculator_history import data_dir
+    
+    directory = data_dir()
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+def parse_jump_time(text):
+    """Parse 'HH:MM[:SS]' (today) or 'YYYY-MM-DD HH:MM[:SS]' to a timestamp"""
+    from datetime import datetime
+    
+    text = text.strip()
+    now = datetime.now()
+    for pattern in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%H:%M:%S", "%H:%M"):
+        try:
+            value = datetime.strptime(text, pattern)
+        except ValueError:
+            continue
+        if not pattern.startswith("%Y"):
+            value = datetime.combine(now.date(), value.time())
+        return value.timestamp()
+    return None
+
+# Pasted text: grouping characters dropped, operators as on the keypad
+PASTE_TRANSLATION = str.maketrans({
+    ',': None, '_': None, "'": None, ' ': None, '\u00a0': None, '\u202f': None,
+    '\u2212': '-', '*': '×', '/': '÷', 'x': '×',
+})
+PASTE_NUMBER_RE = re.compile(r'-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?')
+PASTE_EXPRESSION_RE = re.compile(r'[-+×÷^()%²!√0-9.]+')
+
+
+def enclosed(text):
+    """Check if text is one parenthesised group, e.g. (1+2) but not (1)+(2)"""
+    if not (text.startswith('(') and text.endswith(')')):
+        return False
+    depth = 0
+    for index, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return index == len(text) - 1
+    return False
+
+
+def parse_paste(text):
+    """Input text for a clipboard payload, or None if it is not usable
+
+    Accepts one number (thousands separators allowed, e.g. "1,234.5") or
+    one arithmetic expression; expressions are parenthesised so they act
+    as a single operand.
+    """
+    text = text.strip()
+    if not text or '\n' in text or '\t' in text:
+        return None
+    text = text.translate(PASTE_TRANSLATION)
+    if text.startswith('+'):
+        text = text[1:]
+    if PASTE_NUMBER_RE.fullmatch(text):
+        return text
+    if not PASTE_EXPRESSION_RE.fullmatch(text):
+        return None
+    if not enclosed(text):
+        text = f"({text})"
+    # Compiling validates it and caches the code for calculate()
+    try:
+        compile_expression(text)
+    except ValueError:
+        return None
+    return text
 
 class AdvancedCalculator:
-    def __init__(self, root):
+    def __init__(self, root, deferred=False, history_path=None):
         self.root = root
         self.root.title("Advanced Calculator - Python")
-        self.root.geometry("500x700")
+        self.root.geometry(f"{WINDOW_WIDTH}x{WINDOW_HEIGHT}")
         self.root.configure(bg='#2e2e2e')
         
         # Theme settings
@@ -24,41 +150,92 @@ class AdvancedCalculator:
             'special_bg': '#616161'
         }
         
-        # Variable declaration
-        self.current_input = ""
-        self.result = ""
-        self.operator = ""
-        self.waiting_for_operand = False
-        self.memory = 0
-        self.history = []
+        # Keypad state (input, pending operation, memory)
+        self.state = engine.CalculatorState()
+        
+        # History store, opened in the background by load_history; None
+        # is the database shared by all instances
+        self.history_path = history_path
+        self.history_store = None
+        self.history_ready = threading.Event()
+        self.history_lock = threading.Lock()
+        self.pending_history = []
+        
+        # Exact (arbitrary precision) mode
+        self.exact_mode = False
+        self.exact_values = {}
+        
+        # Background evaluation (see the evaluator property); input made
+        # meanwhile is queued
+        self._evaluator = None
+        self.queued_input = []
+        
+        # Instrumentation, written to STATS_FILE on exit
+        self.error_count = 0
+        self.last_error = None
+        self.metrics = Metrics()
+        self.metrics.instrument(self, INSTRUMENTED_METHODS, self.errors_seen)
+        
+        # Mainloop stall watchdog, started with the mainloop
+        self.watchdog = None
         
         # Font settings
         self.display_font = font.Font(family='Arial', size=24, weight='bold')
         self.button_font = font.Font(family='Arial', size=14, weight='bold')
         self.small_font = font.Font(family='Arial', size=10)
+        self.long_display_font = font.Font(family='Arial', size=18, weight='bold')
+        
+        # Display render state (see render_display)
+        self.display_text = None
+        self.render_scheduled = False
+        self.rendered_text = "0"
+        self.display_long = False
+        self.char_widths = {}
+        self.digit_grouping = False
+        
+        # Live preview of the running value, parsed as it is typed
+        self.preview = IncrementalExpression()
+        self.preview_text = ""
         
         # Keyboard shortcuts setup
         self.setup_keyboard_shortcuts()
         
-        # Load history file
+        # Load history file (in the background)
         self.load_history()
         
-        # Create GUI
+        # Create GUI; with deferred=True the memory and scientific rows
+        # are left to finish_startup() after the first frame
         self.create_widgets()
+        if not deferred:
+            self.finish_startup()
+        
+        # Write pending history before closing
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def setup_keyboard_shortcuts(self):
         """Setup keyboard shortcuts"""
         self.root.bind('<Key>', self.key_pressed)
+        self.root.bind('<Control-v>', self.paste)
+        self.root.bind('<Control-V>', self.paste)
         
     def key_pressed(self, event):
         """Keyboard key press handler"""
         key = event.char
         keysym = event.keysym
         
+        if self.evaluation_running():
+            if keysym == 'Escape':
+                self.cancel_evaluation()
+            elif key:
+                self.when_idle(self.key_pressed, event)
+            return
+        
         if key in '0123456789':
             self.add_digit(key)
         elif key == '.':
             self.add_decimal()
+        elif key in ('(', ')'):
+            self.add_parenthesis(key)
         elif key in '+-*/':
             op_map = {'+': '+', '-': '-', '*': '×', '/': '÷'}
             self.set_operator(op_map.get(key, key))
@@ -103,13 +280,108 @@ class AdvancedCalculator:
         )
         theme_btn.pack(side=tk.RIGHT, padx=20)
         
+        # Exact mode toggle and precision (significant digits)
+        self.precision_var = tk.StringVar(value=str(engine.DEFAULT_PRECISION))
+        precision_box = tk.Spinbox(
+            title_frame,
+            from_=10,
+            to=10000,
+            increment=10,
+            width=5,
+            textvariable=self.precision_var,
+            font=('Arial', 10)
+        )
+        precision_box.pack(side=tk.RIGHT)
+        
+        self.exact_btn = tk.Button(
+            title_frame,
+            text="Exact",
+            font=('Arial', 10),
+            bg='#1a1a1a',
+            fg='#ffffff',
+            borderwidth=0,
+            command=self.toggle_exact_mode
+        )
+        self.exact_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Result notation and digit grouping
+        self.notation_btn = tk.Button(
+            title_frame,
+            text=NOTATION_LABELS[calculator_format.formatter.notation],
+            font=('Arial', 10),
+            bg='#1a1a1a',
+            fg='#ffffff',
+            borderwidth=0,
+            command=self.cycle_notation
+        )
+        self.notation_btn.pack(side=tk.RIGHT, padx=5)
+        
+        self.grouping_btn = tk.Button(
+            title_frame,
+            text="1,000",
+            font=('Arial', 10),
+            bg='#1a1a1a',
+            fg='#ffffff',
+            borderwidth=0,
+            command=self.toggle_grouping
+        )
+        self.grouping_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Diagnostics window
+        stats_btn = tk.Button(
+            title_frame,
+            text="Stats",
+            font=('Arial', 10),
+            bg='#1a1a1a',
+            fg='#ffffff',
+            borderwidth=0,
+            command=self.show_diagnostics
+        )
+        stats_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Function table window
+        table_btn = tk.Button(
+            title_frame,
+            text="Table",
+            font=('Arial', 10),
+            bg='#1a1a1a',
+            fg='#ffffff',
+            borderwidth=0,
+            command=self.show_table
+        )
+        table_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Streaming statistics window
+        sigma_btn = tk.Button(
+            title_frame,
+            text="Σ",
+            font=('Arial', 10),
+            bg='#1a1a1a',
+            fg='#ffffff',
+            borderwidth=0,
+            command=self.show_statistics
+        )
+        sigma_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Matrix and vector window
+        matrix_btn = tk.Button(
+            title_frame,
+            text="Mat",
+            font=('Arial', 10),
+            bg='#1a1a1a',
+            fg='#ffffff',
+            borderwidth=0,
+            command=self.show_matrix
+        )
+        matrix_btn.pack(side=tk.RIGHT, padx=5)
+        
         # Memory indicator
         memory_frame = tk.Frame(self.root, bg=self.current_theme['bg'], height=30)
         memory_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(10, 5))
         
         self.memory_label = tk.Label(
             memory_frame,
-            text=f"Memory: {self.memory}",
+            text=f"Memory: {self.state.memory}",
             font=self.small_font,
             bg=self.current_theme['bg'],
             fg='#ff9500'
@@ -135,61 +407,38 @@ class AdvancedCalculator:
         )
         self.display.pack(fill=tk.BOTH, expand=True)
         
-        # Memory buttons frame
-        memory_btn_frame = tk.Frame(self.root, bg=self.current_theme['bg'])
-        memory_btn_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(0, 10))
-        
-        memory_buttons = [
-            ('MC', self.memory_clear),
-            ('MR', self.memory_recall),
-            ('M+', self.memory_add),
-            ('M-', self.memory_subtract),
-            ('MS', self.memory_store)
-        ]
-        
-        for text, command in memory_buttons:
-            btn = tk.Button(
-                memory_btn_frame,
-                text=text,
-                font=self.button_font,
-                bg=self.current_theme['special_bg'],
-                fg=self.current_theme['fg'],
-                activebackground='#8a8a8a',
-                borderwidth=0,
-                relief='raised',
-                command=command
-            )
-            btn.pack(side=tk.LEFT, padx=2, ipadx=10, ipady=5)
+        # Live result preview, shown under the input while typing
+        self.preview_label = tk.Label(
+            self.display_frame,
+            font=self.small_font,
+            anchor='e',
+            bg=self.current_theme['display_bg'],
+            fg='#9e9e9e'
+        )
         
-        # Scientific buttons frame
-        sci_frame = tk.Frame(self.root, bg=self.current_theme['bg'])
-        sci_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(0, 10))
+        # Display context menu
+        self.display_menu = tk.Menu(self.root, tearoff=0)
+        self.display_menu.add_command(label="Copy", command=self.copy)
+        self.display_menu.add_command(label="Paste", accelerator="Ctrl+V", command=self.paste)
+        self.display.bind('<Button-3>', self.show_display_menu)
         
-        sci_buttons = [
-            ('sin', self.sine), ('cos', self.cosine), ('tan', self.tangent),
-            ('log', self.logarithm), ('√', self.square_root), ('x²', self.square),
-            ('π', self.pi), ('e', self.euler), ('x!', self.factorial)
-        ]
+        # Cancel button, shown over the display while computing
+        self.cancel_button = tk.Button(
+            self.display_frame,
+            text="Cancel",
+            font=self.small_font,
+            bg=self.current_theme['special_bg'],
+            fg=self.current_theme['fg'],
+            borderwidth=0,
+            command=self.cancel_evaluation
+        )
         
-        for i in range(0, len(sci_buttons), 3):
-            row_frame = tk.Frame(sci_frame, bg=self.current_theme['bg'])
-            row_frame.pack(fill=tk.X, pady=2)
-            
-            for j in range(3):
-                if i + j < len(sci_buttons):
-                    text, command = sci_buttons[i + j]
-                    btn = tk.Button(
-                        row_frame,
-                        text=text,
-                        font=self.button_font,
-                        bg=self.current_theme['special_bg'],
-                        fg=self.current_theme['fg'],
-                        activebackground='#8a8a8a',
-                        borderwidth=0,
-                        relief='raised',
-                        command=command
-                    )
-                    btn.pack(side=tk.LEFT, padx=2, expand=True, fill=tk.X, ipady=5)
+        # Frames for the rows built by finish_startup()
+        self.memory_btn_frame = tk.Frame(self.root, bg=self.current_theme['bg'])
+        self.memory_btn_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(0, 10))
+        self.sci_frame = tk.Frame(self.root, bg=self.current_theme['bg'])
+        self.sci_frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(0, 10))
+        self.panels_built = False
         
         # Main buttons frame
         self.buttons_frame = tk.Frame(self.root, bg=self.current_theme['bg'])
@@ -239,8 +488,72 @@ class AdvancedCalculator:
                 )
                 button.grid(row=row_idx, column=col_idx, padx=2, pady=2, sticky='nsew')
     
+    def build_memory_buttons(self):
+        """Create memory buttons"""
+        memory_buttons = [
+            ('MC', self.memory_clear),
+            ('MR', self.memory_recall),
+            ('M+', self.memory_add),
+            ('M-', self.memory_subtract),
+            ('MS', self.memory_store)
+        ]
+        
+        for text, command in memory_buttons:
+            btn = tk.Button(
+                self.memory_btn_frame,
+                text=text,
+                font=self.button_font,
+                bg=self.current_theme['special_bg'],
+                fg=self.current_theme['fg'],
+                activebackground='#8a8a8a',
+                borderwidth=0,
+                relief='raised',
+                command=lambda c=command: self.when_idle(c)
+            )
+            btn.pack(side=tk.LEFT, padx=2, ipadx=10, ipady=5)
+    
+    def build_scientific_buttons(self):
+        """Create scientific function buttons"""
+        sci_buttons = [
+            ('sin', self.sine), ('cos', self.cosine), ('tan', self.tangent),
+            ('log', self.logarithm), ('√', self.square_root), ('x²', self.square),
+            ('π', self.pi), ('e', self.euler), ('x!', self.factorial)
+        ]
+        
+        for i in range(0, len(sci_buttons), 3):
+            row_frame = tk.Frame(self.sci_frame, bg=self.current_theme['bg'])
+            row_frame.pack(fill=tk.X, pady=2)
+            
+            for j in range(3):
+                if i + j < len(sci_buttons):
+                    text, command = sci_buttons[i + j]
+                    btn = tk.Button(
+                        row_frame,
+                        text=text,
+                        font=self.button_font,
+                        bg=self.current_theme['special_bg'],
+                        fg=self.current_theme['fg'],
+                        activebackground='#8a8a8a',
+                        borderwidth=0,
+                        relief='raised',
+                        command=lambda c=command: self.when_idle(c)
+                    )
+                    btn.pack(side=tk.LEFT, padx=2, expand=True, fill=tk.X, ipady=5)
+    
+    def finish_startup(self):
+        """Build the panels left out of the first frame"""
+        if self.panels_built:
+            return
+        self.panels_built = True
+        self.build_memory_buttons()
+        self.build_scientific_buttons()
+    
     def button_click(self, value):
         """Button click handler"""
+        if self.evaluation_running():
+            self.when_idle(self.button_click, value)
+            return
+        
         if value == 'C':
             self.clear_all()
         elif value == '←':
@@ -266,322 +579,408 @@ class AdvancedCalculator:
     
     def add_digit(self, digit):
         """Add digit to input"""
-        if self.waiting_for_operand:
-            self.current_input = ""
-            self.waiting_for_operand = False
+        if self.state.waiting_for_operand:
+            self.state.current_input = ""
+            self.state.waiting_for_operand = False
         
-        if self.current_input == "0":
-            self.current_input = digit
+        if self.state.current_input == "0":
+            self.state.current_input = digit
         else:
-            self.current_input += digit
+            self.state.current_input += digit
         
         self.update_display()
     
     def add_decimal(self):
         """Add decimal point"""
-        if self.waiting_for_operand:
-            self.current_input = "0."
-            self.waiting_for_operand = False
-        elif "." not in self.current_input:
-            if self.current_input == "":
-                self.current_input = "0."
+        if self.state.waiting_for_operand:
+            self.state.current_input = "0."
+            self.state.waiting_for_operand = False
+        elif "." not in self.last_number():
+            if self.last_number() == "":
+                self.state.current_input += "0."
             else:
-                self.current_input += "."
+                self.state.current_input += "."
         
         self.update_display()
     
+    def last_number(self):
+        """Number being typed at the end of current input"""
+        head = self.state.current_input.rstrip('0123456789.')
+        return self.state.current_input[len(head):]
+    
+    def has_open_parenthesis(self):
+        """Check for unclosed parenthesis in current input"""
+        return self.state.current_input.count('(') > self.state.current_input.count(')')
+    
     def add_parenthesis(self, paren):
         """Add parenthesis"""
-        if self.waiting_for_operand:
-            self.current_input = ""
-            self.waiting_for_operand = False
+        if self.state.waiting_for_operand:
+            self.state.current_input = ""
+            self.state.waiting_for_operand = False
         
-        self.current_input += paren
+        self.state.current_input += paren
         self.update_display()
     
     def set_operator(self, op):
         """Set operator"""
-        if self.current_input:
-            if self.result and not self.waiting_for_operand:
+        # Inside parentheses the operator becomes part of the expression
+        if self.has_open_parenthesis():
+            self.state.current_input += op
+            self.update_display()
+            return
+        
+        if self.state.current_input:
+            if self.state.result and not self.state.waiting_for_operand:
                 self.calculate()
             
-            self.result = self.current_input
-            self.current_input = ""
+            self.state.result = self.state.current_input
+            self.state.current_input = ""
         
         # Operator mapping (for display)
         op_map = {'+': '+', '-': '-', '×': '*', '÷': '/'}
-        self.operator = op_map[op]
-        self.waiting_for_operand = True
+        self.state.operator = op_map[op]
+        self.state.waiting_for_operand = True
         
         # Display operator
         display_op = op
-        if self.result:
-            self.display_var.set(f"{self.result} {display_op}")
+        if self.state.result:
+            self.set_display(f"{self.state.result} {display_op}")
         else:
-            self.display_var.set(display_op)
+            self.set_display(display_op)
     
     def calculate(self):
         """Perform calculation"""
-        if not self.result or not self.current_input or not self.operator:
+        if self.state.result and self.state.current_input and self.state.operator:
+            expression = f"{self.state.result} {self.state.operator} {self.state.current_input}"
+        elif not self.state.operator and '(' in self.state.current_input:
+            expression = self.state.current_input
+        else:
             return
         
-        try:
-            # Convert string to number
-            num1 = float(self.result)
-            num2 = float(self.current_input)
-            
-            # Save expression for history
-            expression = f"{self.result} {self.operator} {self.current_input}"
-            
-            # Perform operation based on operator
-            if self.operator == '+':
-                result = num1 + num2
-            elif self.operator == '-':
-                result = num1 - num2
-            elif self.operator == '*':
-                result = num1 * num2
-            elif self.operator == '/':
-                if num2 == 0:
-                    self.display_var.set("Infinity")
-                    self.current_input = ""
-                    self.result = ""
-                    self.operator = ""
-                    return
-                result = num1 / num2
-            
-            # Set result
-            if result.is_integer():
-                self.current_input = str(int(result))
+        # Parenthesised input goes through the expression compiler,
+        # plain numbers straight to the engine
+        typed = [text for text in (self.state.result, self.state.current_input) if text not in self.exact_values]
+        finish = lambda result: self.finish_calculation(expression, result)
+        if any('(' in text or ')' in text for text in typed):
+            if len(expression) > SLOW_EXPRESSION_LENGTH:
+                self.run_in_background(evaluate_expression, (expression,), finish)
             else:
-                self.current_input = str(round(result, 10)).rstrip('0').rstrip('.')
-            
-            # Add to history
-            self.add_to_history(expression, self.current_input)
-            
-            self.result = ""
-            self.operator = ""
-            self.waiting_for_operand = True
-            self.update_display()
-            
-        except Exception as e:
-            self.display_var.set("Error")
-            self.current_input = ""
-            self.result = ""
-            self.operator = ""
+                finish(evaluate_expression(expression))
+        elif self.exact_mode:
+            self.run_exact((self.state.operator, self.operand(self.state.result),
+                            self.operand(self.state.current_input), self.current_precision()), finish)
+        else:
+            finish(engine.evaluate(self.state.operator, self.state.result, self.state.current_input))
+    
+    def finish_calculation(self, expression, result):
+        """Show the result of calculate()"""
+        if result in engine.ERROR_RESULTS:
+            self.show_error(result)
+            self.state.current_input = ""
+            self.state.result = ""
+            self.state.operator = ""
+            return
+        
+        # Set result
+        self.state.current_input = result
+        
+        # Add to history
+        self.add_to_history(expression, self.state.current_input)
+        
+        self.state.result = ""
+        self.state.operator = ""
+        self.state.waiting_for_operand = True
+        self.update_display()
     
     def clear_all(self):
         """Clear all data"""
-        self.current_input = ""
-        self.result = ""
-        self.operator = ""
-        self.waiting_for_operand = False
-        self.display_var.set("0")
+        self.state.clear()
+        self.update_display()
     
     def backspace(self):
         """Remove last digit"""
-        if self.current_input:
-            self.current_input = self.current_input[:-1]
-            if not self.current_input:
-                self.current_input = "0"
+        if self.state.current_input:
+            self.state.current_input = self.state.current_input[:-1]
+            if not self.state.current_input:
+                self.state.current_input = "0"
             self.update_display()
     
+    def paste(self, event=None):
+        """Load the clipboard into the input in one step"""
+        if self.evaluation_running():
+            self.when_idle(self.paste)
+            return "break"
+        try:
+            text = parse_paste(self.root.clipboard_get())
+        except tk.TclError:
+            text = None
+        if text is None:
+            self.root.bell()
+            return "break"
+        
+        if self.has_open_parenthesis() and not self.state.waiting_for_operand:
+            # Continue the expression being typed
+            self.state.current_input += text
+        else:
+            self.state.current_input = text
+            self.state.waiting_for_operand = False
+        self.update_display()
+        return "break"
+    
+    def copy(self):
+        """Copy the current input or result to the clipboard"""
+        text = self.state_text()
+        self.root.clipboard_clear()
+        self.root.clipboard_append(text)
+    
+    def show_display_menu(self, event):
+        """Show the copy/paste menu at the pointer"""
+        try:
+            self.display_menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            self.display_menu.grab_release()
+    
     def toggle_sign(self):
         """Toggle positive/negative sign"""
-        if self.current_input and self.current_input != "0":
-            if self.current_input[0] == '-':
-                self.current_input = self.current_input[1:]
+        if self.state.current_input and self.state.current_input != "0":
+            if self.state.current_input[0] == '-':
+                self.state.current_input = self.state.current_input[1:]
+            else:
+                self.state.current_input = '-' + self.state.current_input
+            self.update_display()
+    
+    def operand(self, text):
+        """Exact value behind a display text, or the text itself"""
+        return self.exact_values.get(text, text)
+    
+    def exact_result(self, value):
+        """Display text of an exact result, remembering its full value"""
+        text = engine.format_exact(value)
+        if text not in engine.ERROR_RESULTS:
+            if len(self.exact_values) > 16:
+                self.exact_values.clear()
+            self.exact_values[text] = value
+        return text
+    
+    def current_precision(self):
+        """Selected number of significant digits for exact mode"""
+        try:
+            return max(1, int(self.precision_var.get()))
+        except (ValueError, tk.TclError):
+            return engine.DEFAULT_PRECISION
+    
+    def apply_function(self, op, clear_on_error=False):
+        """Apply engine function to current input"""
+        if self.state.current_input:
+            finish = lambda result: self.finish_function(result, clear_on_error)
+            if self.exact_mode:
+                self.run_exact((op, self.operand(self.state.current_input), None, self.current_precision()), finish)
             else:
-                self.current_input = '-' + self.current_input
+                finish(engine.evaluate(op, self.state.current_input))
+    
+    def finish_function(self, result, clear_on_error=False):
+        """Show the result of apply_function()"""
+        if result in engine.ERROR_RESULTS:
+            self.show_error(result)
+            if clear_on_error:
+                self.state.current_input = ""
+        else:
+            self.state.current_input = result
+            # Shortened results can not be edited
+            if '…' in result:
+                self.state.waiting_for_operand = True
             self.update_display()
     
     def percentage(self):
         """Calculate percentage"""
-        if self.current_input:
-            try:
-                value = float(self.current_input) / 100
-                if value.is_integer():
-                    self.current_input = str(int(value))
-                else:
-                    self.current_input = str(value)
-                self.update_display()
-            except:
-                self.display_var.set("Error")
-                self.current_input = ""
+        self.apply_function('percentage', clear_on_error=True)
     
     def reciprocal(self):
         """Reciprocal (1/x)"""
-        if self.current_input and self.current_input != "0":
-            try:
-                value = 1 / float(self.current_input)
-                if value.is_integer():
-                    self.current_input = str(int(value))
-                else:
-                    self.current_input = str(round(value, 10))
-                self.update_display()
-            except:
-                self.display_var.set("Error")
-                self.current_input = ""
+        if self.state.current_input != "0":
+            self.apply_function('reciprocal', clear_on_error=True)
     
     def square_root(self):
         """Square root"""
-        if self.current_input:
-            try:
-                value = float(self.current_input)
-                if value >= 0:
-                    result = math.sqrt(value)
-                    self.current_input = str(round(result, 10))
-                    self.update_display()
-                else:
-                    self.display_var.set("Imaginary Number")
-            except:
-                self.display_var.set("Error")
+        self.apply_function('square_root')
     
     def square(self):
         """Square (x²)"""
-        if self.current_input:
-            try:
-                value = float(self.current_input)
-                result = value ** 2
-                self.current_input = str(round(result, 10))
-                self.update_display()
-            except:
-                self.display_var.set("Error")
+        self.apply_function('square')
     
     def sine(self):
         """Sine function"""
-        if self.current_input:
-            try:
-                value = float(self.current_input)
-                result = math.sin(math.radians(value))  # Input in degrees
-                self.current_input = str(round(result, 10))
-                self.update_display()
-            except:
-                self.display_var.set("Error")
+        self.apply_function('sine')
     
     def cosine(self):
         """Cosine function"""
-        if self.current_input:
-            try:
-                value = float(self.current_input)
-                result = math.cos(math.radians(value))  # Input in degrees
-                self.current_input = str(round(result, 10))
-                self.update_display()
-            except:
-                self.display_var.set("Error")
+        self.apply_function('cosine')
     
     def tangent(self):
         """Tangent function"""
-        if self.current_input:
-            try:
-                value = float(self.current_input)
-                result = math.tan(math.radians(value))  # Input in degrees
-                self.current_input = str(round(result, 10))
-                self.update_display()
-            except:
-                self.display_var.set("Error")
+        self.apply_function('tangent')
     
     def logarithm(self):
         """Logarithm (base 10)"""
-        if self.current_input:
-            try:
-                value = float(self.current_input)
-                if value > 0:
-                    result = math.log10(value)
-                    self.current_input = str(round(result, 10))
-                    self.update_display()
-                else:
-                    self.display_var.set("Error: Number must be positive")
-            except:
-                self.display_var.set("Error")
+        self.apply_function('logarithm')
     
     def pi(self):
         """Pi (π)"""
-        self.current_input = str(math.pi)
-        self.update_display()
+        if self.exact_mode:
+            self.run_exact(('pi', None, None, self.current_precision()), self.finish_constant)
+        else:
+            self.finish_constant(engine.pi())
     
     def euler(self):
         """Euler's number (e)"""
-        self.current_input = str(math.e)
+        if self.exact_mode:
+            self.run_exact(('e', None, None, self.current_precision()), self.finish_constant)
+        else:
+            self.finish_constant(engine.euler())
+    
+    def finish_constant(self, text):
+        """Show a constant as the current input"""
+        self.state.current_input = text
         self.update_display()
     
     def factorial(self):
         """Factorial"""
-        if self.current_input:
-            try:
-                value = int(float(self.current_input))
-                if value >= 0 and value <= 100:  # Limit for performance
-                    result = math.factorial(value)
-                    self.current_input = str(result)
-                    self.update_display()
-                elif value > 100:
-                    self.display_var.set("Number too large")
-                else:
-                    self.display_var.set("Error: Negative number")
-            except:
-                self.display_var.set("Error")
+        self.apply_function('factorial')
+    
+    # Background evaluation functions
+    @property
+    def evaluator(self):
+        """Background evaluator, imported and created on first use"""
+        if self._evaluator is None:
+            from calculator_executor import BackgroundEvaluator
+            self._evaluator = BackgroundEvaluator(self.root)
+        return self._evaluator
+    
+    def evaluation_running(self):
+        return self._evaluator is not None and self._evaluator.busy
+    
+    def run_exact(self, args, finish):
+        """Pass the display text of exact_compute(*args) to finish
+        
+        Runs in the worker process when it would block the window.
+        """
+        if engine.exact_is_slow(*args):
+            self.run_in_background(engine.exact_compute, args,
+                                   lambda value: finish(self.exact_result(value)))
+        else:
+            finish(self.exact_result(engine.exact_compute(*args)))
+    
+    def run_in_background(self, func, args, finish):
+        """Evaluate func(*args) in the worker, showing a computing state"""
+        self.set_display("Computing…")
+        self.cancel_button.place(x=8, rely=0.5, anchor='w')
+        
+        def done(result):
+            self.cancel_button.place_forget()
+            finish(result)
+            self.run_queued_input()
+        self.evaluator.submit(func, args, done)
+    
+    def cancel_evaluation(self):
+        """Stop the background evaluation and drop queued input"""
+        if self._evaluator is not None and self._evaluator.cancel():
+            self.queued_input = []
+            self.cancel_button.place_forget()
+            self.update_display()
+    
+    def when_idle(self, func, *args):
+        """Run func now, or queue it while an evaluation is running"""
+        if not self.evaluation_running():
+            return func(*args)
+        if len(self.queued_input) < MAX_QUEUED_INPUT:
+            self.queued_input.append((func, args))
+        else:
+            self.root.bell()
+    
+    def run_queued_input(self):
+        """Replay input queued during an evaluation, in order"""
+        queued, self.queued_input = self.queued_input, []
+        for index, (func, args) in enumerate(queued):
+            func(*args)
+            if self.evaluation_running():
+                # Another slow evaluation started, keep the rest queued
+                self.queued_input = queued[index + 1:] + self.queued_input
+                return
     
     # Memory functions
     def memory_clear(self):
         """Clear memory"""
-        self.memory = 0
+        self.state.memory = 0
         self.update_memory_display()
     
     def memory_recall(self):
         """Recall from memory"""
-        self.current_input = str(self.memory)
+        self.state.current_input = str(self.state.memory)
         self.update_display()
     
     def memory_add(self):
         """Add to memory"""
-        if self.current_input:
+        if self.state.current_input:
             try:
-                self.memory += float(self.current_input)
+                self.state.memory += float(self.state.current_input)
                 self.update_memory_display()
             except:
                 pass
     
     def memory_subtract(self):
         """Subtract from memory"""
-        if self.current_input:
+        if self.state.current_input:
             try:
-                self.memory -= float(self.current_input)
+                self.state.memory -= float(self.state.current_input)
                 self.update_memory_display()
             except:
                 pass
     
     def memory_store(self):
         """Store in memory"""
-        if self.current_input:
+        if self.state.current_input:
             try:
-                self.memory = float(self.current_input)
+                self.state.memory = float(self.state.current_input)
                 self.update_memory_display()
             except:
                 pass
     
     def update_memory_display(self):
         """Update memory display"""
-        self.memory_label.config(text=f"Memory: {self.memory}")
+        self.memory_label.config(text=f"Memory: {self.state.memory}")
     
     # History functions
     def add_to_history(self, expression, result):
         """Add to history"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        entry = {
-            'time': timestamp,
-            'expression': expression,
-            'result': result
-        }
-        self.history.append(entry)
-        
-        # Keep only last 50 entries
-        if len(self.history) > 50:
-            self.history = self.history[-50:]
-        
-        # Save to file
-        self.save_history()
+        # Stored in background, every entry is kept
+        with self.history_lock:
+            if self.history_store is None:
+                # Store still opening, added by open_history_store()
+                self.pending_history.append((expression, result, time.time()))
+                return
+        self.history_store.add(expression, result)
+    
+    def get_history_store(self):
+        """History store, waiting for the background load if needed
+
+        None when it could not be opened at all.
+        """
+        self.history_ready.wait()
+        return self.history_store
     
     def show_history(self):
         """Show calculation history"""
+        from calculator_widgets import VirtualList
+        
+        if not self.history_ready.is_set():
+            # Still opening in the background; check again instead of
+            # blocking the mainloop
+            self.root.after(HISTORY_WAIT_INTERVAL, self.show_history)
+            return
+        history_store = self.history_store
+        if history_store is None:
+            self.note_error("History error")
+            return
         history_window = tk.Toplevel(self.root)
         history_window.title("Calculation History")
         history_window.geometry("400x500")
@@ -597,26 +996,77 @@ class AdvancedCalculator:
         )
         title_label.pack(pady=10)
         
-        # Text widget
-        text_widget = tk.Text(
+        # Search and jump controls
+        nav_frame = tk.Frame(history_window, bg='#2e2e2e')
+        nav_frame.pack(fill=tk.X, padx=10)
+        
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(nav_frame, textvariable=search_var, font=('Arial', 10), width=14)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        jump_var = tk.StringVar()
+        jump_btn = tk.Button(nav_frame, text="Jump to time", font=('Arial', 10))
+        jump_btn.pack(side=tk.RIGHT, padx=(5, 0))
+        jump_entry = tk.Entry(nav_frame, textvariable=jump_var, font=('Arial', 10), width=10)
+        jump_entry.pack(side=tk.RIGHT, padx=(5, 0))
+        
+        # Search filter of the list
+        state = {'search': ''}
+        
+        def count():
+            if state['search']:
+                return history_store.search_count(state['search'])
+            return history_store.count()
+        
+        def fetch(offset, limit):
+            if state['search']:
+                return history_store.search(state['search'], offset=offset, limit=limit)
+            return history_store.page(offset, limit)
+        
+        # Virtual list, only visible rows are built
+        history_list = VirtualList(
             history_window,
-            bg='#1a1a1a',
-            fg='#ffffff',
-            font=('Arial', 10),
-            wrap=tk.WORD,
-            height=20
+            count=count,
+            fetch=fetch,
+            format_row=lambda entry: f"[{entry['time']}] {entry['expression']} = {entry['result']}",
+            empty_text="No history available"
         )
-        text_widget.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        history_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
-        # Display history
-        if not self.history:
-            text_widget.insert(tk.END, "No history available\n")
-        else:
-            for entry in reversed(self.history):
-                text = f"[{entry['time']}] {entry['expression']} = {entry['result']}\n"
-                text_widget.insert(tk.END, text)
+        def search(event=None):
+            state['search'] = search_var.get().strip()
+            history_list.first = 0
+            history_list.refresh()
+        
+        def jump(event=None):
+            timestamp = parse_jump_time(jump_var.get())
+            if timestamp is None:
+                return
+            # Search results are not indexed by time, jump in the full list
+            if state['search']:
+                search_var.set('')
+                state['search'] = ''
+                history_list.refresh()
+            history_list.scroll_to(history_store.offset_at_time(timestamp))
         
-        text_widget.config(state=tk.DISABLED)
+        def merge():
+            # Show entries added by this and other instances meanwhile;
+            # rows already in view stay in place
+            if not history_window.winfo_exists():
+                return
+            if not state['search']:
+                total = history_store.count()
+                if total != history_list.total:
+                    if history_list.first:
+                        history_list.first += max(0, total - history_list.total)
+                    history_list.refresh()
+            history_window.after(HISTORY_REFRESH_INTERVAL, merge)
+        
+        search_entry.bind('<Return>', search)
+        jump_entry.bind('<Return>', jump)
+        jump_btn.config(command=jump)
+        history_list.focus_set()
+        history_window.after(HISTORY_REFRESH_INTERVAL, merge)
         
         # Clear button
         clear_btn = tk.Button(
@@ -631,27 +1081,581 @@ class AdvancedCalculator:
     
     def clear_history(self, window):
         """Clear history"""
-        self.history = []
-        self.save_history()
+        from tkinter import messagebox
+        
+        history_store = self.get_history_store()
+        if history_store is not None:
+            history_store.clear()
         window.destroy()
         messagebox.showinfo("Success", "History cleared")
     
     def save_history(self):
-        """Save history to file"""
+        """Wait until pending history entries are on disk"""
+        if self.history_store is None:
+            return
         try:
-            with open('calculator_history.json', 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
+            self.history_store.flush()
         except:
-            pass
+            self.note_error("History error")
     
     def load_history(self):
-        """Load history from file"""
+        """Load history from file in a background thread"""
+        thread = threading.Thread(target=self.open_history_store, name='history-load', daemon=True)
+        thread.start()
+    
+    def open_history_store(self):
+        """Open (and if needed import) the history store"""
+        from calculator_history import HistoryStore
+        
         try:
-            if os.path.exists('calculator_history.json'):
-                with open('calculator_history.json', 'r', encoding='utf-8') as f:
-                    self.history = json.load(f)
+            try:
+                store = HistoryStore(self.history_path).open()
+            except:
+                self.note_error("History error")
+                # Keep history in memory only
+                store = HistoryStore(':memory:').open(import_from=None)
+            
+            with self.history_lock:
+                for expression, result, timestamp in self.pending_history:
+                    store.add(expression, result, timestamp)
+                self.pending_history = []
+                self.history_store = store
+        finally:
+            # Nobody waits forever, even when no store could be opened
+            self.history_ready.set()
+    
+    def on_close(self):
+        """Close window after writing pending history"""
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        if self._evaluator is not None:
+            self._evaluator.close()
+        try:
+            self.history_ready.wait(timeout=5)
+            if self.history_store is not None:
+                self.history_store.close()
         except:
-            self.history = []
+            pass
+        try:
+            self.metrics.dump(data_file(STATS_FILE))
+        except OSError:
+            pass
+        self.root.destroy()
+    
+    # Diagnostics functions
+    def start_watchdog(self):
+        """Report callbacks that block the mainloop to the stall log"""
+        from calculator_watchdog import Watchdog
+        
+        if self.watchdog is None:
+            try:
+                log_path = data_file(STALL_LOG_FILE)
+            except OSError:
+                # Stalls are still counted for Diagnostics
+                log_path = None
+            self.watchdog = Watchdog(self.root, log_path=log_path)
+        self.watchdog.start()
+    
+    def note_error(self, text):
+        """Count an error outcome for the instrumentation"""
+        self.error_count += 1
+        self.last_error = text
+    
+    def show_error(self, text):
+        """Show error text on the display"""
+        self.note_error(text)
+        self.set_display(text)
+    
+    def errors_seen(self):
+        """Error count and last error text"""
+        return self.error_count, self.last_error
+    
+    # Function table
+    def show_table(self):
+        """Show a table of a function of x over a range"""
+        from tkinter import filedialog
+        from calculator_table import FunctionTable
+        from calculator_widgets import VirtualList
+        
+        table_window = tk.Toplevel(self.root)
+        table_window.title("Function Table")
+        table_window.geometry("400x500")
+        table_window.configure(bg='#2e2e2e')
+        
+        # Function and range
+        form_frame = tk.Frame(table_window, bg='#2e2e2e')
+        form_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        fields = {}
+        for column, (name, default, width) in enumerate([
+                ('f(x)', 'sin(x)', 14), ('from', '0', 6), ('to', '360', 6), ('step', '0.5', 6)]):
+            tk.Label(form_frame, text=name, font=('Arial', 10), bg='#2e2e2e', fg='#ffffff').grid(row=0, column=column)
+            var = tk.StringVar(value=default)
+            tk.Entry(form_frame, textvariable=var, font=('Arial', 10), width=width).grid(row=1, column=column, padx=2)
+            fields[name] = var
+        
+        status_label = tk.Label(table_window, text="", font=('Arial', 10), bg='#2e2e2e', fg='#ff9500')
+        status_label.pack(fill=tk.X, padx=10)
+        
+        # Current table; rows are formatted only when they become visible
+        state = {'table': None, 'started': 0.0}
+        
+        table_list = VirtualList(
+            table_window,
+            count=lambda: len(state['table']) if state['table'] else 0,
+            fetch=lambda offset, limit: state['table'].rows(offset, limit),
+            format_row=lambda row: f"{row[0]:>16}    {row[1]}",
+            row_font=('Courier', 10),
+            empty_text="Enter f(x) and a range"
+        )
+        table_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def evaluate(event=None):
+            try:
+                table = FunctionTable(fields['f(x)'].get(), float(fields['from'].get()),
+                                      float(fields['to'].get()), float(fields['step'].get()))
+            except ValueError as e:
+                status_label.config(text=str(e) or "Invalid function")
+                return
+            state['table'] = table
+            state['started'] = time.perf_counter()
+            table_list.first = 0
+            stream(table)
+        
+        def stream(table):
+            # A newer table replaced this one
+            if state['table'] is not table or not table_window.winfo_exists():
+                return
+            table.compute_chunk()
+            table_list.refresh()
+            if table.complete:
+                elapsed = (time.perf_counter() - state['started']) * 1000
+                mode = "vectorized" if table.vectorized else "scalar"
+                status_label.config(text=f"{table.total} points in {elapsed:.0f} ms ({mode})")
+            else:
+                status_label.config(text=f"{len(table)} of {table.total} points…")
+                table_window.after(1, stream, table)
+        
+        def export():
+            table = state['table']
+            if table is None or not table.complete:
+                return
+            path = filedialog.asksaveasfilename(parent=table_window, defaultextension='.csv',
+                                                filetypes=[("CSV files", "*.csv")])
+            if path:
+                try:
+                    rows = table.to_csv(path)
+                    status_label.config(text=f"{rows} rows written to {path}")
+                except OSError as e:
+                    status_label.config(text=str(e))
+        
+        button_frame = tk.Frame(table_window, bg='#2e2e2e')
+        button_frame.pack(pady=10)
+        for text, command in (("Evaluate", evaluate), ("Export CSV", export)):
+            tk.Button(button_frame, text=text, font=('Arial', 12), bg='#ff9500', fg='#ffffff',
+                      command=command).pack(side=tk.LEFT, padx=5)
+        table_window.bind('<Return>', evaluate)
+    
+    def show_statistics(self):
+        """Show count, sum, mean, spread and quantiles of entered numbers"""
+        import io
+        import itertools
+        from tkinter import filedialog
+        from calculator_statistics import StreamingStats
+        
+        stats_window = tk.Toplevel(self.root)
+        stats_window.title("Statistics")
+        stats_window.geometry("360x480")
+        stats_window.configure(bg='#2e2e2e')
+        
+        stats = StreamingStats()
+        state = {'source': None}
+        
+        # Data entry: Enter (or Σ+) adds the typed number or expression
+        entry_frame = tk.Frame(stats_window, bg='#2e2e2e')
+        entry_frame.pack(fill=tk.X, padx=10, pady=10)
+        value_var = tk.StringVar()
+        value_entry = tk.Entry(entry_frame, textvariable=value_var, font=('Arial', 12))
+        value_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        status_label = tk.Label(stats_window, text="", font=('Arial', 10), bg='#2e2e2e', fg='#ff9500')
+        status_label.pack(fill=tk.X, padx=10)
+        
+        results = tk.Label(stats_window, text="", font=('Courier', 11), justify=tk.LEFT, anchor='nw',
+                           bg='#1a1a1a', fg='#ffffff', padx=10, pady=10)
+        results.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def refresh():
+            results.config(text='\n'.join(f"{name:<10}{value}" for name, value in stats.summary()))
+        
+        def add_text(text):
+            text = text.strip()
+            if not text:
+                return False
+            try:
+                value = float(text)
+            except ValueError:
+                value = evaluate_expression(text)
+                try:
+                    value = float(value)
+                except ValueError:
+                    value = None
+            try:
+                stats.add(value)
+            except (TypeError, ValueError):
+                self.root.bell()
+                return False
+            refresh()
+            return True
+        
+        def add_entry(event=None):
+            if add_text(value_var.get()):
+                value_var.set('')
+            return "break"
+        
+        def add_display():
+            add_text(self.state_text())
+        
+        # Bulk input in one pass, in chunks so the window stays responsive
+        def load(source, name):
+            close_source()
+            state['source'] = source
+            state['name'] = name
+            state['added'] = 0
+            state['started'] = time.perf_counter()
+            stream(source)
+        
+        def stream(source):
+            if state['source'] is not source or not stats_window.winfo_exists():
+                return
+            try:
+                lines = list(itertools.islice(source, 5000))
+                state['added'] += stats.feed(lines)
+            except (OSError, ValueError) as e:
+                close_source()
+                status_label.config(text=str(e))
+                return
+            refresh()
+            if not lines:
+                elapsed = (time.perf_counter() - state['started']) * 1000
+                status_label.config(text=f"{state['added']} numbers from {state['name']} in {elapsed:.0f} ms")
+                close_source()
+            else:
+                status_label.config(text=f"{state['added']} numbers from {state['name']}…")
+                stats_window.after(1, stream, source)
+        
+        def close_source():
+            source = state['source']
+            state['source'] = None
+            if source is not None:
+                source.close()
+        
+        def paste():
+            try:
+                text = self.root.clipboard_get()
+            except tk.TclError:
+                self.root.bell()
+                return
+            load(io.StringIO(text), "clipboard")
+        
+        def open_file():
+            path = filedialog.askopenfilename(parent=stats_window,
+                                              filetypes=[("Text and CSV files", "*.txt *.csv"), ("All files", "*")])
+            if path:
+                try:
+                    load(open(path, 'r', encoding='utf-8', errors='replace'), path)
+                except OSError as e:
+                    status_label.config(text=str(e))
+        
+        def clear():
+            close_source()
+            stats.clear()
+            status_label.config(text="")
+            refresh()
+        
+        tk.Button(entry_frame, text="Σ+", font=('Arial', 12), bg='#ff9500', fg='#ffffff',
+                  command=add_entry).pack(side=tk.LEFT, padx=(5, 0))
+        value_entry.bind('<Return>', add_entry)
+        value_entry.bind('<KP_Enter>', add_entry)
+        
+        button_frame = tk.Frame(stats_window, bg='#2e2e2e')
+        button_frame.pack(pady=10)
+        for text, command in (("Add display", add_display), ("Paste", paste),
+                              ("Open file", open_file), ("Clear", clear)):
+            tk.Button(button_frame, text=text, font=('Arial', 10), bg='#ff9500', fg='#ffffff',
+                      command=command).pack(side=tk.LEFT, padx=3)
+        stats_window.bind('<Destroy>', lambda event: close_source() if event.widget is stats_window else None)
+        
+        refresh()
+        value_entry.focus_set()
+    
+    def show_matrix(self):
+        """Show the matrix window: two operands, operations and a result viewer"""
+        import calculator_matrix as matrix
+        from calculator_widgets import VirtualList
+        
+        if not matrix.available():
+            self.show_error("Matrix mode needs NumPy")
+            return
+        
+        matrix_window = tk.Toplevel(self.root)
+        matrix_window.title("Matrix")
+        matrix_window.geometry("560x640")
+        matrix_window.configure(bg='#2e2e2e')
+        
+        # Operands are kept as arrays; the text is parsed again only when
+        # it was edited. Matrices too large to edit are not written out.
+        operands = {}
+        state = {'result': None, 'column': 0}
+        
+        operand_frame = tk.Frame(matrix_window, bg='#2e2e2e')
+        operand_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        status_label = tk.Label(matrix_window, text="", font=('Arial', 10), bg='#2e2e2e', fg='#ff9500',
+                                anchor='w', justify=tk.LEFT, wraplength=520)
+        
+        def set_operand(name, value, source):
+            operand = operands[name]
+            operand['value'] = value
+            editor = operand['editor']
+            editor.delete('1.0', tk.END)
+            if value.size <= matrix.EDIT_LIMIT:
+                editor.insert('1.0', matrix.to_text(value))
+            else:
+                editor.insert('1.0', f"# {matrix.shape_text(value)} matrix from {source}")
+            editor.edit_modified(False)
+            operand['label'].config(text=f"{name}  {matrix.shape_text(value)}")
+        
+        def operand_value(name):
+            operand = operands[name]
+            editor = operand['editor']
+            if operand['value'] is None or editor.edit_modified():
+                value = matrix.parse_matrix(editor.get('1.0', tk.END))
+                operand['value'] = value
+                editor.edit_modified(False)
+                operand['label'].config(text=f"{name}  {matrix.shape_text(value)}")
+            return operand['value']
+        
+        def paste_operand(name):
+            try:
+                text = self.root.clipboard_get()
+            except tk.TclError:
+                self.root.bell()
+                return
+            try:
+                set_operand(name, matrix.parse_matrix(text), "the clipboard")
+            except matrix.MatrixError as e:
+                status_label.config(text=f"{name}: {e}")
+        
+        def use_result(name):
+            result = state['result']
+            if result is not None:
+                set_operand(name, result, "the result")
+        
+        for column, (name, default) in enumerate((('A', "1 2\n3 4"), ('B', "5 6\n7 8"))):
+            frame = tk.Frame(operand_frame, bg='#2e2e2e')
+            frame.grid(row=0, column=column, sticky='nsew', padx=5)
+            operand_frame.columnconfigure(column, weight=1)
+            label = tk.Label(frame, text=name, font=('Arial', 11, 'bold'), bg='#2e2e2e', fg='#ffffff', anchor='w')
+            label.pack(fill=tk.X)
+            editor = tk.Text(frame, font=('Courier', 10), width=24, height=6, wrap=tk.NONE,
+                             bg='#1a1a1a', fg='#ffffff', insertbackground='#ffffff')
+            editor.insert('1.0', default)
+            editor.pack(fill=tk.BOTH, expand=True)
+            operands[name] = {'value': None, 'editor': editor, 'label': label}
+            editor_buttons = tk.Frame(frame, bg='#2e2e2e')
+            editor_buttons.pack(fill=tk.X, pady=(3, 0))
+            for text, command in (("Paste", lambda n=name: paste_operand(n)),
+                                  ("Result →", lambda n=name: use_result(n))):
+                tk.Button(editor_buttons, text=text, font=('Arial', 9), bg='#505050', fg='#ffffff',
+                          command=command).pack(side=tk.LEFT, padx=(0, 3))
+        
+        # Operations: binary ones take A and B, unary ones take A
+        operation_frame = tk.Frame(matrix_window, bg='#2e2e2e')
+        operation_frame.pack(padx=10)
+        rows = (
+            (('A+B', '+'), ('A−B', '-'), ('A×B', '×'), ('A÷B', '÷'), ('A^B', '^')),
+            (('A²', 'x²'), ('√A', '√'), ('sin', 'sin'), ('cos', 'cos'), ('tan', 'tan'), ('log', 'log')),
+            (('A·B', '·'), ('Aᵀ', 'ᵀ'), ('det', 'det'), ('A⁻¹', 'inv'), ('solve A·X=B', 'solve')),
+        )
+        
+        def run(name):
+            try:
+                a = operand_value('A')
+                b = operand_value('B') if matrix.OPERATIONS[name][1] == 2 else None
+                started = time.perf_counter()
+                result = matrix.apply(name, a, b)
+            except matrix.MatrixError as e:
+                status_label.config(text=str(e))
+                self.note_error(str(e))
+                return
+            elapsed = (time.perf_counter() - started) * 1000
+            if not hasattr(result, 'shape'):
+                result = matrix.np.array([[result]])
+            state['result'] = result
+            state['column'] = 0
+            result_list.first = 0
+            result_list.refresh()
+            show_columns()
+            status_label.config(text=f"Result {matrix.shape_text(result)} in {elapsed:.1f} ms")
+        
+        for row, buttons in enumerate(rows):
+            for column, (text, name) in enumerate(buttons):
+                tk.Button(operation_frame, text=text, font=('Arial', 11), bg='#ff9500', fg='#ffffff',
+                          command=lambda n=name: run(n)).grid(row=row, column=column, padx=2, pady=2, sticky='ew')
+        
+        status_label.pack(fill=tk.X, padx=10, pady=5)
+        
+        # Result viewer: only the visible rows and columns are formatted
+        def format_row(index):
+            result = state['result']
+            cells = matrix.row_texts(result, index, state['column'], MATRIX_VIEW_COLUMNS)
+            return f"{index + 1:>5} " + ''.join(f"{cell:>13}" for cell in cells)
+        
+        result_list = VirtualList(
+            matrix_window,
+            count=lambda: 0 if state['result'] is None else state['result'].shape[0],
+            fetch=lambda offset, limit: range(offset, min(offset + limit, state['result'].shape[0])),
+            format_row=format_row,
+            row_font=('Courier', 10),
+            empty_text="Enter A and B and choose an operation"
+        )
+        
+        navigation_frame = tk.Frame(matrix_window, bg='#2e2e2e')
+        navigation_frame.pack(fill=tk.X, padx=10)
+        columns_label = tk.Label(navigation_frame, text="", font=('Arial', 10), bg='#2e2e2e', fg='#ffffff')
+        
+        def scroll_columns(step):
+            result = state['result']
+            if result is None:
+                return
+            last = max(0, result.shape[1] - MATRIX_VIEW_COLUMNS)
+            state['column'] = max(0, min(state['column'] + step, last))
+            result_list.refresh()
+            show_columns()
+        
+        def show_columns():
+            result = state['result']
+            if result is None:
+                columns_label.config(text="")
+                return
+            first = state['column']
+            last = min(result.shape[1], first + MATRIX_VIEW_COLUMNS)
+            columns_label.config(text=f"columns {first + 1}–{last} of {result.shape[1]}")
+        
+        tk.Button(navigation_frame, text="◀", font=('Arial', 10), bg='#505050', fg='#ffffff',
+                  command=lambda: scroll_columns(-MATRIX_VIEW_COLUMNS)).pack(side=tk.LEFT)
+        columns_label.pack(side=tk.LEFT, padx=5)
+        tk.Button(navigation_frame, text="▶", font=('Arial', 10), bg='#505050', fg='#ffffff',
+                  command=lambda: scroll_columns(MATRIX_VIEW_COLUMNS)).pack(side=tk.LEFT)
+        result_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 10))
+    
+    def show_diagnostics(self):
+        """Show per-operation call counts and timings"""
+        diag_window = tk.Toplevel(self.root)
+        diag_window.title("Diagnostics")
+        diag_window.geometry("620x560")
+        diag_window.configure(bg='#2e2e2e')
+        
+        title_label = tk.Label(
+            diag_window,
+            text="Operation Statistics",
+            font=('Arial', 16, 'bold'),
+            bg='#2e2e2e',
+            fg='#ff9500'
+        )
+        title_label.pack(pady=10)
+        
+        text_widget = tk.Text(
+            diag_window,
+            bg='#1a1a1a',
+            fg='#ffffff',
+            font=('Courier', 10),
+            wrap=tk.NONE,
+            height=15
+        )
+        text_widget.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def refresh():
+            lines = [f"{'operation':<16}{'calls':>8}{'total ms':>11}{'mean ms':>10}{'max ms':>10}{'errors':>8}"]
+            for name, calls, total, mean, maximum, errors in self.metrics.report_rows():
+                lines.append(f"{name:<16}{calls:>8}{total:>11.2f}{mean:>10.3f}{maximum:>10.2f}{errors:>8}")
+            lines.extend(cache_lines())
+            lines.extend(stall_lines())
+            text_widget.config(state=tk.NORMAL)
+            text_widget.delete('1.0', tk.END)
+            text_widget.insert(tk.END, '\n'.join(lines) + '\n')
+            text_widget.config(state=tk.DISABLED)
+        
+        def cache_lines():
+            import calculator_expression
+            
+            lines = ['', f"{'cache':<16}{'hits':>8}{'misses':>8}{'size':>12}{'hit rate':>10}"]
+            for name, info in (("functions", engine.function_cache_info()),
+                               ("expressions", calculator_expression.cache_info()),
+                               ("formatting", calculator_format.formatter.cache_info())):
+                size = f"{info['size']}/{info['maxsize']}"
+                lines.append(f"{name:<16}{info['hits']:>8}{info['misses']:>8}{size:>12}{info['hit_rate']:>10.1%}")
+            return lines
+        
+        def stall_lines():
+            watchdog = self.watchdog
+            if watchdog is None:
+                return []
+            lines = ['', f"Mainloop stalls (> {watchdog.threshold * 1000:.0f} ms late): {watchdog.stall_count}, "
+                         f"{watchdog.total_stalled * 1000:.0f} ms blocked, worst heartbeat "
+                         f"{watchdog.max_lateness * 1000:.0f} ms late of {watchdog.beats}",
+                     f"{'handler':<40}{'stalls':>8}{'total ms':>11}{'max ms':>10}"]
+            rows = watchdog.summary_rows()
+            for name, count, total, maximum in rows:
+                lines.append(f"{name:<40}{count:>8}{total:>11.0f}{maximum:>10.0f}")
+            if rows:
+                lines.append('')
+                lines.append(f"Longest stall, in {rows[0][0]}:")
+                lines.extend(f"  {line}" for line in watchdog.worst_stack(rows[0][0])[-10:])
+            return lines
+        
+        def reset():
+            self.metrics.reset()
+            if self.watchdog is not None:
+                self.watchdog.reset()
+            refresh()
+        
+        btn_frame = tk.Frame(diag_window, bg='#2e2e2e')
+        btn_frame.pack(pady=10)
+        for text, command in (("Refresh", refresh),
+                              ("Save", lambda: self.metrics.dump(data_file(STATS_FILE))),
+                              ("Reset", reset)):
+            btn = tk.Button(
+                btn_frame,
+                text=text,
+                font=('Arial', 12),
+                bg='#ff9500',
+                fg='#ffffff',
+                command=command
+            )
+            btn.pack(side=tk.LEFT, padx=5)
+        
+        refresh()
+    
+    def toggle_exact_mode(self):
+        """Switch between float and exact (arbitrary precision) mode"""
+        self.exact_mode = not self.exact_mode
+        self.exact_btn.config(fg='#ff9500' if self.exact_mode else '#ffffff')
+    
+    def cycle_notation(self):
+        """Switch result notation: fixed, scientific, engineering"""
+        notations = calculator_format.NOTATIONS
+        current = calculator_format.formatter.notation
+        notation = notations[(notations.index(current) + 1) % len(notations)]
+        calculator_format.formatter.configure(notation=notation)
+        self.notation_btn.config(text=NOTATION_LABELS[notation])
+    
+    def toggle_grouping(self):
+        """Show digits in groups of three on the display"""
+        self.digit_grouping = not self.digit_grouping
+        self.grouping_btn.config(fg='#ff9500' if self.digit_grouping else '#ffffff')
+        self.update_display()
     
     # Theme functions
     def toggle_theme(self):
@@ -695,6 +1699,7 @@ class AdvancedCalculator:
             bg=self.current_theme['display_bg'],
             fg=self.current_theme['fg']
         )
+        self.preview_label.configure(bg=self.current_theme['display_bg'])
         
         # Buttons frame
         self.buttons_frame.configure(bg=self.current_theme['bg'])
@@ -706,39 +1711,158 @@ class AdvancedCalculator:
         )
     
     def update_display(self):
-        """Update display"""
-        if self.current_input:
-            # Reduce font size for long numbers
-            if len(self.current_input) > 15:
-                self.display.config(font=('Arial', 18, 'bold'))
-            else:
-                self.display.config(font=self.display_font)
-            
-            self.display_var.set(self.current_input)
+        """Update display from the current state (on the next idle cycle)"""
+        self.display_text = None
+        self.schedule_render()
+    
+    def set_display(self, text):
+        """Show text on the display (on the next idle cycle)"""
+        self.display_text = text
+        self.schedule_render()
+    
+    def schedule_render(self):
+        """Coalesce display updates into one render per idle cycle"""
+        if not self.render_scheduled:
+            self.render_scheduled = True
+            self.root.after_idle(self.render_display)
+    
+    def state_text(self):
+        """Display text for the current input/result/operator"""
+        if self.state.current_input:
+            return self.state.current_input
+        if self.state.result and self.state.operator:
+            op_map = {'+': '+', '-': '-', '*': '×', '/': '÷'}
+            display_op = op_map.get(self.state.operator, self.state.operator)
+            return f"{self.state.result} {display_op}"
+        if self.state.result:
+            return self.state.result
+        return "0"
+    
+    def render_display(self):
+        """Write the pending display text, touching Tk only for real changes"""
+        self.render_scheduled = False
+        text = self.display_text
+        preview = ""
+        if text is None:
+            text = self.state_text()
+            # Reduce font size for long numbers (only when crossing the threshold)
+            long_input = len(self.state.current_input) > 15
+            if long_input != self.display_long:
+                self.display_long = long_input
+                self.display.config(font=self.long_display_font if long_input else self.display_font)
+            preview = self.preview_result(text)
+        self.render_preview(preview)
+        
+        if self.digit_grouping:
+            text = calculator_format.group_digits(text)
+        text = self.fit_to_width(text)
+        if text != self.rendered_text:
+            self.rendered_text = text
+            self.display_var.set(text)
+    
+    def preview_result(self, text):
+        """Running value of the typed expression, "" when it adds nothing"""
+        if self.exact_mode:
+            return ""
+        if self.state.operator:
+            source = f"{self.state.result} {self.state.operator} {self.state.current_input}"
+        elif self.last_number() == self.state.current_input:
+            # A plain number, the display already shows it
+            return ""
         else:
-            self.display.config(font=self.display_font)
-            if self.result and self.operator:
-                # Operator mapping (for display)
-                op_map = {'+': '+', '-': '-', '*': '×', '/': '÷'}
-                display_op = op_map.get(self.operator, self.operator)
-                self.display_var.set(f"{self.result} {display_op}")
-            elif self.result:
-                self.display_var.set(self.result)
-            else:
-                self.display_var.set("0")
+            source = self.state.current_input
+        result = self.preview.update(source).result()
+        if result is None or result in engine.ERROR_RESULTS or result == text:
+            return ""
+        if self.digit_grouping:
+            result = calculator_format.group_digits(result)
+        return f"= {result}"
+    
+    def render_preview(self, preview):
+        """Show or hide the preview line"""
+        if preview == self.preview_text:
+            return
+        self.preview_text = preview
+        if preview:
+            self.preview_label.config(text=preview)
+            self.preview_label.place(relx=1.0, rely=1.0, x=-14, y=-6, anchor='se')
+        else:
+            self.preview_label.place_forget()
+    
+    def fit_to_width(self, text):
+        """Keep the end of text that fits the display width
+
+        Error texts are always shown whole.
+        """
+        width = self.display.winfo_width() - 50
+        if width <= 0 or text in engine.ERROR_RESULTS:
+            return text
+        font_obj = self.long_display_font if self.display_long else self.display_font
+        char_width = self.char_widths.get(font_obj)
+        if char_width is None:
+            char_width = self.char_widths[font_obj] = max(1, font_obj.measure('0'))
+        # Only text about the display's length is measured whole; measuring
+        # a number of thousands of digits would cost more than the render
+        if len(text) <= 2 * width // char_width and font_obj.measure(text) <= width:
+            return text
+        # Start from the width in digits, then correct by measuring, since
+        # separators, signs and operators are not as wide as a digit
+        keep = min(len(text) - 1, max(3, width // char_width - 1))
+        while keep > 3 and font_obj.measure('…' + text[-keep:]) > width:
+            keep -= 1
+        while keep < len(text) - 1 and font_obj.measure('…' + text[-(keep + 1):]) <= width:
+            keep += 1
+        return '…' + text[-keep:]
 
 def main():
+    # Command line batch mode: python "python calculator.py" batch ...
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        import calculator_batch
+        sys.exit(calculator_batch.main(sys.argv[2:]))
+    
+    # Statistics of numbers in files: python "python calculator.py" stats ...
+    if len(sys.argv) > 1 and sys.argv[1] == 'stats':
+        import calculator_statistics
+        sys.exit(calculator_statistics.main(sys.argv[2:]))
+    
+    # Local JSON-RPC service: python "python calculator.py" serve ...
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        import calculator_service
+        sys.exit(calculator_service.main(sys.argv[2:]))
+    
+    profile = '--startup-profile' in sys.argv[1:]
+    times = {'imports': time.perf_counter()}
+    
+    # History database: --history PATH, else $CALCULATOR_HISTORY or the
+    # shared per-user database
+    history_path = None
+    if '--history' in sys.argv[1:-1]:
+        history_path = sys.argv[sys.argv.index('--history') + 1]
+    
     root = tk.Tk()
-    app = AdvancedCalculator(root)
+    app = AdvancedCalculator(root, deferred=True, history_path=history_path)
+    times['window built'] = time.perf_counter()
+    
+    # Center window on screen (size is fixed, no layout pass needed)
+    x = (root.winfo_screenwidth() // 2) - (WINDOW_WIDTH // 2)
+    y = (root.winfo_screenheight() // 2) - (WINDOW_HEIGHT // 2)
+    root.geometry(f'{WINDOW_WIDTH}x{WINDOW_HEIGHT}+{x}+{y}')
+    
+    # Paint the keypad, then build the remaining panels
+    root.update()
+    times['first frame'] = time.perf_counter()
+    app.finish_startup()
+    times['panels built'] = time.perf_counter()
     
-    # Center window on screen
-    root.update_idletasks()
-    width = root.winfo_width()
-    height = root.winfo_height()
-    x = (root.winfo_screenwidth() // 2) - (width // 2)
-    y = (root.winfo_screenheight() // 2) - (height // 2)
-    root.geometry(f'{width}x{height}+{x}+{y}')
+    if profile:
+        app.history_ready.wait()
+        times['history loaded'] = time.perf_counter()
+        for name, moment in times.items():
+            print(f"{name:<16}{(moment - STARTED) * 1000:8.1f} ms", file=sys.stderr)
+        app.on_close()
+        return
     
+    app.start_watchdog()
     root.mainloop()
 
 if __name__ == "__main__":
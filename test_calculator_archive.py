@@ -0,0 +1,49 @@
+"""Tests for the binary history archive"""
+import json
+
+import pytest
+
+import calculator_archive
+from calculator_archive import HistoryArchive
+from calculator_history import HistoryStore
+
+
+@pytest.fixture
+def store_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'calculator_history.db')
+    monkeypatch.setenv('CALCULATOR_HISTORY', path)
+    store = HistoryStore(path).open(import_from=None)
+    for n in range(10):
+        store.add(f'{n}×2', str(n * 2), 1700000000.0 + n)
+    store.add('1÷0', 'Infinity', 1700000100.0)
+    store.close()
+    return path
+
+
+def test_pack_reads_the_history_store_by_default(store_path, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert calculator_archive.main(['pack']) == 0
+    with HistoryArchive(calculator_archive.ARCHIVE_FILE) as archive:
+        assert len(archive) == 11
+        assert archive.entry(0).expression == '0×2'
+        assert [entry.result for entry in archive.newest(2)] == ['18', 'Infinity']
+
+
+def test_pack_store_and_json_round_trip(store_path, tmp_path):
+    output = str(tmp_path / 'history.bin')
+    assert calculator_archive.main(['pack', store_path, output]) == 0
+    unpacked = str(tmp_path / 'history.json')
+    assert calculator_archive.main(['unpack', output, unpacked]) == 0
+    with open(unpacked, encoding='utf-8') as f:
+        entries = json.load(f)
+    repacked = str(tmp_path / 'again.bin')
+    assert calculator_archive.main(['pack', unpacked, repacked]) == 0
+    with HistoryArchive(output) as first, HistoryArchive(repacked) as second:
+        assert [entry.as_dict() for entry in first] == [entry.as_dict() for entry in second]
+    assert entries[-1]['expression'] == '1÷0'
+
+
+def test_pack_without_history(tmp_path, monkeypatch):
+    monkeypatch.setenv('CALCULATOR_HISTORY', str(tmp_path / 'none.db'))
+    assert calculator_archive.main(['pack', str(tmp_path / 'none.db'), str(tmp_path / 'out.bin')]) == 2
+    assert not (tmp_path / 'none.db').exists()
@@ -0,0 +1,69 @@
+"""Tests for typed-expression evaluation"""
+import pytest
+
+import calculator_engine as engine
+from calculator_expression import compile_expression, evaluate_expression
+from calculator_format import FIXED, SCIENTIFIC, formatter
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1+2×3', '7'),
+    ('(1+2)×3', '9'),
+    ('-2²', '-4'),
+    ('2^10', '1024'),
+    ('10÷4', '2.5'),
+    ('50%', '0.5'),
+    ('√16', '4'),
+    ('sin(30)', '0.5'),
+    ('1÷0', engine.INFINITY),
+    ('√(-1)', engine.IMAGINARY),
+    ('log(0)', engine.NOT_POSITIVE),
+    ('(-3)!', engine.NEGATIVE),
+    ('1+', engine.ERROR),
+])
+def test_evaluate_expression(text, expected):
+    assert evaluate_expression(text) == expected
+
+
+@pytest.mark.parametrize('n', ['25', '100'])
+def test_factorial_is_exact(n):
+    assert evaluate_expression(n + '!') == engine.evaluate('factorial', n)
+
+
+@pytest.mark.parametrize('text', ['(1e200)²', '2^1024', '(100!)×(100!)×(100!)+0.5'])
+def test_overflow_is_infinity(text):
+    assert evaluate_expression(text) == engine.INFINITY
+
+
+def test_variable():
+    compiled = compile_expression('x²+1')
+    assert compiled.evaluate(x=3) == '10'
+    assert compiled.evaluate(x=0.5) == '1.25'
+
+
+def test_constant_follows_notation():
+    compiled = compile_expression('1234×1000')
+    assert compiled.evaluate() == '1234000'
+    formatter.configure(notation=SCIENTIFIC)
+    try:
+        assert compiled.evaluate() == formatter.format(1234000.0)
+    finally:
+        formatter.configure(notation=FIXED)
+    assert compiled.evaluate() == '1234000'
+
+
+@pytest.mark.parametrize('angle', ['89.9999999', '90.0000001', '-269.9999999', '1e15'])
+def test_tangent_matches_engine(angle):
+    assert evaluate_expression(f'tan({angle})') == engine.evaluate('tangent', angle)
+
+
+def test_tangent_near_pole():
+    # 1/tan(radians(90 - x)) of the exact float 89.9999999
+    assert engine.evaluate('tangent', '89.9999999') == '572957829.1462845802'
+
+
+@pytest.mark.parametrize('text', ['(1e308×10)×0', '(1e999)-(1e999)'])
+def test_nan_is_error(text):
+    assert evaluate_expression(text) == engine.ERROR
+    # Second call takes the cached constant
+    assert evaluate_expression(text) == engine.ERROR
@@ -0,0 +1,46 @@
+"""Tests for the history store and the import of older history files"""
+import json
+
+from calculator_history import HistoryStore, read_journal
+
+
+def write_journal(path, entries, tail=''):
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+        f.write(tail)
+
+
+ENTRIES = [{'expression': f'{n}+1', 'result': str(n + 1), 'timestamp': 1700000000.0 + n} for n in range(5)]
+
+
+def test_read_journal_stops_at_truncated_line_without_writing(tmp_path):
+    path = tmp_path / 'calculator_history.jsonl'
+    write_journal(path, ENTRIES, tail='{"expression": "9+')
+    before = path.read_bytes()
+    assert read_journal(str(path), None) == ENTRIES
+    assert path.read_bytes() == before
+
+
+def test_read_journal_falls_back_to_legacy_list(tmp_path):
+    legacy = tmp_path / 'calculator_history.json'
+    legacy.write_text(json.dumps(ENTRIES[:2]), encoding='utf-8')
+    assert read_journal(str(tmp_path / 'missing.jsonl'), str(legacy)) == ENTRIES[:2]
+    assert read_journal(str(tmp_path / 'missing.jsonl'), None) == []
+
+
+def test_store_imports_journal_once(tmp_path):
+    journal = tmp_path / 'calculator_history.jsonl'
+    write_journal(journal, ENTRIES, tail='garbage')
+    before = journal.read_bytes()
+    path = str(tmp_path / 'calculator_history.db')
+    store = HistoryStore(path).open(import_from=(str(journal), None, None))
+    store.add('2×3', '6')
+    store.close()
+    store = HistoryStore(path).open(import_from=(str(journal), None, None))
+    try:
+        assert store.count() == 6
+        assert [entry['expression'] for entry in store.page(0, 2)] == ['2×3', '4+1']
+    finally:
+        store.close()
+    assert journal.read_bytes() == before
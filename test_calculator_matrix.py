@@ -0,0 +1,30 @@
+"""Tests for matrix mode"""
+import pytest
+
+import calculator_engine as engine
+from calculator_matrix import MatrixError, apply, parse_matrix, row_texts
+
+np = pytest.importorskip('numpy')
+
+
+def test_operations():
+    a = parse_matrix("1 2; 3 4")
+    b = parse_matrix("5 6\n7 8")
+    assert apply('det', a) == pytest.approx(-2.0)
+    assert apply('·', a, b).tolist() == [[19, 22], [43, 50]]
+    assert row_texts(apply('sin', parse_matrix("30 90")), 0) == ['0.5', '1']
+
+
+@pytest.mark.parametrize('text', ["1e200 0; 0 1e200", "1e308 1e308; 1e308 -1e308"])
+def test_overflowing_determinant_is_an_error(text):
+    with pytest.raises(MatrixError, match=engine.INFINITY):
+        apply('det', parse_matrix(text))
+
+
+def test_failing_element_is_reported():
+    with pytest.raises(MatrixError, match=f"{engine.NOT_POSITIVE} at row 2, column 1"):
+        apply('log', parse_matrix("1 2; 0 4"))
+
+
+def test_non_finite_cells_are_shown_as_texts():
+    assert row_texts(np.array([[np.inf, np.nan, 1.0]]), 0) == [engine.INFINITY, engine.ERROR, '1']
@@ -0,0 +1,35 @@
+"""Tests for clipboard parsing of the calculator window"""
+import importlib.util
+import os
+import time
+
+import pytest
+
+_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python calculator.py')
+_spec = importlib.util.spec_from_file_location('calculator_app', _path)
+calculator_app = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(calculator_app)
+parse_paste = calculator_app.parse_paste
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1,234.5', '1234.5'),
+    ('-3e5', '-3e5'),
+    ('.5', '.5'),
+    ('5.', '5.'),
+    ('+7', '7'),
+    ('2*3', '(2×3)'),
+    ('(1+2)', '(1+2)'),
+    ('1\n2', None),
+    ('abc', None),
+])
+def test_parse_paste(text, expected):
+    assert parse_paste(text) == expected
+
+
+@pytest.mark.parametrize('tail', ['+', 'x', '+1'])
+def test_long_digit_run_is_linear(tail):
+    text = '9' * 100000 + tail
+    started = time.perf_counter()
+    parse_paste(text)
+    assert time.perf_counter() - started < 1.0
@@ -0,0 +1,63 @@
+"""Tests for the incremental live preview"""
+import random
+import time
+
+import pytest
+
+from calculator_expression import evaluate_expression
+from calculator_preview import IncrementalExpression
+
+
+def typed(text):
+    """Preview after typing text one character at a time"""
+    preview = IncrementalExpression()
+    for end in range(1, len(text) + 1):
+        preview.update(text[:end])
+    return preview
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('2 + 3 × (4', '14'),
+    ('2+3×4', '14'),
+    ('1.5e+3', '1500'),
+    ('2π', evaluate_expression('2π')),
+    ('(1+2', '3'),
+    ('1÷0', 'Infinity'),
+])
+def test_result(text, expected):
+    assert typed(text).result() == expected
+
+
+@pytest.mark.parametrize('text', ['', '2+', '(', '3×'])
+def test_incomplete(text):
+    assert typed(text).result() is None
+
+
+def test_backspace_returns_to_snapshot():
+    preview = typed('12+34')
+    preview.update('12+3')
+    assert preview.result() == '15'
+    preview.update('12+399')
+    assert preview.result() == '411'
+
+
+def test_matches_full_evaluation():
+    rng = random.Random(5)
+    pieces = ['1', '2', '3', '.', '5', 'e', '+', '-', '×', '÷', '^', '(', ')', '!', '²', '%', '√',
+              'sin', 'π', ' ', '0', '9', '1.5e+3']
+    for _ in range(500):
+        text = ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 12)))
+        preview = typed(text)
+        preview.update(text[:len(text) // 2])
+        preview.update(text)
+        result = preview.result()
+        if result is not None:
+            assert result == evaluate_expression(text), text
+
+
+@pytest.mark.parametrize('text', ['(' + '1' * 40000, '9' * 30000 + '+1'])
+def test_long_numbers_are_linear(text):
+    started = time.perf_counter()
+    preview = IncrementalExpression(text)
+    preview.result()
+    assert time.perf_counter() - started < 1.0
@@ -0,0 +1,59 @@
+"""Tests for request handling of the JSON-RPC service"""
+import pytest
+
+from calculator_expression import evaluate_expression
+from calculator_service import (INVALID_PARAMS, METHOD_NOT_FOUND, SLOW_EXPRESSION_LENGTH, CalculatorService,
+                                RPCError, Session)
+
+
+@pytest.fixture
+def service():
+    return CalculatorService()
+
+
+def test_operation(service):
+    assert service.prepare(Session(), 'add', [2, 3]) == '5'
+    assert service.prepare(Session(), 'divide', {'a': 1, 'b': 0}) == 'Infinity'
+
+
+def test_expression(service):
+    assert service.prepare(Session(), 'expression', ['1+2×3']) == '7'
+    text = '1+' * SLOW_EXPRESSION_LENGTH + '1'
+    assert service.prepare(Session(), 'expression', [text]) == (evaluate_expression, (text,))
+
+
+def test_memory(service):
+    session = Session()
+    service.prepare(session, 'memory_store', [4])
+    service.prepare(session, 'memory_add', [1.5])
+    assert service.prepare(session, 'memory_recall', []) == '5.5'
+
+
+@pytest.mark.parametrize('limit, expected', [(0, []), (2, [3, 4]), (5, [0, 1, 2, 3, 4]), (100, [0, 1, 2, 3, 4])])
+def test_history_limit(service, limit, expected):
+    session = Session()
+    for index in range(5):
+        session.remember('add', [index, 0], str(index))
+    entries = service.prepare(session, 'history', [limit])
+    assert [entry['result'] for entry in entries] == [str(index) for index in expected]
+
+
+@pytest.mark.parametrize('method, params, code', [
+    ('add', [1], INVALID_PARAMS),
+    ('history', [-1], INVALID_PARAMS),
+    ('expression', [5], INVALID_PARAMS),
+    ('nonsense', [], METHOD_NOT_FOUND),
+])
+def test_invalid_requests(service, method, params, code):
+    with pytest.raises(RPCError) as raised:
+        service.prepare(Session(), method, params)
+    assert raised.value.code == code
+
+
+def test_stats_cache_hit_rates(service):
+    service.prepare(Session(), 'expression', ['7×6'])
+    service.prepare(Session(), 'expression', ['7×6'])
+    caches = service.prepare(Session(), 'stats', [])['caches']
+    assert set(caches) == {'functions', 'expressions', 'formatting'}
+    assert caches['expressions']['hits'] >= 1
+    assert 0.0 < caches['expressions']['hit_rate'] <= 1.0
@@ -0,0 +1,96 @@
+"""Tests for streaming statistics"""
+import math
+import random
+import statistics
+
+import pytest
+
+import calculator_engine as engine
+from calculator_statistics import QuantileSketch, StreamingStats
+
+
+@pytest.fixture
+def values():
+    rng = random.Random(7)
+    return [rng.lognormvariate(0, 2) * rng.choice([-1, 1, 1]) for _ in range(5000)]
+
+
+def test_moments(values):
+    stats = StreamingStats()
+    stats.extend(values)
+    assert stats.count == len(values)
+    assert stats.sum == math.fsum(values)
+    assert stats.mean == pytest.approx(statistics.fmean(values), rel=1e-14)
+    assert stats.variance() == pytest.approx(statistics.variance(values), rel=1e-10)
+    assert stats.variance(sample=False) == pytest.approx(statistics.pvariance(values), rel=1e-10)
+    assert stats.stddev() == pytest.approx(statistics.stdev(values), rel=1e-10)
+    assert (stats.min, stats.max) == (min(values), max(values))
+
+
+def test_compensated_sum():
+    stats = StreamingStats()
+    stats.extend([1e16, 1.0, -1e16] * 1000)
+    assert stats.sum == 1000.0
+
+
+@pytest.mark.parametrize('q', [0.01, 0.25, 0.5, 0.9, 0.99])
+def test_quantiles_within_relative_accuracy(values, q):
+    stats = StreamingStats(relative_accuracy=0.01)
+    stats.extend(values)
+    ordered = sorted(values)
+    expected = ordered[int(q * (len(ordered) - 1))]
+    assert stats.quantile(q) == pytest.approx(expected, rel=0.0101)
+    assert stats.quantile(0) == ordered[0]
+    assert stats.quantile(1) == ordered[-1]
+
+
+def test_feed_skips_non_numbers():
+    stats = StreamingStats()
+    assert stats.feed(['1, 2;3', 'x nan 4', 'inf']) == 4
+    assert stats.rejected == 3
+    assert stats.sum == 10
+
+
+def test_empty():
+    stats = StreamingStats()
+    assert stats.mean is None and stats.variance() is None and stats.quantile(0.5) is None
+    assert dict(stats.summary())['count'] == '0'
+
+
+def test_sketch_collapses_small_buckets():
+    sketch = QuantileSketch(max_buckets=64)
+    for exponent in range(-200, 200):
+        sketch.add(10.0 ** exponent)
+    assert sketch.bucket_count() <= 64
+    assert sketch.quantile(1) == pytest.approx(1e199, rel=0.0101)
+
+
+def summary(numbers):
+    stats = StreamingStats()
+    stats.extend(numbers)
+    return stats, dict(stats.summary())
+
+
+def test_sum_overflow_comes_back():
+    stats, rows = summary([1e308, 1e308, -1e308, -1e308, 5])
+    assert stats.sum == 5
+    assert rows['mean'] == '1'
+
+
+def test_overflowing_sum_keeps_mean():
+    stats, rows = summary([1e308, 1e308])
+    assert rows['sum'] == engine.INFINITY
+    assert stats.mean == 1e308
+    assert rows['stddev'] == '0'
+
+
+def test_overflowing_variance():
+    stats, rows = summary([1.5e308, -1.5e308])
+    assert rows['mean'] == '0'
+    assert rows['variance'] == rows['stddev'] == engine.INFINITY
+
+
+def test_quantile_next_to_float_max():
+    stats, rows = summary([1.7e308] * 3)
+    assert stats.quantile(0.5) == 1.7e308
+    assert engine.ERROR not in rows.values()
@@ -0,0 +1,25 @@
+"""Tests for function tables: the vectorized kernels against the scalar evaluation"""
+import pytest
+
+from calculator_expression import evaluate_expression
+from calculator_table import FunctionTable
+
+np = pytest.importorskip('numpy')
+
+
+@pytest.mark.parametrize('expression, start, stop, step', [
+    ('1/(x^400)', 10, 12, 1),
+    ('x^400', 5, 8, 1),
+    ('(-x)^401', 5, 8, 1),
+    ('2^x', 1020, 1026, 1),
+    ('x^(-1)', -2, 2, 1),
+    ('(x-1)^0.5', -1, 3, 1),
+    ('x!', 20, 26, 1),
+    ('tan(x)', 89.9999, 90.0001, 0.00005),
+])
+def test_rows_match_scalar_evaluation(expression, start, stop, step):
+    table = FunctionTable(expression, start, stop, step)
+    table.compute()
+    for index, (_, value) in enumerate(table.rows(0, table.done)):
+        x = table.x(index)
+        assert value == evaluate_expression(expression.replace('x', f'({x!r})')), x